@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+
+"""
+branch_predictor.py: Branch predictors for the pipelined simulator
+"""
+
+from array import array
+from instruction import Instruction
+import config
+
+# Opcodes the predictors care about
+BZ = Instruction.I_type_instr['BZ']
+BEQ = Instruction.I_type_instr['BEQ']
+JR = Instruction.I_type_instr['JR']
+BRANCH_OPCODES = frozenset([BZ, BEQ, JR])
+
+# Static not-taken: what the pipeline does without a predictor, but with stats
+class BranchPredictor:
+    name = 'not-taken'
+
+    # Init
+    def __init__(self, size: int = config.BP_TABLE_SIZE) -> None:
+        assert size >= 1, "Branch predictor needs at least one table entry"
+        self.size = size
+
+        # Statistics
+        self.branches = 0
+        self.taken = 0
+        self.mispredicts = 0
+
+    # Predicted target for the instruction word fetched at pc, None for fall-through
+    def predict(self, pc: int, word: int):
+        return None
+
+    # Train with the resolved outcome of the branch at pc
+    def update(self, pc: int, taken: bool, target: int) -> None:
+        pass
+
+    # Record the outcome of a prediction
+    def record(self, taken: bool, correct: bool) -> None:
+        self.branches += 1
+        if taken:
+            self.taken += 1
+        if not correct:
+            self.mispredicts += 1
+
+    # Prediction accuracy in percent
+    def accuracy(self) -> float:
+        if self.branches == 0:
+            return 0.0
+        return 100.0 * (self.branches - self.mispredicts) / self.branches
+
+    # Flush cycles saved compared to always flushing on a taken branch
+    def flush_cycles_saved(self, flush_penalty: int) -> int:
+        return flush_penalty * (self.taken - self.mispredicts)
+
+# Static backward-taken, forward-not-taken. BZ/BEQ targets are pre-decoded from
+# the immediate at fetch, JR is never predicted
+class BackwardTakenPredictor(BranchPredictor):
+    name = 'backward-taken'
+
+    def predict(self, pc: int, word: int):
+        opcode = (word & Instruction.OPCODE_BITMASK) >> 26
+        if opcode == BZ or opcode == BEQ:
+            imm = word & Instruction.IMM_BITMASK
+            if imm & 0x8000:
+                return pc + 4 * (imm - 0x10000)
+        return None
+
+# Branch target buffer, direct mapped and indexed by PC
+# On its own it predicts taken whenever the last outcome at a PC was taken
+class BTBPredictor(BranchPredictor):
+    name = 'btb'
+
+    def __init__(self, size: int = config.BP_TABLE_SIZE) -> None:
+        super().__init__(size)
+        self.btb_tags = array('l', [-1] * size)
+        self.btb_targets = array('l', [0] * size)
+
+    # Target stored for pc, None on a miss
+    def btb_lookup(self, pc: int):
+        index = (pc >> 2) % self.size
+        if self.btb_tags[index] == pc:
+            return self.btb_targets[index]
+        return None
+
+    def btb_insert(self, pc: int, target: int) -> None:
+        index = (pc >> 2) % self.size
+        self.btb_tags[index] = pc
+        self.btb_targets[index] = target
+
+    def predict(self, pc: int, word: int):
+        return self.btb_lookup(pc)
+
+    def update(self, pc: int, taken: bool, target: int) -> None:
+        if taken:
+            self.btb_insert(pc, target)
+        elif self.btb_lookup(pc) is not None:
+            self.btb_tags[(pc >> 2) % self.size] = -1
+
+# Table of 2-bit saturating counters, targets come from the BTB
+class TwoBitPredictor(BTBPredictor):
+    name = '2bit'
+
+    def __init__(self, size: int = config.BP_TABLE_SIZE) -> None:
+        super().__init__(size)
+        # Start weakly not-taken
+        self.counters = array('B', [1] * size)
+
+    def predict(self, pc: int, word: int):
+        if self.counters[(pc >> 2) % self.size] >= 2:
+            return self.btb_lookup(pc)
+        return None
+
+    def update(self, pc: int, taken: bool, target: int) -> None:
+        index = (pc >> 2) % self.size
+        if taken:
+            self.btb_insert(pc, target)
+            if self.counters[index] < 3:
+                self.counters[index] += 1
+        elif self.counters[index] > 0:
+            self.counters[index] -= 1
+
+# Predictors by name
+PREDICTORS = {predictor.name: predictor for predictor in
+              [BranchPredictor, BackwardTakenPredictor, BTBPredictor, TwoBitPredictor]}
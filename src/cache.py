@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+"""
+cache.py: Set-associative cache timing model with LRU replacement
+"""
+
+from array import array
+import logging
+
+# Check if a number is a power of two
+def is_pow2(n: int) -> bool:
+    return n > 0 and (n & (n - 1)) == 0
+
+# What is wrong with a cache geometry, None if it can be modelled
+def geometry_error(size: int, assoc: int, line_size: int, miss_penalty: int):
+    if not (is_pow2(size) and is_pow2(assoc) and is_pow2(line_size)):
+        return "Cache geometry must be powers of 2"
+    if size < assoc * line_size:
+        return "Cache too small for its associativity and line size"
+    if miss_penalty < 0:
+        return "Cache miss penalty can not be negative"
+    return None
+
+class Cache:
+    # Init
+    # Only tags are modelled, data always comes from Memory
+    def __init__(self, name: str, size: int, assoc: int, line_size: int, miss_penalty: int) -> None:
+        error = geometry_error(size, assoc, line_size, miss_penalty)
+        assert error is None, error
+
+        self.name = name
+        self.size = size
+        self.assoc = assoc
+        self.line_size = line_size
+        self.miss_penalty = miss_penalty
+        self.num_sets = size // (assoc * line_size)
+
+        # Address -> set index / tag
+        self.offset_bits = line_size.bit_length() - 1
+        self.set_mask = self.num_sets - 1
+        self.set_bits = self.num_sets.bit_length() - 1
+
+        # One entry per way, set by set. Tag -1 means invalid and LRU holds the
+        # time of last use
+        self.tags = array('l', [-1] * (self.num_sets * assoc))
+        self.lru = array('Q', [0] * (self.num_sets * assoc))
+        self.time = 0
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+
+        logging.debug(f'{name}: {size}B, {assoc}-way, {line_size}B lines, {self.num_sets} sets')
+
+    # Look up addr, filling the line on a miss
+    # Returns the number of cycles the access costs on top of a hit
+    def access(self, addr: int) -> int:
+        line = int(addr) >> self.offset_bits
+        tag = line >> self.set_bits
+        base = (line & self.set_mask) * self.assoc
+        end = base + self.assoc
+        self.time += 1
+
+        ways = self.tags[base:end]
+        if tag in ways:
+            self.lru[base + ways.index(tag)] = self.time
+            self.hits += 1
+            return 0
+
+        # Replace the least recently used way, invalid ways have time 0
+        ages = self.lru[base:end]
+        victim = base + ages.index(min(ages))
+        self.tags[victim] = tag
+        self.lru[victim] = self.time
+        self.misses += 1
+        return self.miss_penalty
+
+    # Hit rate in percent
+    def hit_rate(self) -> float:
+        accesses = self.hits + self.misses
+        if accesses == 0:
+            return 0.0
+        return 100.0 * self.hits / accesses
+
+    # Override for print()
+    def __str__(self):
+        return f'{self.name}: Hits: {self.hits}, Misses: {self.misses}, Hit rate: {self.hit_rate():.2f}%'
@@ -8,4 +8,71 @@ config: Global configurations and defines for the project
 LOG_FORMAT = '%(module)s/%(funcName)s (%(lineno)d): %(message)s'
 
 # Memory Size in bytes
-MEM_SIZE = 4096
\ No newline at end of file
+MEM_SIZE = 4096
+
+# Sampled simulation defaults: detailed windows of SAMPLE_WINDOW instructions,
+# preceded by SAMPLE_WARMUP detailed instructions, taken every SAMPLE_PERIOD
+SAMPLE_PERIOD = 10000
+SAMPLE_WINDOW = 1000
+SAMPLE_WARMUP = 100
+
+# z-score used for confidence intervals (95%)
+SAMPLE_CONFIDENCE_Z = 1.96
+
+# Pipeline descriptions, one per pipelined mode. The hazard checker builds its
+# lookup tables from these. All modes share the IF/ID/EX/MEM/WB stages of
+# cpu.py, registers are read in ID and written in WB
+# forwarding: stages whose output is forwarded to EX, out of 'EX' and 'MEM'
+# load_use_latency: cycles after EX before loaded data exists
+# store_forwarding: a STW right behind the LDW producing its data gets it MEM to MEM
+PIPELINES = {
+    'no-fwd': {
+        'forwarding': [],
+        'load_use_latency': 1,
+        'store_forwarding': False
+    },
+    'fwd': {
+        'forwarding': ['EX', 'MEM'],
+        'load_use_latency': 1,
+        'store_forwarding': True
+    }
+}
+
+# Entries in the branch predictor counter table and BTB
+BP_TABLE_SIZE = 64
+
+# Default L1 cache geometry: size in bytes, ways, line size in bytes and
+# cycles added by a miss
+ICACHE = {'size': 256, 'assoc': 2, 'line_size': 16, 'miss_penalty': 10}
+DCACHE = {'size': 256, 'assoc': 2, 'line_size': 16, 'miss_penalty': 10}
+
+# Performance counter window in clock cycles, and the number of windows the
+# counter arrays are allocated for up front (they double when full)
+PERF_WINDOW = 1000
+PERF_CAPACITY = 1024
+
+# Loop fast-forward in the functional simulator: a loop is analysed once its
+# back edge has been taken LOOP_FF_THRESHOLD times, bodies longer than
+# LOOP_FF_MAX_BODY instructions are always interpreted
+LOOP_FF_THRESHOLD = 4
+LOOP_FF_MAX_BODY = 64
+
+# Long-run mode: instructions kept in the recent history ring buffer, steps
+# between two statistics lines, and steps between checks for SIGINT/SIGTERM
+LONGRUN_HISTORY = 64
+LONGRUN_STATS_EVERY = 1000000
+LONGRUN_CHUNK = 10000
+
+# Cycles per block of the text and HTML pipeline diagrams
+PIPEVIEW_BLOCK = 40
+
+# Multi-core start table: a memory image can give each core its start PC with
+# this magic word at CORE_TABLE_ADDR, followed by the number of entries and
+# one start PC per core
+CORE_TABLE_ADDR = 0xF00
+CORE_TABLE_MAGIC = 0x434F5245
+
+# On-disk result cache used by main.py and sweep.py, with its size limit in
+# bytes. The least recently used results go first
+RESULT_CACHE_DIR = '~/.cache/mips_lite_sim'
+RESULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+"""
+cosim.py: Lockstep co-simulation of the pipelined and functional simulators
+
+Every instruction that retires from the pipeline's WB stage is checked against
+the next step of the functional simulator. The first divergence stops the run.
+
+Check a set of images in both pipelined modes with:
+    ./cosim.py <memory_image> [memory_image ...]
+"""
+
+import collections
+import config
+import cpu
+import cpu_func
+import logging
+import sys
+from instruction import Instruction
+
+# Number of retired instructions kept for the divergence report
+HISTORY = 8
+
+# Raised from the retire hook on the first mismatch
+class Divergence(Exception):
+    pass
+
+class CoSimChecker:
+    # Init
+    # Attaches to a pipelined simulator and runs a functional one next to it
+    def __init__(self, pipe: cpu.MIPS_lite) -> None:
+        self.pipe = pipe
+        self.func = cpu_func.MIPS_lite_func(pipe.mem_fname)
+        self.retired = 0
+        self.func_halted = False
+        self.history = collections.deque(maxlen=HISTORY)
+        pipe.on_retire = self.check
+
+    # Compare architectural state after instr retired from the pipeline
+    def check(self, instr: Instruction) -> None:
+        expected_pc = self.func.pc
+        self.retired += 1
+        self.history.append((instr.pc, instr.get_instr().strip()))
+
+        if self.func_halted:
+            self.diverge(instr, ['Functional simulator already halted'])
+        self.func_halted = self.func.do_cpu_things()
+
+        problems = []
+        if instr.pc != expected_pc:
+            problems.append(f'PC: pipeline retired {instr.pc}, functional executed {expected_pc}')
+        if self.pipe.R != self.func.R:
+            for reg in range(len(self.pipe.R)):
+                if self.pipe.R[reg] != self.func.R[reg]:
+                    problems.append(f'R{reg}: pipeline {self.pipe.R[reg]}, functional {self.func.R[reg]}')
+        # Compare what the store wrote, a younger STW in MEM may already have
+        # overwritten the word
+        if instr.opcode == Instruction.I_type_instr['STW']:
+            addr = instr.ref_addr
+            pipe_data = instr.store_data
+            func_data = bytes(self.func.mem.read_n(addr, 4))
+            if pipe_data != func_data:
+                problems.append(f'Addr {addr}: pipeline {int.from_bytes(pipe_data, "big")}, ' +
+                                f'functional {int.from_bytes(func_data, "big")}')
+        if len(problems) > 0:
+            self.diverge(instr, problems)
+
+    # Checks once the pipeline has halted
+    def finish(self) -> None:
+        problems = []
+        if self.func_halted == False:
+            problems.append(f'Functional simulator did not halt, next PC: {self.func.pc}')
+        if self.pipe.pc != self.func.pc:
+            problems.append(f'Final PC: pipeline {self.pipe.pc}, functional {self.func.pc}')
+        if self.pipe.mem.mem != self.func.mem.mem:
+            problems.append('Final memory contents differ')
+        if len(problems) > 0:
+            raise Divergence(self.report(None, problems))
+
+    def diverge(self, instr: Instruction, problems: list) -> None:
+        raise Divergence(self.report(instr, problems))
+
+    # Focused report: where it happened, what differs and what led up to it
+    def report(self, instr, problems: list) -> str:
+        info = f'Divergence in {self.pipe.mode} mode at clock {self.pipe.clk}, ' + \
+               f'retired instruction {self.retired}'
+        if instr is not None:
+            info += f'\nInstruction: PC {instr.pc}: {instr.get_instr().strip()}'
+        for problem in problems:
+            info += '\n  ' + problem
+        info += '\nLast retired instructions:'
+        for pc, text in self.history:
+            info += f'\n  {pc}: {text}'
+        return info
+
+# Run one image in one mode, returns None on a match or the divergence report
+def cosim(mode: str, mem_fname: str):
+    pipe = cpu.MIPS_lite(mode, mem_fname)
+    checker = CoSimChecker(pipe)
+    try:
+        while pipe.do_cpu_things() == False:
+            pass
+        checker.finish()
+    except Divergence as divergence:
+        return str(divergence)
+    return None
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("./cosim.py <memory_image> [memory_image ...]")
+        exit(1)
+
+    logging.basicConfig(format=config.LOG_FORMAT, level=logging.ERROR)
+
+    failures = 0
+    for mem_fname in sys.argv[1:]:
+        for mode in config.PIPELINES:
+            report = cosim(mode, mem_fname)
+            if report is None:
+                print(f'PASS {mode} {mem_fname}')
+            else:
+                failures += 1
+                print(f'FAIL {mode} {mem_fname}\n{report}')
+
+    exit(1 if failures > 0 else 0)
@@ -7,13 +7,16 @@ Author(s): Atharva Lele <atharva@pdx.edu>
 """
 
 from re import L
+import branch_predictor
+import cache
 import config
 import memory
 import logging
 import numpy
+from hazard import HazardModel
 from instruction import Instruction
 
-from parser import parser
+from parser import load_image
 
 # Get twos complement value
 def get_twos_complement_val(val: int, bits: int) -> int:
@@ -24,11 +27,34 @@ def get_twos_complement_val(val: int, bits: int) -> int:
 
 class MIPS_lite:
     # Init
-    def __init__(self, mode: str, mem_fname: str) -> None:
+    def __init__(self, mode: str, mem_fname: str, mem: memory.Memory = None, event_skip: bool = None,
+                 bp: branch_predictor.BranchPredictor = None, icache: cache.Cache = None,
+                 dcache: cache.Cache = None) -> None:
         # Save mode, memory image filename, and output filename
         self.mode = mode
         self.mem_fname = mem_fname
 
+        # Skip over stall and drain cycles in one go. Skipped cycles do not
+        # produce per-cycle debug output, so this is off by default in DEBUG
+        if event_skip is None:
+            event_skip = not logging.getLogger().isEnabledFor(logging.DEBUG)
+        self.event_skip = event_skip
+
+        # Called with every instruction that leaves WB, once its result is written
+        self.on_retire = None
+
+        # Full register dump every cycle in DEBUG
+        self.dump_registers = logging.getLogger().isEnabledFor(logging.DEBUG)
+
+        # Branch predictor, None resolves every branch in EX as not-taken
+        self.bp = bp
+
+        # Optional cache models in front of memory. A miss freezes the whole
+        # pipeline, so its penalty goes straight onto the clock
+        self.icache = icache
+        self.dcache = dcache
+        self.cache_stall_count = 0
+
         # Halt flag
         self.halt_flag = False
 
@@ -40,11 +66,18 @@ class MIPS_lite:
         # Clock cycle counter
         self.clk = 0
 
+        # Stall/forwarding lookup tables for this mode
+        self.hazard = HazardModel(config.PIPELINES[mode])
+        self.forwarding = len(self.hazard.forwarding) > 0
+
         # Hazard flags
         self.hazard_flag = False
         self.data_hazard = False
         self.num_clocks_to_stall = 0
 
+        # Whether the pending stall waits on a load (load-use) or an ALU result
+        self.stall_is_load = 0
+
         # Register declaration
         # npc = next program counter
         # A, B, imm, ALUout registers used for ALU operations in the execute stage
@@ -62,11 +95,15 @@ class MIPS_lite:
         self.mem_out = numpy.int32(0)
         self.alu_out = numpy.int32(0)
       
-        # Instantiate memory object
-        self.mem = memory.Memory(config.MEM_SIZE)
+        # Instantiate memory object, or share the one we were handed
+        # (used when switching over from another simulator)
+        if mem is None:
+            self.mem = memory.Memory(config.MEM_SIZE)
 
-        # Fill memory with data
-        self.mem.write_n(0, parser(self.mem_fname))
+            # Fill memory with data
+            load_image(self.mem, self.mem_fname)
+        else:
+            self.mem = mem
 
             # Variables needed for final output prints
         self.modified_regs = []
@@ -79,6 +116,19 @@ class MIPS_lite:
         self.stall_count = 0
         self.num_data_hazards = 0
 
+        # Performance counters, always on: stall cycles behind a load, pipeline
+        # flushes for branches, operands taken from each forwarding path
+        # (index = path) and store data forwarded MEM to MEM
+        self.load_use_stall_count = 0
+        self.flush_count = 0
+        self.fwd_count = [0, 0, 0]
+        self.store_fwd_count = 0
+
+        # Windowed collection, see perfcounters.py. perf.sample() runs once
+        # clk reaches perf_next_clk
+        self.perf = None
+        self.perf_next_clk = float('inf')
+
     # Function to add to a list, and keep it unique
     def add_to_list(self, lst, reg):
         if reg not in lst:
@@ -87,79 +137,105 @@ class MIPS_lite:
         return lst
 
     # Data Hazard Check
+    # Stalls and forwarding paths come from the lookup tables of the hazard model
     def check_data_hazard(self):
         if self.pipeline[1] is not None:
-            dest_reg = None
-            source_regs = self.pipeline[1].get_src_regs()
+            consumer = self.pipeline[1]
+            source_regs = consumer.src_regs
 
-            # Check if there are conflicts with the MEM stage
-            if self.pipeline[3] is not None:
-                dest_reg = self.pipeline[3].get_dest_reg()
+            # Check producers from the oldest to the youngest, the nearest conflict decides
+            for stage in self.hazard.producer_stages:
+                producer = self.pipeline[stage]
+                if producer is None:
+                    continue
 
+                dest_reg = producer.dest_reg
                 if dest_reg in source_regs:
-                    logging.debug('DH: Hazard detected with MEM stage')
+                    stall, fwd_path, store_fwd = self.hazard.table[producer.is_load][stage]
+                    logging.debug(f'DH: Hazard detected with {self.hazard.stages[stage]} stage')
                     logging.debug(f'DH: Dest: {dest_reg}, SRCS: {source_regs}')
 
-                    if self.mode == 'fwd':
-                        if dest_reg == self.pipeline[1].rs:
-                            self.pipeline[1].fwd_A = 1
-                        elif dest_reg == self.pipeline[1].rt:
-                            self.pipeline[1].fwd_B = 1
-                        logging.debug(f'DH: fwdA: {self.pipeline[1].fwd_A}, fwdB: {self.pipeline[1].fwd_B}')
-
+                    # Back to back LDW - STW, data goes MEM to MEM
+                    if store_fwd == True and consumer.opcode == Instruction.I_type_instr['STW'] and \
+                            consumer.rt == dest_reg:
+                        consumer.mem_to_mem = 1
+
+                    if stall == 0:
+                        if dest_reg == consumer.rs:
+                            consumer.fwd_A = fwd_path
+                        if dest_reg == consumer.rt and consumer.opcode in Instruction.RT_SRC_opcodes:
+                            consumer.fwd_B = fwd_path
+                        logging.debug(f'DH: fwdA: {consumer.fwd_A}, fwdB: {consumer.fwd_B}')
                         self.data_hazard = False
                         self.num_clocks_to_stall = 0
-                    
                     else:
-                        # Set flags - we don't need to check for conflicts
-                        # with EX stage if we are going to stall for 1 cycle
                         self.data_hazard = True
-                        self.num_clocks_to_stall = 1
-
-            # Check if there are conflicts with the EX stage
-            if self.pipeline[2] is not None:
-                dest_reg = self.pipeline[2].get_dest_reg()
-                  
-                if dest_reg in source_regs:
-                    logging.debug('DH: Hazard detected with EX stage')
-                    logging.debug(f'DH: Dest: {dest_reg}, SRCS: {source_regs}')
-
-                    if self.mode == 'fwd':
-                        # Back to bacK LDW - STW
-                        if self.pipeline[2].opcode == Instruction.I_type_instr.get('LDW') and \
-                             self.pipeline[1].opcode == Instruction.I_type_instr.get('STW') and \
-                                 self.pipeline[1].rt == dest_reg:
-                            self.pipeline[1].mem_to_mem = 1
-
-
-                        if self.pipeline[2].opcode != Instruction.I_type_instr.get('LDW'):
-                            if dest_reg == self.pipeline[1].rs:
-                                self.pipeline[1].fwd_A = 2
-                            elif dest_reg == self.pipeline[1].rt:
-                                self.pipeline[1].fwd_B = 2
-                            logging.debug(f'DH: fwdA: {self.pipeline[1].fwd_A}, fwdB: {self.pipeline[1].fwd_B}')
-                            self.data_hazard = False
-                            self.num_clocks_to_stall = 0
-                        else:
-                            #If instruction is load and mode is fwd, stall for 1 cycle
-                            self.data_hazard = True
-                            self.num_clocks_to_stall = 1
-
-                    else: 
-                        self.data_hazard = True
-                        self.num_clocks_to_stall = 2
+                        self.num_clocks_to_stall = stall
+                        self.stall_is_load = producer.is_load
 
             # Count the data hazard
-            if self.data_hazard == True and self.pipeline[1].dh_counted == False:
-                self.pipeline[1].dh_counted = True
+            if self.data_hazard == True and consumer.dh_counted == False:
+                consumer.dh_counted = True
                 self.num_data_hazards += 1
 
 
-    # Flushing pipeline
-    def flush_pipeline(self):
+    # Flushing pipeline, branch=False for the flush at HALT
+    def flush_pipeline(self, branch: bool = True):
         logging.debug('EX: Pipeline flushed')
+        if branch:
+            self.flush_count += 1
+        self.pipeline[0] = None
+        self.pipeline[1] = None
+
+    # Squash IF/ID and clock the pipeline until everything past decode retires
+    # Returns the PC of the oldest instruction that has not been executed, so
+    # another simulator can pick up from there
+    def drain(self) -> int:
+        if self.pipeline[1] is not None:
+            resume_pc = self.pipeline[1].pc
+        elif self.pipeline[0] is not None:
+            resume_pc = self.pipeline[0].pc
+        else:
+            resume_pc = self.pc
+
+        logging.debug(f'Draining pipeline, resuming at PC: {resume_pc}')
         self.pipeline[0] = None
         self.pipeline[1] = None
+        self.data_hazard = False
+        self.num_clocks_to_stall = 0
+
+        # Holding halt stops the fetch stage while EX/MEM/WB empty out
+        halt_flag = self.halt_flag
+        self.halt_flag = True
+        while self.do_cpu_things() == False:
+            pass
+        self.halt_flag = halt_flag
+
+        self.pc = resume_pc
+        self.npc = resume_pc
+        return resume_pc
+
+    # Access a cache model and stall the pipeline for a miss
+    def cache_stall(self, cache_model: cache.Cache, addr: int) -> None:
+        penalty = cache_model.access(addr)
+        if penalty > 0:
+            logging.debug(f'{cache_model.name}: Miss at {addr}, stalling {penalty} cycles')
+            self.clk += penalty
+            self.cache_stall_count += penalty
+
+    # Check the branch in EX against what was predicted at fetch
+    # Only a wrong prediction redirects fetch and flushes IF/ID
+    def resolve_branch(self, taken: bool, target: int) -> None:
+        instr = self.pipeline[2]
+        actual = target if taken else instr.pc + 4
+        predicted = instr.pred_target if instr.pred_target is not None else instr.pc + 4
+
+        self.bp.record(taken, predicted == actual)
+        self.bp.update(instr.pc, taken, target)
+        if predicted != actual:
+            logging.debug(f'EX: Mispredicted branch at {instr.pc}, fetching from {actual}')
+            self.npc = actual
+            self.flush_pipeline()
 
     # Instruction fetch
     def fetch(self):
@@ -173,6 +249,8 @@ class MIPS_lite:
         
         # Get 4 bytes from memory
         d_array = self.mem.read_n(self.pc, 4)
+        if self.icache is not None:
+            self.cache_stall(self.icache, self.pc)
 
         # 'big' here means that that first byte in the array is MSB
         data = int.from_bytes(bytes=d_array, byteorder='big', signed=False)
@@ -184,8 +262,12 @@ class MIPS_lite:
         # Saving pc for every instruction fetch
         self.pipeline[0].pc = self.pc
 
-        # Update PC to PC + 4
+        # Update PC to PC + 4, or to the predicted target
         self.npc = self.pc + 4
+        if self.bp is not None:
+            self.pipeline[0].pred_target = self.bp.predict(self.pc, data)
+            if self.pipeline[0].pred_target is not None:
+                self.npc = self.pipeline[0].pred_target
         
     # Instruction decode
     def decode(self):
@@ -196,9 +278,11 @@ class MIPS_lite:
             if self.pipeline[1].fwd_A == 1:
                 self.pipeline[1].A = self.mem_out
                 self.pipeline[1].fwd_A = 0
+                self.fwd_count[1] += 1
             elif self.pipeline[1].fwd_B == 1:
                 self.pipeline[1].B = self.mem_out
                 self.pipeline[1].fwd_B = 0
+                self.fwd_count[1] += 1
             # Check for hazards
             self.check_data_hazard()
             return
@@ -233,7 +317,7 @@ class MIPS_lite:
             logging.debug(self.pipeline[2])
 
             #Grab operands with fwd
-            if self.mode == 'fwd':
+            if self.forwarding == True:
                 if self.pipeline[2].fwd_A == 0:
                     self.A = self.pipeline[2].A
                 elif self.pipeline[2].fwd_A == 1:
@@ -248,6 +332,10 @@ class MIPS_lite:
                 elif self.pipeline[2].fwd_B == 2:
                     self.B = self.alu_out
 
+                # Count forwarded operands by path, 0 means none
+                self.fwd_count[self.pipeline[2].fwd_A] += 1
+                self.fwd_count[self.pipeline[2].fwd_B] += 1
+
             # no-fwd
             else:
                 # Grab imm, A, B operands
@@ -310,21 +398,26 @@ class MIPS_lite:
                 self.pipeline[2].ref_addr = self.A + self.imm
                 self.mem_instr_count += 1
 
-            # STW
+            # STW, the data to store may have been forwarded
             elif self.pipeline[2].opcode == Instruction.I_type_instr.get('STW'):
                 self.pipeline[2].ref_addr = self.A + self.imm
+                self.pipeline[2].B = self.B
                 self.mem_instr_count += 1
 
             #BZ
             elif self.pipeline[2].opcode == Instruction.I_type_instr.get('BZ'):
-                if self.A == 0:
+                if self.bp is not None:
+                    self.resolve_branch(self.A == 0, self.pipeline[2].pc + (4 * self.imm))
+                elif self.A == 0:
                     self.npc = self.pipeline[2].pc + (4 * self.imm)
                     self.flush_pipeline()
                 self.cntrl_instr_count += 1
           
             #BEQ
             elif self.pipeline[2].opcode == Instruction.I_type_instr.get('BEQ'):
-                if self.A == self.B:
+                if self.bp is not None:
+                    self.resolve_branch(self.A == self.B, self.pipeline[2].pc + (4 * self.imm))
+                elif self.A == self.B:
                     self.npc = self.pipeline[2].pc + (4 * self.imm)
                     self.flush_pipeline()
                 else :
@@ -333,18 +426,21 @@ class MIPS_lite:
             
             #JR
             elif self.pipeline[2].opcode == Instruction.I_type_instr.get('JR'):
-                self.npc = self.R[self.pipeline[2].rs]
-                self.flush_pipeline()
+                if self.bp is not None:
+                    self.resolve_branch(True, self.A)
+                else:
+                    self.npc = self.A
+                    self.flush_pipeline()
                 self.cntrl_instr_count += 1
 
             #HALT
             elif self.pipeline[2].opcode == Instruction.I_type_instr.get('HALT'):
                 self.halt_flag = True
-                self.flush_pipeline()
-                # Undo hazard detection and decrement PC for 2 "invalid" instructions
-                # that were fetched
-                self.pc -= 2 * 4
-                self.npc -= 2 * 4
+                self.flush_pipeline(branch=False)
+                # Undo hazard detection and rewind PC past the "invalid" instructions
+                # that were fetched after HALT
+                self.pc = self.pipeline[2].pc
+                self.npc = self.pipeline[2].pc + 4
                 self.hazard_flag = False
                 self.num_clocks_to_stall = 0
                 self.cntrl_instr_count += 1
@@ -365,19 +461,26 @@ class MIPS_lite:
             if self.pipeline[3].opcode == Instruction.I_type_instr.get('LDW'):
                 # Extract data array from memory
                 data_array = self.mem.read_n(self.pipeline[3].ref_addr, 4)
+                if self.dcache is not None:
+                    self.cache_stall(self.dcache, self.pipeline[3].ref_addr)
                 data = int.from_bytes(bytes=data_array, byteorder='big', signed=True)
                 self.pipeline[3].B = numpy.int32(data)
                 self.mem_out = self.pipeline[3].B
                 logging.debug(f'MEM: Loaded R{self.pipeline[3].get_dest_reg()} with {self.pipeline[3].B} from {self.pipeline[3].ref_addr}')
             elif self.pipeline[3].opcode == Instruction.I_type_instr.get('STW'):
                 # Write data array to memory 
-                if self.mode == 'fwd' and self.pipeline[3].mem_to_mem == 1:
+                if self.pipeline[3].mem_to_mem == 1:
                     int_data = self.mem_out
+                    self.store_fwd_count += 1
                 else:
                     int_data = int(self.pipeline[3].B)
 
-                tobyte = int_data.to_bytes(4, 'big')
+                # Two's complement, the low 32 bits
+                tobyte = (int(int_data) & 0xFFFFFFFF).to_bytes(4, 'big')
                 data_array = self.mem.write_n(self.pipeline[3].ref_addr, tobyte)
+                self.pipeline[3].store_data = tobyte
+                if self.dcache is not None:
+                    self.cache_stall(self.dcache, self.pipeline[3].ref_addr)
                 logging.debug(f'MEM: Stored {int_data} to address {self.pipeline[3].ref_addr}')
                 # Add to modified memory addrs
                 if self.pipeline[3].ref_addr not in self.modified_addrs:
@@ -385,12 +488,21 @@ class MIPS_lite:
             else:
                 self.mem_out = self.pipeline[3].alu_out
 
+    # The register file is written before it is read within a cycle, so an
+    # instruction in ID that already read a register written back this cycle
+    # has to see the new value
+    def refresh_operands(self, reg: int) -> None:
+        if self.pipeline[1] is not None and reg in self.pipeline[1].src_regs:
+            self.pipeline[1].A = numpy.int32(self.R[self.pipeline[1].rs])
+            self.pipeline[1].B = numpy.int32(self.R[self.pipeline[1].rt])
+
     # Instruction writeback
     def writeback(self):
         if self.pipeline[4] is not None:
             if self.pipeline[4].opcode in Instruction.I_type_instr.values():
                 if self.pipeline[4].opcode == Instruction.I_type_instr.get('LDW'):
                     self.R[self.pipeline[4].rt] = self.pipeline[4].B
+                    self.refresh_operands(self.pipeline[4].rt)
                     logging.debug(f'WB: R{self.pipeline[4].rt} = {self.pipeline[4].B}')
                     # Add to modified reg list
                     if self.pipeline[4].rt not in self.modified_regs and self.pipeline[4].rt != 0:
@@ -405,20 +517,84 @@ class MIPS_lite:
                     pass
                 else:
                     self.R[self.pipeline[4].rt] = self.pipeline[4].alu_out
+                    self.refresh_operands(self.pipeline[4].rt)
                     logging.debug(f'WB: R{self.pipeline[4].rt} = {self.pipeline[4].alu_out}')
                     # Add to modified reg list
                     if self.pipeline[4].rt not in self.modified_regs and self.pipeline[4].rt != 0:
                         self.modified_regs.append(self.pipeline[4].rt)
             else:
                 self.R[self.pipeline[4].rd] = self.pipeline[4].alu_out
+                self.refresh_operands(self.pipeline[4].rd)
                 logging.debug(f'WB: R{self.pipeline[4].rd} = {self.pipeline[4].alu_out}')
                 # Add to modified reg list
                 if self.pipeline[4].rd not in self.modified_regs and self.pipeline[4].rd != 0:
                     self.modified_regs.append(self.pipeline[4].rd)
 
+            if self.on_retire is not None:
+                self.on_retire(self.pipeline[4])
+
+
+    # Run a multi-cycle stall in one call. The front end is frozen and EX only
+    # holds bubbles, so the hazard re-check and MEM/WB are the only stages with work
+    # Stops early at the next performance counter window boundary
+    def skip_stall(self) -> None:
+        self.hazard_flag = True
+        while self.data_hazard == True and self.num_clocks_to_stall > 0:
+            self.pipeline = self.pipeline[0:2] + [None] + self.pipeline[2:-1]
+            self.num_clocks_to_stall -= 1
+            self.stall_count += 1
+            self.load_use_stall_count += self.stall_is_load
+
+            self.decode()
+            self.memory()
+            self.writeback()
+            self.clk += 1
+
+            if self.num_clocks_to_stall == 0:
+                self.data_hazard = False
+                if self.pipeline[1] is not None:
+                    self.pipeline[1].A = numpy.int32(self.R[self.pipeline[1].rs])
+                    self.pipeline[1].B = numpy.int32(self.R[self.pipeline[1].rt])
+
+            if self.clk >= self.perf_next_clk:
+                break
+
+        self.pc = self.npc
+
+    # Nothing will be fetched or executed any more, retire what is left in MEM/WB
+    # Returns True like do_cpu_things() does on the final (empty) cycle, and
+    # False when it stops early at the next performance counter window boundary
+    def skip_drain(self) -> bool:
+        while self.pipeline[2] is not None or self.pipeline[3] is not None:
+            self.pipeline = [None] + self.pipeline[0:-1]
+            self.memory()
+            self.writeback()
+            self.clk += 1
+
+            if self.clk >= self.perf_next_clk:
+                self.pc = self.npc
+                self.perf.sample()
+                return False
+
+        self.pipeline = [None] * len(self.pipeline)
+        self.hazard_flag = False
+        self.data_hazard = False
+        self.num_clocks_to_stall = 0
+        self.pc = self.npc
+        return True
 
     # CPU Operation per clock cycle
     def do_cpu_things(self) -> None:
+        # Jump over cycles whose outcome is already known
+        if self.event_skip == True:
+            if self.halt_flag == True and self.pipeline[0] is None and self.pipeline[1] is None:
+                return self.skip_drain()
+            if self.data_hazard == True and self.num_clocks_to_stall > 1:
+                self.skip_stall()
+                if self.clk >= self.perf_next_clk:
+                    self.perf.sample()
+                return False
+
         # Shift instructions in the pipeline according to hazard conditions
         self.hazard_flag = self.data_hazard
 
@@ -430,6 +606,7 @@ class MIPS_lite:
             # Decrement hazard stall clocks
             self.num_clocks_to_stall -= 1
             self.stall_count += 1
+            self.load_use_stall_count += self.stall_is_load
 
         else:
             # [i0, i1, i2, i3, i4] --> [None, i0, i1, i2, i3]
@@ -457,8 +634,9 @@ class MIPS_lite:
         # Set PC to updated value
         self.pc = self.npc
 
-        # Print register contents
-        logging.debug(f'Registers: {self.R}')
+        # Print register contents, unless a state log records the changes
+        if self.dump_registers == True:
+            logging.debug(f'Registers: {self.R}')
 
         # Increment clock
         self.clk += 1
@@ -470,4 +648,7 @@ class MIPS_lite:
             self.clk -= 1
             return True
         else:
+            # Close the current performance counter window
+            if self.clk >= self.perf_next_clk:
+                self.perf.sample()
             return False
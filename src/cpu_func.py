@@ -13,7 +13,7 @@ import logging
 import numpy
 from instruction import Instruction
 
-from parser import parser
+from parser import load_image
 
 # Get twos complement value
 def get_twos_complement_val(val: int, bits: int) -> int:
@@ -24,7 +24,7 @@ def get_twos_complement_val(val: int, bits: int) -> int:
 
 class MIPS_lite_func:
     #Init
-    def __init__ (self, mem_fname: str) -> None:
+    def __init__ (self, mem_fname: str, mem: memory.Memory = None) -> None:
         # Save memory image filename, and output filename 
         self.mem_fname = mem_fname
 
@@ -32,17 +32,23 @@ class MIPS_lite_func:
         logging.debug('Starting simulator with the following config: ')
         logging.debug('Memory Image File: ' + self.mem_fname)
        
+        # Full register dump every instruction in DEBUG
+        self.dump_registers = logging.getLogger().isEnabledFor(logging.DEBUG)
+
         self.pc = 0
         self.npc = 0 
         self.rs = 0
         self.rt = 0
         self.R = [0] * 32
 
-        # Instantiate memory object
-        self.mem = memory.Memory(config.MEM_SIZE)
+        # Instantiate memory object, or share the one we were handed
+        if mem is None:
+            self.mem = memory.Memory(config.MEM_SIZE)
 
-        # Fill memory with data
-        self.mem.write_n(0, parser(self.mem_fname))
+            # Fill memory with data
+            load_image(self.mem, self.mem_fname)
+        else:
+            self.mem = mem
 
         # Variables needed for final output prints
         self.modified_regs = []
@@ -54,6 +60,9 @@ class MIPS_lite_func:
         self.cntrl_instr_count = 0
         self.stall_count = 0
 
+        # Loop fast-forward, see loopff.py
+        self.loop_ff = None
+
     
     def do_cpu_things(self) -> None:
         # FETCH
@@ -153,7 +162,8 @@ class MIPS_lite_func:
             ref_addr = self.R[instr.rs] + instr.imm_ext
             # Write data array to memory 
             int_data = int(self.R[instr.rt])
-            tobyte = int_data.to_bytes(4, 'big')
+            # Two's complement, the low 32 bits
+            tobyte = (int_data & 0xFFFFFFFF).to_bytes(4, 'big')
             data_array = self.mem.write_n(ref_addr, tobyte)
             logging.debug(f'MEM: Stored {int_data} to address {ref_addr}')
 
@@ -166,6 +176,8 @@ class MIPS_lite_func:
             if self.R[instr.rs] == 0:
                 self.npc = self.pc + (4 * instr.imm_ext)
             self.cntrl_instr_count += 1
+            if self.loop_ff is not None and self.npc <= self.pc:
+                self.loop_ff.back_edge(self.pc, self.npc)
         
         #BEQ
         elif instr.opcode == Instruction.I_type_instr.get('BEQ'):
@@ -174,11 +186,15 @@ class MIPS_lite_func:
             else :
                 self.npc = self.pc + 4
             self.cntrl_instr_count += 1
+            if self.loop_ff is not None and self.npc <= self.pc:
+                self.loop_ff.back_edge(self.pc, self.npc)
         
         #JR
         elif instr.opcode == Instruction.I_type_instr.get('JR'):
             self.npc = self.R[instr.rs]
             self.cntrl_instr_count += 1
+            if self.loop_ff is not None and self.npc <= self.pc:
+                self.loop_ff.back_edge(self.pc, self.npc)
 
         #HALT
         elif instr.opcode == Instruction.I_type_instr.get('HALT'):
@@ -187,8 +203,9 @@ class MIPS_lite_func:
         # Set PC to updated value
         self.pc = self.npc
 
-        # Print register contents
-        logging.debug(f'Registers: {self.R}')
+        # Print register contents, unless a state log records the changes
+        if self.dump_registers == True:
+            logging.debug(f'Registers: {self.R}')
 
 
         return (instr.opcode == Instruction.I_type_instr.get('HALT'))
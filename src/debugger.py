@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+
+"""
+debugger.py: Breakpoints and watchpoints for both simulators
+
+Breakpoints: PC, total instruction count and clock cycle (pipelined only).
+Watchpoints: registers and memory words.
+
+run() picks a loop that only checks what is actually set, without anything
+set it is the plain simulation loop.
+"""
+
+import cpu
+
+class Debugger:
+    # Init
+    def __init__(self, sim) -> None:
+        self.sim = sim
+        self.pipelined = isinstance(sim, cpu.MIPS_lite)
+
+        self.break_pcs = set()
+        self.break_instrs = None
+        self.break_cycles = None
+        self.watch_regs = {}
+        self.watch_addrs = set()
+
+        # Set once the simulator has halted, it must not be stepped again
+        self.halted = False
+
+    # Stop when the instruction at pc executes, see hybrid.reached()
+    def add_breakpoint(self, pc: int) -> None:
+        self.break_pcs.add(pc)
+
+    # Stop once n instructions have executed in total, fires once
+    def add_instr_breakpoint(self, n: int) -> None:
+        self.break_instrs = n
+
+    # Stop at clock cycle n, fires once
+    def add_cycle_breakpoint(self, n: int) -> None:
+        assert self.pipelined, "Cycle breakpoints need a pipelined mode"
+        self.break_cycles = n
+
+    # Stop whenever the value of register reg changes
+    def watch_register(self, reg: int) -> None:
+        assert 0 <= reg < len(self.sim.R), "Register out of range"
+        self.watch_regs[reg] = self.sim.R[reg]
+
+    # Stop whenever the word at addr is written
+    def watch_memory(self, addr: int) -> None:
+        self.sim.mem.watch(addr)
+        self.watch_addrs.add(addr - addr % 4)
+
+    # Drop every breakpoint and watchpoint
+    def clear(self) -> None:
+        self.break_pcs.clear()
+        self.break_instrs = None
+        self.break_cycles = None
+        self.watch_regs.clear()
+        self.watch_addrs.clear()
+        self.sim.mem.unwatch_all()
+
+    # Checks for the breakpoints and watchpoints that are set
+    # Each returns a stop reason tuple or None
+    def checks(self) -> list:
+        sim = self.sim
+        checks = []
+
+        if len(self.break_pcs) > 0:
+            pcs = frozenset(self.break_pcs)
+            if self.pipelined:
+                def check_pc():
+                    if sim.pipeline[2] is not None and sim.pipeline[2].pc in pcs:
+                        return ('breakpoint', sim.pipeline[2].pc)
+            else:
+                def check_pc():
+                    if sim.pc in pcs:
+                        return ('breakpoint', sim.pc)
+            checks.append(check_pc)
+
+        if self.break_instrs is not None:
+            def check_instrs():
+                if sim.instr_count >= self.break_instrs:
+                    self.break_instrs = None
+                    return ('instructions', sim.instr_count)
+            checks.append(check_instrs)
+
+        if self.break_cycles is not None:
+            def check_cycles():
+                if sim.clk >= self.break_cycles:
+                    self.break_cycles = None
+                    return ('cycle', sim.clk)
+            checks.append(check_cycles)
+
+        if len(self.watch_regs) > 0:
+            def check_regs():
+                for reg, old in self.watch_regs.items():
+                    if sim.R[reg] != old:
+                        self.watch_regs[reg] = sim.R[reg]
+                        return ('register', reg, int(old), int(sim.R[reg]))
+            checks.append(check_regs)
+
+        if len(self.watch_addrs) > 0:
+            hits = sim.mem.watch_hits
+            def check_mem():
+                if len(hits) > 0:
+                    return ('memory',) + hits.pop(0)
+            checks.append(check_mem)
+
+        return checks
+
+    # Run until HALT, a breakpoint or a watchpoint, at most max_steps steps
+    # (cycles, or instructions in FUNC). Returns the stop reason: ('halt',),
+    # ('breakpoint', pc), ('instructions', count), ('cycle', clk),
+    # ('register', reg, old, new), ('memory', addr, old, new), or None if
+    # max_steps ran out
+    def run(self, max_steps: int = None) -> tuple:
+        sim = self.sim
+        checks = self.checks()
+
+        # Watchpoints hit earlier in a multi-word write are still pending
+        if len(self.watch_addrs) > 0 and len(sim.mem.watch_hits) > 0:
+            return ('memory',) + sim.mem.watch_hits.pop(0)
+        if self.halted:
+            return ('halt',)
+
+        # Nothing set: the plain loop
+        if len(checks) == 0:
+            if max_steps is None:
+                while sim.do_cpu_things() != True:
+                    pass
+                self.halted = True
+                return ('halt',)
+            for _ in range(max_steps):
+                if sim.do_cpu_things() == True:
+                    self.halted = True
+                    return ('halt',)
+            return None
+
+        # Skipped stall cycles would jump over cycle breakpoints
+        event_skip = getattr(sim, 'event_skip', False)
+        if self.break_cycles is not None:
+            sim.event_skip = False
+
+        try:
+            steps = 0
+            while max_steps is None or steps < max_steps:
+                halt = sim.do_cpu_things()
+                steps += 1
+                self.halted = halt == True
+                for check in checks:
+                    reason = check()
+                    if reason is not None:
+                        return reason
+                if halt == True:
+                    return ('halt',)
+            return None
+        finally:
+            if self.pipelined:
+                sim.event_skip = event_skip
+
+# Describe a stop reason
+def describe(reason: tuple) -> str:
+    kind = reason[0]
+    if kind == 'halt':
+        return 'Halted'
+    if kind == 'breakpoint':
+        return f'Breakpoint at PC {reason[1]}'
+    if kind == 'instructions':
+        return f'Instruction count breakpoint: {reason[1]} instructions executed'
+    if kind == 'cycle':
+        return f'Cycle breakpoint: clock {reason[1]}'
+    if kind == 'register':
+        return f'Watchpoint: R{reason[1]} changed from {reason[2]} to {reason[3]}'
+    return f'Watchpoint: Addr {reason[1]} changed from {reason[2]} to {reason[3]}'
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+
+"""
+ensemble.py: Functional simulation of many images in lockstep
+
+Each image is a lane with its own registers and memory, held together in
+NumPy arrays. Lanes at the same PC form a group and every step executes one
+instruction for a whole group at once. The group with the lowest PC goes
+first, so lanes that split up at a branch wait for each other and join again
+where their paths meet. Images that only differ in their data run about as
+fast as a single image.
+
+Results match MIPS_lite_func lane by lane as long as every register value
+fits in 64 bits. Loaded values wrap around at 32 bits like the numpy.int32
+values there. Other values are kept in 64 bits, where the functional
+simulator lets them grow without bound, so a program whose registers go past
+the int64 range gives different results here (numpy wraps them silently).
+
+Run with:
+    ./ensemble.py <memory_image> [memory_image ...]
+"""
+
+import config
+import logging
+import numpy
+import sys
+import time
+
+from cpu_func import get_twos_complement_val
+from instruction import Instruction
+from parser import segments
+
+ADD = Instruction.R_type_instr['ADD']
+SUB = Instruction.R_type_instr['SUB']
+MUL = Instruction.R_type_instr['MUL']
+OR = Instruction.R_type_instr['OR']
+AND = Instruction.R_type_instr['AND']
+XOR = Instruction.R_type_instr['XOR']
+ADDI = Instruction.I_type_instr['ADDI']
+SUBI = Instruction.I_type_instr['SUBI']
+MULI = Instruction.I_type_instr['MULI']
+ORI = Instruction.I_type_instr['ORI']
+ANDI = Instruction.I_type_instr['ANDI']
+XORI = Instruction.I_type_instr['XORI']
+LDW = Instruction.I_type_instr['LDW']
+STW = Instruction.I_type_instr['STW']
+BZ = Instruction.I_type_instr['BZ']
+BEQ = Instruction.I_type_instr['BEQ']
+JR = Instruction.I_type_instr['JR']
+HALT = Instruction.I_type_instr['HALT']
+
+# ALU operations on whole columns, by opcode
+ALU_OPS = {
+    ADD: numpy.add, ADDI: numpy.add,
+    SUB: numpy.subtract, SUBI: numpy.subtract,
+    MUL: numpy.multiply, MULI: numpy.multiply,
+    OR: numpy.bitwise_or, ORI: numpy.bitwise_or,
+    AND: numpy.bitwise_and, ANDI: numpy.bitwise_and,
+    XOR: numpy.bitwise_xor, XORI: numpy.bitwise_xor,
+}
+ARITHMETIC_opcodes = frozenset([ADD, ADDI, SUB, SUBI, MUL, MULI])
+LOGICAL_opcodes = frozenset([OR, ORI, AND, ANDI, XOR, XORI])
+
+# Byte offsets of a big-endian word and their shifts
+WORD_BYTES = numpy.arange(4)
+WORD_SHIFTS = numpy.array([24, 16, 8, 0], dtype=numpy.int64)
+
+# Wrap 64 bit values to signed 32 bit ones
+def to_int32(values: numpy.ndarray) -> numpy.ndarray:
+    return ((values + (1 << 31)) & 0xFFFFFFFF) - (1 << 31)
+
+class MIPS_lite_ensemble:
+    # Init
+    # One lane per memory image
+    def __init__(self, mem_fnames: list) -> None:
+        assert len(mem_fnames) > 0, "Need at least one memory image"
+        self.mem_fnames = mem_fnames
+        self.lanes = len(mem_fnames)
+        lanes = self.lanes
+
+        self.mem = numpy.zeros((lanes, config.MEM_SIZE), dtype=numpy.uint8)
+        for lane, fname in enumerate(mem_fnames):
+            for addr, data in segments(fname):
+                assert addr + len(data) <= config.MEM_SIZE, "Address out of range"
+                self.mem[lane, addr:addr+len(data)] = numpy.frombuffer(bytes(data), dtype=numpy.uint8)
+
+        # Registers, and which of them hold 32 bit values that wrap around
+        self.R = numpy.zeros((lanes, 32), dtype=numpy.int64)
+        self.narrow = numpy.zeros((lanes, 32), dtype=bool)
+        self.pc = numpy.zeros(lanes, dtype=numpy.int64)
+        self.halted = numpy.zeros(lanes, dtype=bool)
+
+        # Variables needed for final output prints, per lane
+        self.modified_regs = numpy.zeros((lanes, 32), dtype=bool)
+        self.modified_addrs = numpy.zeros((lanes, config.MEM_SIZE), dtype=bool)
+        self.instr_count = numpy.zeros(lanes, dtype=numpy.int64)
+        self.arithmetic_instr_count = numpy.zeros(lanes, dtype=numpy.int64)
+        self.logical_instr_count = numpy.zeros(lanes, dtype=numpy.int64)
+        self.mem_instr_count = numpy.zeros(lanes, dtype=numpy.int64)
+        self.cntrl_instr_count = numpy.zeros(lanes, dtype=numpy.int64)
+
+        # Group steps taken, each runs one instruction on one or more lanes
+        self.steps = 0
+        self.decoded = {}
+
+    # Decoded instruction for a word, decoded once
+    def decode(self, word: int) -> Instruction:
+        instr = self.decoded.get(word)
+        if instr is None:
+            instr = Instruction(word)
+            instr.decode()
+            if instr.type == 'I':
+                instr.imm_ext = get_twos_complement_val(instr.imm, 16)
+            self.decoded[word] = instr
+        return instr
+
+    # Words at addrs, one address per lane
+    def read_words(self, lanes: numpy.ndarray, addrs: numpy.ndarray) -> numpy.ndarray:
+        assert numpy.all(addrs >= 0) and numpy.all(addrs + 4 <= config.MEM_SIZE), "Address out of range"
+        data = self.mem[lanes[:, None], addrs[:, None] + WORD_BYTES].astype(numpy.int64)
+        return (data << WORD_SHIFTS).sum(axis=1)
+
+    def write_words(self, lanes: numpy.ndarray, addrs: numpy.ndarray, values: numpy.ndarray) -> None:
+        assert numpy.all(addrs >= 0) and numpy.all(addrs + 4 <= config.MEM_SIZE), "Address out of range"
+        data = ((values[:, None] & 0xFFFFFFFF) >> WORD_SHIFTS) & 0xFF
+        self.mem[lanes[:, None], addrs[:, None] + WORD_BYTES] = data.astype(numpy.uint8)
+
+    # Execute one instruction for the lanes at the lowest PC
+    # Returns True once all lanes have halted
+    def do_cpu_things(self) -> bool:
+        running = numpy.flatnonzero(~self.halted)
+        if len(running) == 0:
+            return True
+        pc = self.pc[running].min()
+        lanes = running[self.pc[running] == pc]
+
+        # FETCH, lanes with a different word here wait for the next step
+        words = self.read_words(lanes, numpy.full(len(lanes), pc))
+        word = int(words[0])
+        if len(lanes) > 1 and not numpy.all(words == word):
+            lanes = lanes[words == word]
+        instr = self.decode(word)
+        self.steps += 1
+        logging.debug(f'PC {pc}: {instr.get_instr().strip()} on {len(lanes)} lanes')
+
+        # EXECUTE
+        op = instr.opcode
+        self.instr_count[lanes] += 1
+        dest = instr.rd if instr.type == 'R' else instr.rt
+        if dest != 0:
+            self.modified_regs[lanes, dest] = True
+        npc = pc + 4
+
+        if op in ALU_OPS:
+            if instr.type == 'R':
+                val = ALU_OPS[op](self.R[lanes, instr.rs], self.R[lanes, instr.rt])
+                narrow = self.narrow[lanes, instr.rs] | self.narrow[lanes, instr.rt]
+            else:
+                val = ALU_OPS[op](self.R[lanes, instr.rs], instr.imm_ext)
+                narrow = self.narrow[lanes, instr.rs]
+            self.R[lanes, dest] = numpy.where(narrow, to_int32(val), val)
+            self.narrow[lanes, dest] = narrow
+            if op in ARITHMETIC_opcodes:
+                self.arithmetic_instr_count[lanes] += 1
+            else:
+                self.logical_instr_count[lanes] += 1
+
+        elif op == LDW:
+            data = self.read_words(lanes, self.R[lanes, instr.rs] + instr.imm_ext)
+            self.R[lanes, instr.rt] = to_int32(data)
+            self.narrow[lanes, instr.rt] = True
+            self.mem_instr_count[lanes] += 1
+
+        elif op == STW:
+            addrs = self.R[lanes, instr.rs] + instr.imm_ext
+            self.write_words(lanes, addrs, self.R[lanes, instr.rt])
+            self.modified_addrs[lanes, addrs] = True
+            self.mem_instr_count[lanes] += 1
+
+        elif op == BZ:
+            npc = numpy.where(self.R[lanes, instr.rs] == 0, pc + 4 * instr.imm_ext, pc + 4)
+            self.cntrl_instr_count[lanes] += 1
+
+        elif op == BEQ:
+            npc = numpy.where(self.R[lanes, instr.rs] == self.R[lanes, instr.rt], pc + 4 * instr.imm_ext, pc + 4)
+            self.cntrl_instr_count[lanes] += 1
+
+        elif op == JR:
+            npc = self.R[lanes, instr.rs]
+            self.cntrl_instr_count[lanes] += 1
+
+        elif op == HALT:
+            self.halted[lanes] = True
+            self.cntrl_instr_count[lanes] += 1
+
+        self.pc[lanes] = npc
+        return bool(numpy.all(self.halted))
+
+    # Run until every lane has halted, or for at most max_steps group steps
+    def run(self, max_steps: int = None) -> bool:
+        while max_steps is None or max_steps > 0:
+            if self.do_cpu_things() == True:
+                return True
+            if max_steps is not None:
+                max_steps -= 1
+        return bool(numpy.all(self.halted))
+
+    # Per-lane report
+    def report(self) -> str:
+        info = f'Ensemble: {self.lanes} lanes, {self.steps} group steps, ' + \
+               f'{int(self.instr_count.sum())} lane instructions'
+        for lane in range(self.lanes):
+            info += f'\n\nLane {lane}: {self.mem_fnames[lane]}'
+            info += f'\nFinal PC: {self.pc[lane]}, ' + ('Halted' if self.halted[lane] else 'Running')
+            info += f'\nTotal Instructions: {self.instr_count[lane]}, ' + \
+                    f'Arithmetic: {self.arithmetic_instr_count[lane]}, ' + \
+                    f'Logical: {self.logical_instr_count[lane]}, Memory: {self.mem_instr_count[lane]}, ' + \
+                    f'Control: {self.cntrl_instr_count[lane]}'
+            for reg in numpy.flatnonzero(self.modified_regs[lane]):
+                info += f'\nR{reg}: {self.R[lane, reg]}'
+            for addr in numpy.flatnonzero(self.modified_addrs[lane]):
+                data = int(self.read_words(numpy.array([lane]), numpy.array([addr]))[0])
+                info += f'\nAddr: {addr}, Data: {data}'
+        return info
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("./ensemble.py <memory_image> [memory_image ...]")
+        exit(1)
+
+    logging.basicConfig(format=config.LOG_FORMAT, level=logging.ERROR)
+
+    ensemble = MIPS_lite_ensemble(sys.argv[1:])
+    start = time.perf_counter()
+    ensemble.run()
+    elapsed = time.perf_counter() - start
+
+    print(ensemble.report())
+    print(f'\nHost throughput: {int(ensemble.instr_count.sum()) / elapsed:.0f} lane instructions/s')
@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+
+"""
+fuzz.py: Random program fuzzer with differential execution across all modes
+
+Generates random, valid MIPS-Lite programs with bounded loops, in-range
+LDW/STW addresses and a guaranteed HALT, runs each one in FUNC, NO-FWD and FWD
+mode and flags architectural mismatches and broken cycle count invariants.
+Failing programs are minimized by replacing instructions with NOPs.
+
+Run with:
+    ./fuzz.py <num_programs> [first_seed] [jobs] [out_dir]
+"""
+
+import config
+import cpu
+import cpu_func
+import logging
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+import warnings
+from instruction import Instruction
+
+# Program layout: code from address 0, data words at DATA_BASE. Everything in
+# between stays zero, which decodes as a harmless ADD R0, R0, R0
+DATA_BASE = 2048
+DATA_WORDS = 32
+
+# Register roles. R1 holds DATA_BASE and R2 the loop counter, neither is
+# touched by random instructions. R3 holds JR targets
+BASE_REG = 1
+LOOP_REG = 2
+JUMP_REG = 3
+WORK_REGS = list(range(4, 12))
+
+# Random program shape
+MAX_ITEMS = 24
+MAX_LOOPS = 3
+MAX_LOOP_ITERS = 6
+MAX_LOOP_BODY = 8
+MAX_SKIP = 4
+
+# Safety net against runaway programs
+MAX_INSTRS = 5000
+CYCLES_PER_INSTR = 5
+
+# Replacement used while minimizing
+NOP = Instruction.encode('ADD')
+
+MODES = ['func'] + list(config.PIPELINES)
+
+# Registers are 32 bits, the functional model keeps Python ints
+def to_int32(val) -> int:
+    return ((int(val) + (1 << 31)) & 0xFFFFFFFF) - (1 << 31)
+
+class ProgramGenerator:
+    # Init
+    def __init__(self, seed: int) -> None:
+        self.rng = random.Random(seed)
+        self.words = []
+
+    def emit(self, name: str, rs: int = 0, rt: int = 0, rd: int = 0, imm: int = 0) -> int:
+        self.words.append(Instruction.encode(name, rs=rs, rt=rt, rd=rd, imm=imm))
+        return len(self.words) - 1
+
+    # Re-encode the immediate of an already emitted I-type instruction
+    def patch(self, index: int, imm: int) -> None:
+        word = self.words[index] & ~Instruction.IMM_BITMASK
+        self.words[index] = word | (imm & Instruction.IMM_BITMASK)
+
+    def work_reg(self) -> int:
+        return self.rng.choice(WORK_REGS)
+
+    # Source register, sometimes R0
+    def src_reg(self) -> int:
+        return 0 if self.rng.random() < 0.1 else self.work_reg()
+
+    def data_offset(self) -> int:
+        return 4 * self.rng.randrange(DATA_WORDS)
+
+    # One straight line operation, possibly a few instructions long
+    def operation(self, allow_jump: bool = True) -> None:
+        rng = self.rng
+        kind = rng.choice(['alu', 'alu', 'alu_imm', 'alu_imm', 'mul', 'load', 'load', 'store', 'store',
+                           'skip', 'jump' if allow_jump else 'skip'])
+
+        if kind == 'alu':
+            name = rng.choice(['ADD', 'SUB', 'OR', 'AND', 'XOR'])
+            self.emit(name, rs=self.src_reg(), rt=self.src_reg(), rd=self.work_reg())
+        elif kind == 'alu_imm':
+            name = rng.choice(['ADDI', 'SUBI', 'ORI', 'ANDI', 'XORI'])
+            imm = rng.randint(-64, 64) if name in ['ADDI', 'SUBI'] else rng.randint(0, 0xFF)
+            self.emit(name, rs=self.src_reg(), rt=self.work_reg(), imm=imm)
+        elif kind == 'mul':
+            # Multiply masked operands so values can not grow without bound
+            a = self.work_reg()
+            self.emit('ANDI', rs=self.work_reg(), rt=a, imm=0xFF)
+            if rng.random() < 0.5:
+                self.emit('MULI', rs=a, rt=self.work_reg(), imm=rng.randint(-16, 16))
+            else:
+                b = self.work_reg()
+                self.emit('ANDI', rs=self.work_reg(), rt=b, imm=0xFF)
+                self.emit('MUL', rs=a, rt=b, rd=self.work_reg())
+        elif kind == 'load':
+            self.emit('LDW', rs=BASE_REG, rt=self.work_reg(), imm=self.data_offset())
+        elif kind == 'store':
+            # Stored values are kept positive and within 32 bits
+            data = self.work_reg()
+            self.emit('ANDI', rs=self.work_reg(), rt=data, imm=0x7FFF)
+            for _ in range(rng.randint(0, 2)):
+                reg = self.work_reg()
+                if reg != data:
+                    self.emit('ADDI', rs=self.src_reg(), rt=reg, imm=rng.randint(-8, 8))
+            self.emit('STW', rs=BASE_REG, rt=data, imm=self.data_offset())
+        elif kind == 'skip':
+            # Forward conditional branch over a few operations
+            if rng.random() < 0.5:
+                branch = self.emit('BZ', rs=self.src_reg())
+            else:
+                branch = self.emit('BEQ', rs=self.src_reg(), rt=self.src_reg())
+            for _ in range(rng.randint(1, MAX_SKIP)):
+                self.operation(allow_jump=False)
+            self.patch(branch, len(self.words) - branch)
+        else:
+            # Jump over a few operations through a register
+            target = self.emit('ADDI', rs=0, rt=JUMP_REG)
+            self.emit('JR', rs=JUMP_REG)
+            for _ in range(rng.randint(1, MAX_SKIP)):
+                self.operation(allow_jump=False)
+            self.patch(target, 4 * len(self.words))
+
+    # Counted loop: the body runs 1 to MAX_LOOP_ITERS times
+    def loop(self) -> None:
+        self.emit('ADDI', rs=0, rt=LOOP_REG, imm=self.rng.randint(1, MAX_LOOP_ITERS))
+        top = len(self.words)
+        for _ in range(self.rng.randint(1, MAX_LOOP_BODY)):
+            self.operation()
+        self.emit('SUBI', rs=LOOP_REG, rt=LOOP_REG, imm=1)
+        self.emit('BZ', rs=LOOP_REG, imm=2)
+        back = self.emit('BEQ')
+        self.patch(back, top - back)
+
+    # Returns the instruction words and the initial data words
+    def generate(self) -> tuple:
+        rng = self.rng
+        self.emit('ADDI', rs=0, rt=BASE_REG, imm=DATA_BASE)
+        for reg in WORK_REGS:
+            if rng.random() < 0.5:
+                self.emit('ADDI', rs=0, rt=reg, imm=rng.randint(-100, 100))
+
+        loops = 0
+        for _ in range(rng.randint(1, MAX_ITEMS)):
+            if loops < MAX_LOOPS and rng.random() < 0.2:
+                self.loop()
+                loops += 1
+            else:
+                self.operation()
+        self.emit('HALT')
+
+        data = [rng.randint(-1000, 1000) for _ in range(DATA_WORDS)]
+        return self.words, data
+
+# Write a sparse memory image, see parser.load_image()
+def write_image(fname: str, words: list, data: list) -> None:
+    with open(fname, 'w') as f:
+        for word in words:
+            f.write('%08x\n' % (word & 0xFFFFFFFF))
+        f.write('@%x\n' % DATA_BASE)
+        for word in data:
+            f.write('%08x\n' % (word & 0xFFFFFFFF))
+
+# Disassembly listing of a program
+def disassemble(words: list) -> str:
+    lines = []
+    for index, word in enumerate(words):
+        instr = Instruction(word)
+        instr.decode()
+        lines.append(f'{4 * index}: {word:08x}  {instr.get_instr().strip()}')
+    return '\n'.join(lines)
+
+# Run an image in one mode, returns the final state and statistics
+# Pipelined runs get enough cycles for every instruction to stall and flush
+def run_mode(mode: str, fname: str, max_instrs: int = MAX_INSTRS) -> dict:
+    result = {'mode': mode}
+    try:
+        if mode == 'func':
+            sim = cpu_func.MIPS_lite_func(fname)
+            taken = 0
+            while sim.instr_count < max_instrs:
+                pc = sim.pc
+                if sim.do_cpu_things() == True:
+                    break
+                if sim.pc != pc + 4:
+                    taken += 1
+            else:
+                result['timeout'] = True
+            result['taken'] = taken
+        else:
+            sim = cpu.MIPS_lite(mode, fname)
+            while sim.clk < CYCLES_PER_INSTR * max_instrs:
+                if sim.do_cpu_things() == True:
+                    break
+            else:
+                result['timeout'] = True
+            result['clk'] = sim.clk
+            result['stall_count'] = sim.stall_count
+            result['num_data_hazards'] = sim.num_data_hazards
+            result['flush_penalty'] = sim.hazard.ex_stage
+            result['fill'] = len(sim.hazard.stages) - 1
+            result['max_stall'] = max(entry[0] for table in sim.hazard.table for entry in table if entry is not None)
+    except (Exception, SystemExit) as err:
+        result['error'] = f'{type(err).__name__}: {err}'
+        return result
+
+    result['pc'] = sim.pc
+    result['R'] = [to_int32(val) for val in sim.R]
+    result['mem'] = bytes(sim.mem.mem)
+    result['counts'] = (sim.instr_count, sim.arithmetic_instr_count, sim.logical_instr_count,
+                        sim.mem_instr_count, sim.cntrl_instr_count)
+    return result
+
+# Compare the runs of all modes, returns a list of (kind, description)
+def check(results: dict) -> list:
+    problems = []
+    for mode, res in results.items():
+        if 'error' in res:
+            problems.append((f'{mode}:error', f'{mode} raised {res["error"]}'))
+        elif 'timeout' in res:
+            problems.append((f'{mode}:timeout', f'{mode} did not halt within its budget'))
+    if len(problems) > 0:
+        return problems
+
+    ref = results['func']
+    for mode in config.PIPELINES:
+        res = results[mode]
+        if res['pc'] != ref['pc']:
+            problems.append((f'{mode}:pc', f'{mode} final PC {res["pc"]}, func {ref["pc"]}'))
+        for reg in range(len(ref['R'])):
+            if res['R'][reg] != ref['R'][reg]:
+                problems.append((f'{mode}:reg', f'{mode} R{reg} = {res["R"][reg]}, func {ref["R"][reg]}'))
+        for addr in range(0, len(ref['mem']), 4):
+            if res['mem'][addr:addr+4] != ref['mem'][addr:addr+4]:
+                problems.append((f'{mode}:mem', f'{mode} word at {addr} = {res["mem"][addr:addr+4].hex()}, ' +
+                                 f'func {ref["mem"][addr:addr+4].hex()}'))
+        if res['counts'] != ref['counts']:
+            problems.append((f'{mode}:counts', f'{mode} instruction counts {res["counts"]}, func {ref["counts"]}'))
+            continue
+
+        # Every cycle is an instruction, a fill/drain cycle, a stall or a flushed slot
+        expected = ref['counts'][0] + res['fill'] + res['stall_count'] + res['flush_penalty'] * ref['taken']
+        if res['clk'] != expected:
+            problems.append((f'{mode}:cycles', f'{mode} took {res["clk"]} cycles, expected {expected}'))
+        if res['stall_count'] > res['max_stall'] * res['num_data_hazards']:
+            problems.append((f'{mode}:stalls', f'{mode} stalled {res["stall_count"]} cycles for ' +
+                             f'{res["num_data_hazards"]} data hazards'))
+
+    # Forwarding can only remove stalls
+    if len(problems) == 0:
+        for stat in ['clk', 'stall_count', 'num_data_hazards']:
+            if results['fwd'][stat] > results['no-fwd'][stat]:
+                problems.append((f'fwd:{stat}', f'fwd {stat} {results["fwd"][stat]} > ' +
+                                 f'no-fwd {results["no-fwd"][stat]}'))
+    return problems
+
+# Run a program through every mode
+def run_program(words: list, data: list, tmpdir: str, max_instrs: int = MAX_INSTRS) -> tuple:
+    fname = os.path.join(tmpdir, 'prog.mem')
+    write_image(fname, words, data)
+    results = {mode: run_mode(mode, fname, max_instrs) for mode in MODES}
+    return results, check(results)
+
+# Shrink a failing program while it keeps failing with the same first problem
+# kind. Instructions are replaced by NOPs so branch offsets stay valid, in
+# halving chunks as in delta debugging. HALT is left alone
+# NOPing loop control can make a candidate spin, max_instrs cuts those short
+def minimize(words: list, data: list, kind: str, tmpdir: str, max_instrs: int) -> list:
+    def fails(candidate: list) -> bool:
+        _, problems = run_program(candidate, data, tmpdir, max_instrs)
+        return kind in [problem[0] for problem in problems]
+
+    words = list(words)
+    chunk = max(1, len(words) // 2)
+    while True:
+        progress = False
+        live = [index for index in range(len(words) - 1) if words[index] != NOP]
+        for start in range(0, len(live), chunk):
+            candidate = list(words)
+            for index in live[start:start+chunk]:
+                candidate[index] = NOP
+            if fails(candidate):
+                words = candidate
+                progress = True
+        if chunk == 1 and progress == False:
+            return words
+        if progress == False:
+            chunk = max(1, chunk // 2)
+
+# Pool worker: generate, run, check and minimize one program
+def fuzz_one(seed: int) -> dict:
+    words, data = ProgramGenerator(seed).generate()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        start = time.perf_counter()
+        results, problems = run_program(words, data, tmpdir)
+        report = {'seed': seed, 'words': words, 'data': data, 'problems': problems,
+                  'instrs': results['func'].get('counts', [0])[0],
+                  'cycles': sum(results[mode].get('clk', 0) for mode in config.PIPELINES),
+                  'run_time': time.perf_counter() - start, 'minimize_time': 0.0}
+        if len(problems) > 0:
+            start = time.perf_counter()
+            max_instrs = min(MAX_INSTRS, 2 * report['instrs'] + len(words))
+            report['minimized'] = minimize(words, data, problems[0][0], tmpdir, max_instrs)
+            report['minimize_time'] = time.perf_counter() - start
+    return report
+
+# Keep the original and minimized image of a failure with a description
+def save_failure(out_dir: str, report: dict) -> str:
+    os.makedirs(out_dir, exist_ok=True)
+    base = os.path.join(out_dir, f'seed_{report["seed"]}')
+    write_image(base + '.mem', report['words'], report['data'])
+    write_image(base + '.min.mem', report['minimized'], report['data'])
+
+    live = [(index, word) for index, word in enumerate(report['minimized']) if word != NOP]
+    with open(base + '.txt', 'w') as f:
+        f.write(f'Seed: {report["seed"]}\n\nProblems:\n')
+        for _, description in report['problems']:
+            f.write(f'  {description}\n')
+        f.write(f'\nMinimized program ({len(live)} of {len(report["words"])} instructions kept, rest are NOPs):\n')
+        for index, word in live:
+            f.write(disassemble([word]).replace('0: ', f'{4 * index}: ', 1) + '\n')
+    return base
+
+# Pool initializer: silence the simulators and numpy's int32 overflow warnings
+def init_worker() -> None:
+    logging.basicConfig(format=config.LOG_FORMAT, level=logging.ERROR)
+    warnings.simplefilter('ignore', RuntimeWarning)
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("./fuzz.py <num_programs> [first_seed] [jobs] [out_dir]")
+        exit(1)
+
+    num_programs = int(sys.argv[1])
+    first_seed = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    jobs = int(sys.argv[3]) if len(sys.argv) > 3 else os.cpu_count()
+    out_dir = sys.argv[4] if len(sys.argv) > 4 else 'fuzz_failures'
+
+    init_worker()
+    failures = 0
+    instrs = 0
+    cycles = 0
+    run_time = 0.0
+    minimize_time = 0.0
+    start = time.perf_counter()
+    with multiprocessing.Pool(jobs, initializer=init_worker) as pool:
+        seeds = range(first_seed, first_seed + num_programs)
+        for report in pool.imap_unordered(fuzz_one, seeds, chunksize=4):
+            instrs += report['instrs']
+            cycles += report['cycles']
+            run_time += report['run_time']
+            minimize_time += report['minimize_time']
+            if len(report['problems']) > 0:
+                failures += 1
+                base = save_failure(out_dir, report)
+                print(f'FAIL seed {report["seed"]}: {report["problems"][0][1]} ({base}.txt)')
+    elapsed = time.perf_counter() - start
+
+    print(f'\nPrograms: {num_programs}, Failures: {failures}, Jobs: {jobs}')
+    print(f'Throughput: {num_programs / elapsed:.1f} programs/s over {elapsed:.1f}s')
+
+    # Worker time, summed over all workers
+    if run_time > 0:
+        print(f'Differential execution: {run_time:.1f}s, {num_programs / run_time:.1f} programs/s, ' +
+              f'{instrs / run_time:.0f} instructions/s, {cycles / run_time:.0f} pipeline cycles/s per worker')
+    print(f'Minimization: {minimize_time:.1f}s')
+
+    exit(1 if failures > 0 else 0)
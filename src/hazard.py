@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+"""
+hazard.py: Data hazard lookup tables built from a pipeline description
+
+A description picks the forwarding paths, load-use latency and store
+forwarding of the five stage pipeline in cpu.py. The stages themselves are
+fixed.
+"""
+
+class HazardModel:
+    # The pipeline cpu.py implements, descriptions can not change it
+    STAGES = ['IF', 'ID', 'EX', 'MEM', 'WB']
+
+    # Forwarding path of each stage output that can be forwarded, these are
+    # the sources MIPS_lite.execute() reads (1 = mem_out, 2 = alu_out)
+    FORWARDING_PATHS = {'MEM': 1, 'EX': 2}
+
+    # Init
+    def __init__(self, description: dict) -> None:
+        self.stages = HazardModel.STAGES
+        self.forwarding = {}
+        for stage in description['forwarding']:
+            assert stage in HazardModel.FORWARDING_PATHS, f"No forwarding path from stage {stage}"
+            self.forwarding[stage] = HazardModel.FORWARDING_PATHS[stage]
+
+        self.id_stage = self.stages.index('ID')
+        self.ex_stage = self.stages.index('EX')
+        self.wb_stage = self.stages.index('WB')
+
+        # Stages a producer can be in while the consumer sits in ID, checked
+        # from the oldest to the youngest so the nearest producer wins
+        self.producer_stages = list(range(self.wb_stage - 1, self.id_stage, -1))
+
+        # Stage at which the result of an ALU op / a load exists
+        ready_stage = [self.ex_stage, self.ex_stage + description['load_use_latency']]
+
+        # table[is_load][stage] = (cycles to stall, forwarding path, store forwarding)
+        self.table = [[None] * len(self.stages), [None] * len(self.stages)]
+        for is_load in [0, 1]:
+            for stage in self.producer_stages:
+                ready = max(stage, ready_stage[is_load])
+                store_fwd = bool(is_load and description['store_forwarding'] and stage < ready)
+
+                if stage == ready and self.stages[stage] in self.forwarding:
+                    self.table[is_load][stage] = (0, self.forwarding[self.stages[stage]], store_fwd)
+                    continue
+
+                # Wait for the first stage the result can be forwarded from,
+                # or for it to be written back to the register file
+                stall = self.wb_stage - stage
+                for fwd_stage in range(ready, self.wb_stage):
+                    if self.stages[fwd_stage] in self.forwarding:
+                        stall = fwd_stage - stage
+                        break
+                self.table[is_load][stage] = (stall, 0, store_fwd)
+
+    # Override for print()
+    def __str__(self):
+        info = 'Stage\tALU\tLoad'
+        for stage in self.producer_stages:
+            info += f'\n{self.stages[stage]}\t{self.table[0][stage]}\t{self.table[1][stage]}'
+        return info
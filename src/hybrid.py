@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+"""
+hybrid.py: Fast-forward mode - functional warm-up with a cycle-accurate window
+"""
+
+import cpu
+import cpu_func
+import logging
+
+# Architectural state that has to follow the program across simulators
+ARCH_COUNTERS = ['instr_count', 'arithmetic_instr_count', 'logical_instr_count',
+                 'mem_instr_count', 'cntrl_instr_count']
+
+# Move registers, memory, PC and instruction counters from src to dst
+def transfer_arch_state(src, dst) -> None:
+    dst.pc = src.pc
+    dst.npc = src.pc
+    dst.R = list(src.R)
+    dst.mem = src.mem
+    dst.modified_regs = list(src.modified_regs)
+    dst.modified_addrs = list(src.modified_addrs)
+    for counter in ARCH_COUNTERS:
+        setattr(dst, counter, getattr(src, counter))
+
+# Check if a simulator has reached a given PC or instruction count
+# For the pipelined model the PC is the one of the instruction in EX
+def reached(sim, pc, count) -> bool:
+    if pc is not None:
+        if isinstance(sim, cpu.MIPS_lite):
+            if sim.pipeline[2] is not None and sim.pipeline[2].pc == pc:
+                return True
+        elif sim.pc == pc:
+            return True
+    if count is not None and sim.instr_count >= count:
+        return True
+    return False
+
+class MIPS_lite_hybrid:
+    # Init
+    # start_pc/start_count: switch to the pipelined model when the functional
+    # simulator reaches this PC or total instruction count
+    # stop_pc/stop_count: drain and switch back once the pipelined model has
+    # executed the instruction at this PC or this many instructions in total
+    def __init__(self, mode: str, mem_fname: str, start_pc: int = None, start_count: int = None,
+                 stop_pc: int = None, stop_count: int = None) -> None:
+        self.mode = mode
+        self.start_pc = start_pc
+        self.start_count = start_count
+        self.stop_pc = stop_pc
+        self.stop_count = stop_count
+
+        # Both simulators work on the same memory object
+        self.func = cpu_func.MIPS_lite_func(mem_fname)
+        self.pipe = cpu.MIPS_lite(mode, mem_fname, mem=self.func.mem)
+
+        # Without a start condition we are in the detailed window from the start
+        self.cpu = self.func
+        self.detailed = False
+        self.window_done = False
+        self.window_start_instr = 0
+        self.window_end_instr = None
+        if start_pc is None and start_count is None:
+            self.switch_to_pipe()
+
+    # Everything not overridden below comes from the simulator currently running
+    def __getattr__(self, name):
+        if name == 'cpu':
+            raise AttributeError(name)
+        return getattr(self.cpu, name)
+
+    # Timing statistics only exist for the detailed window
+    @property
+    def clk(self):
+        return self.pipe.clk
+
+    @property
+    def stall_count(self):
+        return self.pipe.stall_count
+
+    @property
+    def num_data_hazards(self):
+        return self.pipe.num_data_hazards
+
+    # Number of instructions executed in the cycle-accurate window
+    @property
+    def window_instr_count(self):
+        end = self.window_end_instr
+        if end is None:
+            end = self.pipe.instr_count
+        return end - self.window_start_instr
+
+    # Functional -> pipelined
+    def switch_to_pipe(self) -> None:
+        logging.debug(f'Switching to pipelined model at PC: {self.func.pc}')
+        transfer_arch_state(self.func, self.pipe)
+        self.window_start_instr = self.pipe.instr_count
+        self.cpu = self.pipe
+        self.detailed = True
+
+    # Pipelined -> functional, after letting in-flight instructions retire
+    def switch_to_func(self) -> None:
+        self.pipe.drain()
+        logging.debug(f'Switching to functional model at PC: {self.pipe.pc}')
+        self.window_end_instr = self.pipe.instr_count
+        transfer_arch_state(self.pipe, self.func)
+        self.cpu = self.func
+        self.detailed = False
+        self.window_done = True
+
+    # One step of whichever simulator is active
+    def do_cpu_things(self) -> bool:
+        if self.detailed == False:
+            if self.window_done == False and reached(self.func, self.start_pc, self.start_count):
+                self.switch_to_pipe()
+        elif self.pipe.halt_flag == False and reached(self.pipe, self.stop_pc, self.stop_count):
+            self.switch_to_func()
+
+        return self.cpu.do_cpu_things()
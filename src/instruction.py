@@ -35,6 +35,17 @@ class Instruction:
         'HALT': 0b010001
     }
 
+    # Opcode sets for quick lookups
+    R_type_opcodes = frozenset(R_type_instr.values())
+    I_type_opcodes = frozenset(I_type_instr.values())
+
+    # Opcodes that read Rt as a source
+    RT_SRC_opcodes = R_type_opcodes | {I_type_instr['BEQ'], I_type_instr['LDW'], I_type_instr['STW']}
+
+    # Opcodes that do not write a register
+    NO_DEST_opcodes = frozenset([I_type_instr['STW'], I_type_instr['BZ'], I_type_instr['BEQ'],
+                                 I_type_instr['JR'], I_type_instr['HALT']])
+
     # Decoding Bitmasks
     OPCODE_BITMASK = 0xFC000000
     RS_BITMASK = 0x03E00000
@@ -56,10 +67,29 @@ class Instruction:
         self.mem_to_mem = 0
         self.dh_counted = False
 
+        # Bytes a STW wrote in MEM, younger stores may overwrite them before WB
+        self.store_data = None
+
+        # Fetch-time branch prediction, None means fall-through
+        self.pred_target = None
+
         # Forwarding flags
         self.fwd_A = 0
         self.fwd_B = 0
 
+    # Build an instruction word from its name and fields, the inverse of decode()
+    # R-type: NAME Rd, Rs, Rt -- I-type: NAME Rt, Rs, Imm (imm may be negative)
+    @staticmethod
+    def encode(name: str, rs: int = 0, rt: int = 0, rd: int = 0, imm: int = 0) -> int:
+        assert 0 <= rs < 32 and 0 <= rt < 32 and 0 <= rd < 32, "Register out of range"
+        if name in Instruction.R_type_instr:
+            opcode = Instruction.R_type_instr[name]
+            return (opcode << 26) | (rs << 21) | (rt << 16) | (rd << 11)
+
+        assert -(1 << 15) <= imm < (1 << 16), "Immediate out of range"
+        opcode = Instruction.I_type_instr[name]
+        return (opcode << 26) | (rs << 21) | (rt << 16) | (imm & Instruction.IMM_BITMASK)
+
     # Get 'key' for value
     def find_key(self, input_dict, value):
         for key, val in input_dict.items():
@@ -102,41 +132,39 @@ class Instruction:
         self.opcode = (self.instr & Instruction.OPCODE_BITMASK) >> 26
 
         # Get the instruction details depending on the type
-        if self.opcode in Instruction.R_type_instr.values():
+        if self.opcode in Instruction.R_type_opcodes:
             self.type = 'R' 
             self.rs = (self.instr & Instruction.RS_BITMASK) >> 21
             self.rt = (self.instr & Instruction.RT_BITMASK) >> 16
             self.rd = (self.instr & Instruction.RD_BITMASK) >> 11
             self.imm = None
-        elif self.opcode in Instruction.I_type_instr.values():
+            self.dest_reg = self.rd
+        elif self.opcode in Instruction.I_type_opcodes:
             self.type = 'I' 
             self.rs = (self.instr & Instruction.RS_BITMASK) >> 21
             self.rt = (self.instr & Instruction.RT_BITMASK) >> 16
             self.rd = None
             self.imm = self.instr & Instruction.IMM_BITMASK
+            self.dest_reg = self.rt if self.opcode not in Instruction.NO_DEST_opcodes else None
         else:
             logging.error('Invalid opcode: ' + bin(self.opcode))
             exit(1)
 
+        # Source registers are worked out once here, the hazard checker looks
+        # at them every cycle the instruction sits in ID
+        # Rs is always a source register, Rt for R-type, BEQ, LDW and STW
+        self.src_regs = []
+        if self.rs != 0:
+            self.src_regs.append(self.rs)
+        if self.opcode in Instruction.RT_SRC_opcodes and self.rt != 0:
+            self.src_regs.append(self.rt)
+
+        self.is_load = int(self.opcode == Instruction.I_type_instr['LDW'])
+
     # Return Destination register
     def get_dest_reg(self):
-        if self.opcode in Instruction.R_type_instr.values():
-            return self.rd
-        else:
-            return self.rt
+        return self.dest_reg
 
     # Return source register
     def get_src_regs(self):
-        src_regs = []
-
-        # Rs is always a source register
-        if self.rs != 0:
-            src_regs.append(self.rs)
-
-        # Rt is a source reg if it is a R-type instruction or BEQ
-        if ((self.opcode in Instruction.R_type_instr.values()) or (self.opcode == Instruction.I_type_instr.get('BEQ')) or \
-            (self.opcode == Instruction.I_type_instr.get('LDW')) or (self.opcode == Instruction.I_type_instr.get('STW'))):
-            if self.rt != 0:
-                src_regs.append(self.rt)
-
-        return src_regs
\ No newline at end of file
+        return self.src_regs
\ No newline at end of file
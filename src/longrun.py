@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+
+"""
+longrun.py: Long-run mode, runs of any length in constant memory
+
+- Recent history: the PCs of the last few instructions (retired ones for the
+  pipelined models) in a ring buffer, shown when the simulator fails
+- Modified addresses: a bitmap over memory instead of a growing list
+- Statistics: one compact JSON line appended to a file every so many steps
+- SIGINT/SIGTERM: the run stops at the next chunk boundary and writes a
+  checkpoint that --resume continues from, and main.py prints a partial report
+
+Checkpoints are pickles, only resume from checkpoints you wrote yourself. A
+checkpoint is only resumed by the simulator sources that wrote it.
+"""
+
+import collections
+import config
+import cpu
+import json
+import logging
+import os
+import pickle
+import result_cache
+import signal
+import time
+from instruction import Instruction
+
+# Checkpoint file format: a header pickle, then the state
+CHECKPOINT_VERSION = 2
+
+# Modified addresses as one flag per byte address, for the report it looks
+# like the sorted list the simulators keep otherwise
+class AddressBitmap:
+    # Init
+    def __init__(self, size: int, addrs: list = ()) -> None:
+        self.flags = bytearray(size)
+        self.count = 0
+        for addr in addrs:
+            self.append(addr)
+
+    def append(self, addr) -> None:
+        addr = int(addr)
+        if self.flags[addr] == 0:
+            self.flags[addr] = 1
+            self.count += 1
+
+    def __contains__(self, addr) -> bool:
+        return self.flags[int(addr)] == 1
+
+    # Always sorted
+    def sort(self) -> None:
+        pass
+
+    def __iter__(self):
+        start = 0
+        for _ in range(self.count):
+            start = self.flags.index(1, start)
+            yield start
+            start += 1
+
+    def __len__(self) -> int:
+        return self.count
+
+class LongRun:
+    # Init
+    # stats_fname: file the statistics lines are appended to, None for none
+    # stats_every: steps (cycles, or instructions in FUNC) between two lines
+    # checkpoint: saved state from load_checkpoint() when resuming
+    def __init__(self, sim, mode: str, image: str, checkpoint_fname: str, history: int = config.LONGRUN_HISTORY,
+                 stats_fname: str = None, stats_every: int = config.LONGRUN_STATS_EVERY,
+                 checkpoint: dict = None) -> None:
+        assert history > 0 and stats_every > 0
+        self.sim = sim
+        self.mode = mode
+        self.image = image
+        self.checkpoint_fname = checkpoint_fname
+        self.pipelined = isinstance(sim, cpu.MIPS_lite)
+
+        self.history = collections.deque(maxlen=history)
+        self.steps = 0
+        self.elapsed = 0.0
+        if checkpoint is not None:
+            self.history.extend(checkpoint['history'])
+            self.steps = checkpoint['steps']
+            self.elapsed = checkpoint['elapsed']
+        if not isinstance(sim.modified_addrs, AddressBitmap):
+            sim.modified_addrs = AddressBitmap(config.MEM_SIZE, sim.modified_addrs)
+
+        # Pipelined models report the instructions they retire
+        if self.pipelined:
+            sim.on_retire = lambda instr: self.history.append(instr.pc)
+
+        self.stats = None
+        if stats_fname is not None:
+            self.stats = open(stats_fname, 'a')
+        self.stats_every = stats_every
+        self.next_flush = self.steps + stats_every
+        self.flushed = None
+
+        self.interrupted = False
+        self.error = None
+
+    # Signal handler, the run loop stops at the next chunk boundary
+    # A second signal stops right away
+    def interrupt(self, signum, frame) -> None:
+        if self.interrupted:
+            raise KeyboardInterrupt
+        self.interrupted = True
+
+    # Run until HALT, a signal or a failure
+    # Returns 'halt', 'interrupted' or 'failed' (the exception is in self.error)
+    def run(self) -> str:
+        sim = self.sim
+        step = sim.do_cpu_things
+        history = self.history
+        previous = {signum: signal.signal(signum, self.interrupt) for signum in [signal.SIGINT, signal.SIGTERM]}
+        chunk = min(config.LONGRUN_CHUNK, self.stats_every)
+        start = time.perf_counter()
+        status = None
+        try:
+            while status is None:
+                done = 0
+                if self.pipelined:
+                    while done < chunk:
+                        done += 1
+                        if step() == True:
+                            status = 'halt'
+                            break
+                else:
+                    while done < chunk:
+                        history.append(sim.pc)
+                        done += 1
+                        if step() == True:
+                            status = 'halt'
+                            break
+                self.steps += done
+
+                if self.steps >= self.next_flush:
+                    self.flush(start)
+                    self.next_flush = self.steps + self.stats_every
+                if status is None and self.interrupted:
+                    status = 'interrupted'
+        # The simulators assert on bad addresses and exit() on bad opcodes
+        except (Exception, SystemExit) as err:
+            self.error = err
+            status = 'failed'
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+            self.elapsed += time.perf_counter() - start
+
+        if status == 'interrupted':
+            self.save_checkpoint()
+        self.flush()
+        if self.stats is not None:
+            self.stats.close()
+        return status
+
+    # Append a statistics line, unless there already is one for this step
+    def flush(self, start: float = None) -> None:
+        if self.stats is None or self.flushed == self.steps:
+            return
+        self.flushed = self.steps
+        sim = self.sim
+        elapsed = self.elapsed if start is None else self.elapsed + time.perf_counter() - start
+        line = {'steps': self.steps, 'instrs': sim.instr_count, 'elapsed': round(elapsed, 3)}
+        if self.pipelined:
+            line.update({'clk': sim.clk, 'stalls': sim.stall_count, 'data_hazards': sim.num_data_hazards})
+        self.stats.write(json.dumps(line) + '\n')
+        self.stats.flush()
+
+    # Write the simulator state for --resume, atomically
+    def save_checkpoint(self) -> None:
+        on_retire = getattr(self.sim, 'on_retire', None)
+        if self.pipelined:
+            self.sim.on_retire = None
+        header = {'version': CHECKPOINT_VERSION, 'sources': result_cache.sources_digest(), 'mode': self.mode,
+                  'image': os.path.abspath(self.image)}
+        state = {'sim': self.sim, 'history': list(self.history), 'steps': self.steps, 'elapsed': self.elapsed}
+        try:
+            tmp_fname = self.checkpoint_fname + '.tmp'
+            with open(tmp_fname, 'wb') as f:
+                pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_fname, self.checkpoint_fname)
+        finally:
+            if self.pipelined:
+                self.sim.on_retire = on_retire
+        logging.info(f'Checkpoint written to {self.checkpoint_fname}')
+
+    # The recent history with disassembly, oldest first
+    def post_mortem(self) -> str:
+        lines = [f'Last {len(self.history)} instructions' + (' retired:' if self.pipelined else ' executed:')]
+        for pc in self.history:
+            word = int.from_bytes(self.sim.mem.read_n(int(pc), 4), byteorder='big', signed=False)
+            instr = Instruction(word)
+            try:
+                instr.decode()
+                text = instr.get_instr().strip()
+            except SystemExit:
+                text = 'invalid opcode'
+            lines.append(f'{int(pc)}: {word:08x}  {text}')
+        if self.pipelined:
+            stages = [str(instr.pc) if instr is not None else '-' for instr in self.sim.pipeline]
+            lines.append('Pipeline PCs (IF ID EX MEM WB): ' + ' '.join(stages))
+        return '\n'.join(lines)
+
+# Read a checkpoint written by LongRun.save_checkpoint()
+# The header is checked before the simulator state is unpickled, state saved
+# by other sources may not even unpickle
+def load_checkpoint(fname: str) -> dict:
+    with open(fname, 'rb') as f:
+        header = pickle.load(f)
+        if header.get('version') != CHECKPOINT_VERSION or header.get('sources') != result_cache.sources_digest():
+            raise ValueError(f'{fname} was written by a different simulator version')
+        state = pickle.load(f)
+    state.update(header)
+    return state
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+
+"""
+loopff.py: Loop fast-forward for the functional simulator
+
+Backward control transfers (taken BZ/BEQ, or JR) are counted per loop. Once a
+loop is hot its body is checked once: a straight run of ADD/SUB/ADDI/SUBI/MULI
+and branches, where the back edge always stays taken and at least one branch
+leaves the loop when an induction expression reaches zero. Such a body is an
+affine map over the registers it uses, so any number of iterations is a power
+of that map. The iterations left before the exit are skipped in one step and
+the last one is interpreted as usual.
+
+Anything that can't be shown to behave the same falls back to interpretation:
+memory accesses, other opcodes, branches within the body, registers holding
+32 bit values from loads, or loops that never exit.
+"""
+
+import config
+import logging
+from cpu_func import get_twos_complement_val
+from instruction import Instruction
+
+ADD = Instruction.R_type_instr['ADD']
+SUB = Instruction.R_type_instr['SUB']
+ADDI = Instruction.I_type_instr['ADDI']
+SUBI = Instruction.I_type_instr['SUBI']
+MULI = Instruction.I_type_instr['MULI']
+BZ = Instruction.I_type_instr['BZ']
+BEQ = Instruction.I_type_instr['BEQ']
+JR = Instruction.I_type_instr['JR']
+
+VALID_opcodes = Instruction.R_type_opcodes | Instruction.I_type_opcodes
+
+# Affine expressions over the registers of a loop are lists with one
+# coefficient per register, followed by the constant term
+
+def add_exprs(a: list, b: list, sign: int = 1) -> list:
+    return [x + sign * y for x, y in zip(a, b)]
+
+def scale_expr(a: list, factor: int) -> list:
+    return [factor * x for x in a]
+
+# Value of an expression for the given register values
+def evaluate(expr: list, values: list) -> int:
+    return sum(coef * val for coef, val in zip(expr, values)) + expr[-1]
+
+# Rows are the expressions for each register after one iteration
+def compose(rows: list, expr: list) -> list:
+    result = [0] * len(expr)
+    result[-1] = expr[-1]
+    for coef, row in zip(expr, rows):
+        if coef != 0:
+            result = add_exprs(result, scale_expr(row, coef))
+    return result
+
+class LoopPlan:
+    # Init
+    # rows: register expressions after one iteration, exits: (expression, step)
+    # for the branches that leave the loop when the expression is zero
+    def __init__(self, head: int, tail: int, words: list, regs: list, rows: list, exits: list, counts: tuple,
+                 dest_regs: list) -> None:
+        self.head = head
+        self.tail = tail
+        self.words = words
+        self.regs = regs
+        self.rows = rows
+        self.exits = exits
+        self.counts = counts
+        self.dest_regs = dest_regs
+
+    # Register values after n iterations, by repeated squaring of the map
+    def apply(self, values: list, n: int) -> list:
+        rows = self.rows
+        while n > 0:
+            if n & 1:
+                values = [evaluate(row, values) for row in rows]
+            rows = [compose(rows, row) for row in rows]
+            n >>= 1
+        return values
+
+    # Iterations that can be skipped before the first exit, None if it never exits
+    def iterations(self, values: list):
+        first = None
+        for expr, step in self.exits:
+            dist = evaluate(expr, values)
+            if dist == 0:
+                return 0
+            if step == 0 or dist % step != 0 or -dist // step < 0:
+                continue
+            if first is None or -dist // step < first:
+                first = -dist // step
+        return first
+
+# Check the loop from head to the back edge at tail, None if it can't be skipped
+def analyze(mem, head: int, tail: int):
+    if tail - head >= 4 * config.LOOP_FF_MAX_BODY:
+        return None
+
+    instrs = []
+    for pc in range(head, tail + 4, 4):
+        word = int.from_bytes(mem.read_n(pc, 4), byteorder='big', signed=False)
+        if (word & Instruction.OPCODE_BITMASK) >> 26 not in VALID_opcodes:
+            return None
+        instr = Instruction(word)
+        instr.decode()
+        if instr.type == 'I':
+            instr.imm_ext = get_twos_complement_val(instr.imm, 16)
+        instrs.append(instr)
+
+    regs = sorted({reg for instr in instrs for reg in [instr.rs, instr.rt, instr.rd] if reg is not None})
+    index = {reg: i for i, reg in enumerate(regs)}
+    exprs = []
+    for i in range(len(regs)):
+        expr = [0] * (len(regs) + 1)
+        expr[i] = 1
+        exprs.append(expr)
+
+    # Walk the body once, keeping every register as an expression of its
+    # value at the start of the iteration
+    branches = []
+    dest_regs = []
+    arithmetic = 0
+    control = 0
+    for pos, instr in enumerate(instrs):
+        pc = head + 4 * pos
+        last = pos == len(instrs) - 1
+
+        # Same rule as the simulator uses for the modified registers
+        dest = instr.rd if instr.type == 'R' else instr.rt
+        if dest != 0 and dest not in dest_regs:
+            dest_regs.append(dest)
+
+        op = instr.opcode
+        if op in [ADD, SUB]:
+            exprs[index[instr.rd]] = add_exprs(exprs[index[instr.rs]], exprs[index[instr.rt]], 1 if op == ADD else -1)
+            arithmetic += 1
+        elif op in [ADDI, SUBI, MULI]:
+            expr = list(exprs[index[instr.rs]])
+            if op == MULI:
+                expr = scale_expr(expr, instr.imm_ext)
+            else:
+                expr[-1] += instr.imm_ext if op == ADDI else -instr.imm_ext
+            exprs[index[instr.rt]] = expr
+            arithmetic += 1
+        elif op in [BZ, BEQ]:
+            expr = exprs[index[instr.rs]]
+            if op == BEQ:
+                expr = add_exprs(expr, exprs[index[instr.rt]], -1)
+            target = pc + 4 * instr.imm_ext
+            if last:
+                if target != head:
+                    return None
+            elif head <= target <= tail:
+                return None
+            branches.append((expr, last))
+            control += 1
+        elif op == JR and last:
+            expr = list(exprs[index[instr.rs]])
+            expr[-1] -= head
+            branches.append((expr, True))
+            control += 1
+        else:
+            return None
+
+    # Branch expressions have to change by the same step every iteration.
+    # The back edge was just taken, so with a step of 0 it always is
+    exits = []
+    for expr, back_edge in branches:
+        after = compose(exprs, expr)
+        if after[:-1] != expr[:-1]:
+            return None
+        step = after[-1] - expr[-1]
+        if back_edge:
+            if step != 0:
+                return None
+        else:
+            exits.append((expr, step))
+    if len(exits) == 0:
+        return None
+
+    words = [instr.instr for instr in instrs]
+    return LoopPlan(head, tail, words, regs, exprs, exits, (len(instrs), arithmetic, control), dest_regs)
+
+class LoopFastForward:
+    # Init
+    # Attaches to a functional simulator, which reports its back edges
+    def __init__(self, sim, threshold: int = config.LOOP_FF_THRESHOLD) -> None:
+        self.sim = sim
+        self.threshold = threshold
+        self.taken = {}
+        self.plans = {}
+
+        self.loops_skipped = 0
+        self.iterations_skipped = 0
+        self.instrs_skipped = 0
+        sim.loop_ff = self
+
+    # Called with the simulator state right after a backward branch or jump
+    # from tail to head was taken
+    def back_edge(self, tail: int, head: int) -> None:
+        key = (int(head), int(tail))
+        count = self.taken.get(key, 0) + 1
+        self.taken[key] = count
+        if count < self.threshold:
+            return
+
+        if key not in self.plans:
+            self.plans[key] = analyze(self.sim.mem, key[0], key[1])
+        plan = self.plans[key]
+        if plan is not None:
+            self.skip(plan)
+
+    # Skip the iterations left before the loop exits
+    def skip(self, plan: LoopPlan) -> None:
+        sim = self.sim
+        values = [sim.R[reg] for reg in plan.regs]
+        # Loaded values are 32 bit numpy integers that wrap around
+        if any(type(val) is not int for val in values):
+            return
+        n = plan.iterations(values)
+        if n is None or n == 0:
+            return
+
+        # The code could have been overwritten since it was checked
+        for pos, word in enumerate(plan.words):
+            addr = plan.head + 4 * pos
+            if int.from_bytes(sim.mem.read_n(addr, 4), byteorder='big', signed=False) != word:
+                del self.plans[(plan.head, plan.tail)]
+                return
+
+        for reg, val in zip(plan.regs, plan.apply(values, n)):
+            sim.R[reg] = val
+        for reg in plan.dest_regs:
+            if reg not in sim.modified_regs:
+                sim.modified_regs.append(reg)
+
+        instrs, arithmetic, control = plan.counts
+        sim.instr_count += n * instrs
+        sim.arithmetic_instr_count += n * arithmetic
+        sim.cntrl_instr_count += n * control
+
+        self.loops_skipped += 1
+        self.iterations_skipped += n
+        self.instrs_skipped += n * instrs
+        logging.debug(f'Loop at {plan.head}: skipped {n} iterations, {n * instrs} instructions')
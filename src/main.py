@@ -6,21 +6,266 @@ main.py: Driver file for the entire project
 Author(s): Atharva Lele <atharva@pdx.edu>
 """
 
+import branch_predictor
+import cache
 import config
+import cosim
 import cpu
 import cpu_func
+import debugger
+import hybrid
 import logging
+import longrun
+import loopff
 import os
+import perfcounters
+import pipeview
+import result_cache
+import sampling
+import statelog
 import sys
 
+# Parse optional '--name=value' arguments that follow the positional ones
+def parse_options(args: list) -> dict:
+    options = {}
+    for arg in args:
+        if not arg.startswith('--'):
+            print(f'Unknown argument: {arg}')
+            exit(1)
+        name, _, value = arg[2:].partition('=')
+        options[name] = value
+    return options
+
+# Read an optional integer option
+def int_option(options: dict, name: str):
+    if name not in options:
+        return None
+    try:
+        return int(options[name], 0)
+    except ValueError:
+        print(f'Option --{name} needs an integer value')
+        exit(1)
+
+# Cache geometry from '--<name>[=size,assoc,line_size,miss_penalty]', missing
+# values come from defaults
+def cache_option(options: dict, name: str, defaults: dict):
+    if name not in options:
+        return None
+    params = dict(defaults)
+    if options[name] != '':
+        try:
+            values = [int(val, 0) for val in options[name].split(',')]
+        except ValueError:
+            print(f'Option --{name} needs integer values')
+            exit(1)
+        if len(values) > 4:
+            print(f'Option --{name} takes at most 4 values: size, assoc, line_size, miss_penalty')
+            exit(1)
+        params.update(zip(['size', 'assoc', 'line_size', 'miss_penalty'], values))
+    error = cache.geometry_error(params['size'], params['assoc'], params['line_size'], params['miss_penalty'])
+    if error is not None:
+        print(f'Option --{name}: {error}')
+        exit(1)
+    return params
+
+# Build a cache model from a geometry, None for no cache
+def make_cache(name: str, params: dict):
+    if params is None:
+        return None
+    return cache.Cache(name.upper(), params['size'], params['assoc'], params['line_size'], params['miss_penalty'])
+
+# Read an optional comma separated list of integers
+def int_list_option(options: dict, name: str):
+    if name not in options:
+        return None
+    try:
+        return [int(val, 0) for val in options[name].split(',')]
+    except ValueError:
+        print(f'Option --{name} needs comma separated integer values')
+        exit(1)
+
+# Format a sampled estimate with its confidence interval
+def format_estimate(estimate: tuple) -> str:
+    value, half_width = estimate
+    if value is None:
+        return 'not enough samples'
+    if half_width is None:
+        return f'{value:.0f}'
+    return f'{value:.0f} +/- {half_width:.0f} (95% CI)'
+
+# Options that change the report, any other option bypasses the result cache
+RESULT_OPTIONS = ['ff-pc', 'ff-instrs', 'detail-pc', 'detail-instrs', 'sample', 'sample-period',
+                  'sample-window', 'sample-warmup', 'bp', 'bp-size', 'icache', 'dcache', 'perf']
+CACHE_OPTIONS = ['no-cache', 'refresh-cache']
+
+# Options that only change how fast the report is made, not the report
+SPEED_OPTIONS = ['loop-ff']
+
+# Collect everything the final report shows, in a form that can be cached
+def build_report(cpu_inst, sim_mode: str, fast_forward: bool, sample: bool, perf_counters) -> dict:
+    # Sort modified lists
+    cpu_inst.modified_addrs.sort()
+    cpu_inst.modified_regs.sort()
+
+    report = {
+        'counts': [cpu_inst.instr_count, cpu_inst.arithmetic_instr_count, cpu_inst.logical_instr_count,
+                   cpu_inst.mem_instr_count, cpu_inst.cntrl_instr_count],
+        'pc': int(cpu_inst.pc),
+        'regs': [[reg, int(cpu_inst.R[reg])] for reg in cpu_inst.modified_regs],
+    }
+
+    if fast_forward:
+        report['window_instrs'] = cpu_inst.window_instr_count
+    if sample:
+        estimates = cpu_inst.estimates()
+        report['sampled'] = {'windows': len(cpu_inst.cpi_samples), 'exact': cpu_inst.exact(),
+                             'stalls': format_estimate(estimates['stalls']),
+                             'data_hazards': format_estimate(estimates['data_hazards']),
+                             'clocks': format_estimate(estimates['clocks'])}
+    elif sim_mode != 'func':
+        report['stalls'] = cpu_inst.stall_count
+        report['data_hazards'] = cpu_inst.num_data_hazards
+        report['clk'] = cpu_inst.clk
+
+    bp = getattr(cpu_inst, 'bp', None)
+    if bp is not None:
+        report['bp'] = {'name': bp.name, 'branches': bp.branches, 'taken': bp.taken,
+                        'mispredicts': bp.mispredicts, 'accuracy': bp.accuracy(),
+                        'flush_cycles_saved': bp.flush_cycles_saved(cpu_inst.hazard.ex_stage)}
+
+    caches = [cache_model for cache_model in [getattr(cpu_inst, 'icache', None), getattr(cpu_inst, 'dcache', None)]
+              if cache_model is not None]
+    if len(caches) > 0:
+        report['caches'] = {'stats': [str(cache_model) for cache_model in caches],
+                            'stall_cycles': cpu_inst.cache_stall_count}
+
+    report['addrs'] = []
+    for addr in cpu_inst.modified_addrs:
+        # Get 4 bytes from memory
+        d_array = cpu_inst.mem.read_n(addr, 4)
+
+        # 'big' here means that that first byte in the array is MSB
+        data = int.from_bytes(bytes=d_array, byteorder='big', signed=False)
+        report['addrs'].append([int(addr), data])
+
+    if perf_counters is not None:
+        report['perf'] = perf_counters.summary()
+    return report
+
+# Print the final report
+def print_report(report: dict) -> None:
+    # Print instruction counts
+    counts = report['counts']
+    print('Instruction Counts:')
+    print(f'\nTotal Instructions: {counts[0]}')
+    print(f'Arithmetic Instructions: {counts[1]}')
+    print(f'Logical Instructions: {counts[2]}')
+    print(f'Memory Access Instructions: {counts[3]}')
+    print(f'Control Transfer Instructions: {counts[4]}')
+
+    # Print modified registers
+    print('\nFinal Register State:')
+    print(f'PC: {report["pc"]}')
+    for reg, value in report['regs']:
+        print(f'R{reg}: {value}')
+
+    # Print stalls
+    if 'window_instrs' in report:
+        print(f'\nDetailed Window Instructions: {report["window_instrs"]}')
+    if 'sampled' in report:
+        print(f'\nSampled Windows: {report["sampled"]["windows"]}')
+        if report['sampled']['exact']:
+            print('The whole run was cycle-accurate, the estimates are exact')
+        print(f'Estimated stalls: {report["sampled"]["stalls"]}')
+        print(f'Estimated Data Hazards: {report["sampled"]["data_hazards"]}')
+    elif 'stalls' in report:
+        print(f'\nTotal stalls: {report["stalls"]}')
+        print(f'Number of Data Hazards: {report["data_hazards"]}')
+
+    # Print branch predictor stats
+    if 'bp' in report:
+        bp = report['bp']
+        print(f'\nBranch Predictor: {bp["name"]}')
+        print(f'Branches: {bp["branches"]}, Taken: {bp["taken"]}, Mispredicted: {bp["mispredicts"]}')
+        print(f'Prediction Accuracy: {bp["accuracy"]:.2f}%')
+        print(f'Flush cycles saved: {bp["flush_cycles_saved"]}')
+
+    # Print cache stats
+    if 'caches' in report:
+        print('\nCache Statistics:')
+        for stats in report['caches']['stats']:
+            print(stats)
+        print(f'Cache stall cycles: {report["caches"]["stall_cycles"]}')
+
+    # Print modified addresses
+    print('\nModified Addresses:')
+    for addr, data in report['addrs']:
+        print(f'Addr: {addr}, Data: {data}')
+
+    # Print total clock cycles
+    if 'sampled' in report:
+        print(f'\nEstimated clock cycles: {report["sampled"]["clocks"]}')
+    elif 'clk' in report:
+        print(f'\nTotal clock cycles: {report["clk"]}')
+
+    # Print performance counter breakdown
+    if 'perf' in report:
+        print('\n' + report['perf'])
+
 # main() - entry point for the simulator
 if __name__ == '__main__':
     # Make sure number of arguments is correct
     if len(sys.argv) < 4:
         print("Error! Please run the program using the correct arguments: \n")
-        print("./mips_sim <memory_image> <debug_level> <mode>")
+        print("./mips_sim <memory_image> <debug_level> <mode> [options]")
         print("\nDebug level can be: RELEASE, DEBUG, INFO")
         print("Mode can be: FUNC, NO-FWD, FWD")
+        print("\nFast-forward options (NO-FWD, FWD only):")
+        print("  --ff-pc=<pc>         run functionally until PC, then cycle-accurate")
+        print("  --ff-instrs=<n>      run functionally for n instructions first")
+        print("  --detail-pc=<pc>     switch back to functional once the instruction at pc executes")
+        print("  --detail-instrs=<n>  switch back to functional after n total instructions")
+        print("\nSampling options (NO-FWD, FWD only):")
+        print("  --sample             estimate timing from periodic cycle-accurate windows")
+        print("  --sample-period=<n>  instructions between the start of two windows")
+        print("  --sample-window=<n>  measured instructions per window")
+        print("  --sample-warmup=<n>  unmeasured cycle-accurate instructions before each window")
+        print("\nBranch prediction options (NO-FWD, FWD only):")
+        print("  --bp=<predictor>     " + ", ".join(branch_predictor.PREDICTORS))
+        print("  --bp-size=<n>        entries in the counter table and BTB")
+        print("\nState log options:")
+        print("  --state-log=<file>   record registers/memory words changed each cycle (instruction in FUNC)")
+        print("  --state-log-format=<fmt>  json (default) or bin, rebuild state with ./statelog.py")
+        print("\nCache options (NO-FWD, FWD only), values default to config.py:")
+        print("  --icache[=<size>,<assoc>,<line_size>,<miss_penalty>]")
+        print("  --dcache[=<size>,<assoc>,<line_size>,<miss_penalty>]")
+        print("\nPerformance counter options (NO-FWD, FWD only):")
+        print("  --perf[=<n>]         windowed counters every n cycles, summary at the end")
+        print("  --perf-out=<file>    write the windows as CSV, or JSON for a .json file")
+        print("\nChecking options (NO-FWD, FWD only):")
+        print("  --cosim              check every retired instruction against the functional simulator")
+        print("\nPipeline diagram options (NO-FWD, FWD only):")
+        print("  --pipeview=<file>    stages of every instruction per cycle: text, HTML for a .html file,")
+        print("                       Konata log for a .kanata file")
+        print("  --pipeview-window=<start>,<end>  only record clock cycles start to end")
+        print("\nLoop options (FUNC only):")
+        print("  --loop-ff            skip the iterations of hot register-only counted loops")
+        print("\nBreakpoint options, lists are comma separated:")
+        print("  --break-pc=<pc,...>  stop when the instruction at pc executes")
+        print("  --break-instrs=<n>   stop once n instructions have executed")
+        print("  --break-cycles=<n>   stop at clock cycle n (NO-FWD, FWD only)")
+        print("  --watch-reg=<r,...>  stop when register r changes")
+        print("  --watch-mem=<addr,...>  stop when the word at addr is written")
+        print("  Runs at full speed between stops, in DEBUG mode each stop waits for a key")
+        print("\nLong-run options (RELEASE only), memory use stays constant:")
+        print("  --long-run           bounded history, modified addresses as a bitmap")
+        print("  --history=<n>        instructions kept for the post-mortem on a failure")
+        print("  --stats-out=<file>   append a line of statistics every --stats-every=<n> steps")
+        print("  --checkpoint=<file>  written on SIGINT/SIGTERM, defaults to <memory_image>.ckpt")
+        print("  --resume=<file>      continue from a checkpoint, implies --long-run")
+        print("\nResult cache (RELEASE runs with only the options above that change the report):")
+        print("  --no-cache           neither use nor store a cached result")
+        print("  --refresh-cache      simulate again and replace the cached result")
         exit(1)
 
     # Grab memory image filename
@@ -49,62 +294,304 @@ if __name__ == '__main__':
     logging.basicConfig(format=config.LOG_FORMAT, level=debug_level)
 
     # Grab simulator mode
-    modes = ['func', 'no-fwd', 'fwd']
+    modes = ['func'] + list(config.PIPELINES)
     sim_mode = sys.argv[3].lower()
     if sim_mode not in modes:
         print("Incorrect format for mode. Please use: FUNC, NO-FWD, FWD")
         exit(1)
 
+    # Grab optional arguments
+    options = parse_options(sys.argv[4:])
+    ff_pc = int_option(options, 'ff-pc')
+    ff_instrs = int_option(options, 'ff-instrs')
+    detail_pc = int_option(options, 'detail-pc')
+    detail_instrs = int_option(options, 'detail-instrs')
+    fast_forward = any(opt is not None for opt in [ff_pc, ff_instrs, detail_pc, detail_instrs])
+    sample_period = int_option(options, 'sample-period')
+    sample_window = int_option(options, 'sample-window')
+    sample_warmup = int_option(options, 'sample-warmup')
+    sample = 'sample' in options or \
+        any(opt is not None for opt in [sample_period, sample_window, sample_warmup])
+
+    if (fast_forward or sample) and sim_mode == 'func':
+        print("Fast-forward and sampling options need a pipelined mode: NO-FWD, FWD")
+        exit(1)
+    bp_name = options.get('bp')
+    bp_size = int_option(options, 'bp-size')
+    if bp_name is not None and bp_name not in branch_predictor.PREDICTORS:
+        print("Unknown branch predictor. Please use: " + ", ".join(branch_predictor.PREDICTORS))
+        exit(1)
+    if bp_size is not None and bp_size < 1:
+        print("Option --bp-size needs at least one table entry")
+        exit(1)
+    icache_params = cache_option(options, 'icache', config.ICACHE)
+    dcache_params = cache_option(options, 'dcache', config.DCACHE)
+    pipeline_models = bp_name is not None or icache_params is not None or dcache_params is not None
+    if pipeline_models and sim_mode == 'func':
+        print("Branch prediction and caches need a pipelined mode: NO-FWD, FWD")
+        exit(1)
+    if pipeline_models and (fast_forward or sample):
+        print("Branch prediction and caches can not be combined with fast-forward or sampling")
+        exit(1)
+
+    state_log_fname = options.get('state-log')
+    state_log_fmt = options.get('state-log-format', 'json')
+    if state_log_fmt not in ['json', 'bin']:
+        print("Incorrect format for state log. Please use: json or bin")
+        exit(1)
+    if state_log_fname is not None and (fast_forward or sample):
+        print("State logs can not be combined with fast-forward or sampling")
+        exit(1)
+
+    if fast_forward and sample:
+        print("Fast-forward and sampling options can not be used together")
+        exit(1)
+
+    break_pcs = int_list_option(options, 'break-pc')
+    break_instrs = int_option(options, 'break-instrs')
+    break_cycles = int_option(options, 'break-cycles')
+    watch_regs = int_list_option(options, 'watch-reg')
+    watch_addrs = int_list_option(options, 'watch-mem')
+    breakpoints = any(opt is not None for opt in [break_pcs, break_instrs, break_cycles, watch_regs, watch_addrs])
+    if breakpoints and (fast_forward or sample or state_log_fname is not None):
+        print("Breakpoints can not be combined with fast-forward, sampling or state logs")
+        exit(1)
+    if break_cycles is not None and sim_mode == 'func':
+        print("Cycle breakpoints need a pipelined mode: NO-FWD, FWD")
+        exit(1)
+    if watch_regs is not None and any(reg < 0 or reg > 31 for reg in watch_regs):
+        print("Watched registers must be R0 to R31")
+        exit(1)
+    if watch_addrs is not None and any(addr < 0 or addr >= config.MEM_SIZE for addr in watch_addrs):
+        print("Watched addresses must be within memory")
+        exit(1)
+
+    perf_window = int_option(options, 'perf') if options.get('perf', '') != '' else None
+    perf_out = options.get('perf-out')
+    perf = 'perf' in options or perf_out is not None
+    if perf and (sim_mode == 'func' or fast_forward or sample):
+        print("Performance counters need a pipelined mode without fast-forward or sampling")
+        exit(1)
+
+    check = 'cosim' in options
+    if check and (sim_mode == 'func' or fast_forward or sample):
+        print("Co-simulation needs a pipelined mode without fast-forward or sampling")
+        exit(1)
+
+    loop_ff = 'loop-ff' in options
+    if loop_ff and sim_mode != 'func':
+        print("Loop fast-forward needs FUNC mode")
+        exit(1)
+    if loop_ff and (breakpoints or state_log_fname is not None):
+        print("Loop fast-forward can not be combined with breakpoints or state logs")
+        exit(1)
+
+    pipeview_fname = options.get('pipeview')
+    pipeview_window = int_list_option(options, 'pipeview-window')
+    if pipeview_window is not None and pipeview_fname is None:
+        print("--pipeview-window needs --pipeview")
+        exit(1)
+    if pipeview_fname is not None and (sim_mode == 'func' or fast_forward or sample or breakpoints):
+        print("Pipeline diagrams need a pipelined mode without fast-forward, sampling or breakpoints")
+        exit(1)
+    if pipeview_window is not None and (len(pipeview_window) != 2 or pipeview_window[0] > pipeview_window[1]):
+        print("Option --pipeview-window needs <start>,<end> with start <= end")
+        exit(1)
+
+    resume_fname = options.get('resume')
+    long_run_mode = 'long-run' in options or resume_fname is not None
+    history = int_option(options, 'history')
+    stats_every = int_option(options, 'stats-every')
+    checkpoint_fname = options.get('checkpoint', memory_image_fname + '.ckpt')
+    if long_run_mode and debug_arg == 'debug':
+        print("Long-run mode needs RELEASE")
+        exit(1)
+    if long_run_mode and (fast_forward or sample or state_log_fname is not None or breakpoints or perf or check or
+                          pipeview_fname is not None):
+        print("Long-run mode can not be combined with fast-forward, sampling, state logs, breakpoints, "
+              "performance counters, co-simulation or pipeline diagrams")
+        exit(1)
+    if resume_fname is not None and pipeline_models:
+        print("Branch prediction and cache settings come from the checkpoint when resuming")
+        exit(1)
+    if (history is not None and history <= 0) or (stats_every is not None and stats_every <= 0):
+        print("History and statistics interval must be at least 1")
+        exit(1)
+
+    # Fill in the defaults of the options that are used
+    if sample:
+        sample_period = sample_period if sample_period is not None else config.SAMPLE_PERIOD
+        sample_window = sample_window if sample_window is not None else config.SAMPLE_WINDOW
+        sample_warmup = sample_warmup if sample_warmup is not None else config.SAMPLE_WARMUP
+    if bp_name is not None and bp_size is None:
+        bp_size = config.BP_TABLE_SIZE
+    if perf and perf_window is None:
+        perf_window = config.PERF_WINDOW
+
+    # Reuse the report of an identical earlier run, keyed by the parameters
+    # the run actually uses
+    cache_key = None
+    cacheable = all(name in RESULT_OPTIONS or name in CACHE_OPTIONS or name in SPEED_OPTIONS for name in options)
+    if debug_arg != 'debug' and 'no-cache' not in options and cacheable:
+        results = result_cache.ResultCache()
+        run_params = {'ff_pc': ff_pc, 'ff_instrs': ff_instrs, 'detail_pc': detail_pc, 'detail_instrs': detail_instrs,
+                      'sample': [sample_period, sample_window, sample_warmup] if sample else None,
+                      'bp': bp_name, 'bp_size': bp_size, 'icache': icache_params, 'dcache': dcache_params,
+                      'perf': perf_window}
+        cache_key = result_cache.make_key(result_cache.hash_file(memory_image_fname), sim_mode, run_params)
+        if 'refresh-cache' not in options:
+            report = results.get(cache_key)
+            if report is not None:
+                print_report(report)
+                exit(0)
+
     # Instantiate CPU
-    if sim_mode == 'func':
+    checkpoint = None
+    if resume_fname is not None:
+        try:
+            checkpoint = longrun.load_checkpoint(resume_fname)
+        except (OSError, ValueError) as err:
+            print(f'Can not resume: {err}')
+            exit(1)
+        if checkpoint['mode'] != sim_mode or checkpoint['image'] != os.path.abspath(memory_image_fname):
+            print(f'Checkpoint is for {checkpoint["image"]} in {checkpoint["mode"].upper()} mode')
+            exit(1)
+        cpu_inst = checkpoint['sim']
+    elif sim_mode == 'func':
         cpu_inst = cpu_func.MIPS_lite_func(memory_image_fname)
+    elif sample:
+        cpu_inst = sampling.MIPS_lite_sampled(sim_mode, memory_image_fname, sample_period, sample_window,
+                                              sample_warmup)
+    elif fast_forward:
+        cpu_inst = hybrid.MIPS_lite_hybrid(sim_mode, memory_image_fname, ff_pc, ff_instrs,
+                                           detail_pc, detail_instrs)
+    elif pipeline_models:
+        bp = None
+        if bp_name is not None:
+            bp = branch_predictor.PREDICTORS[bp_name](bp_size)
+        cpu_inst = cpu.MIPS_lite(sim_mode, memory_image_fname, bp=bp, icache=make_cache('icache', icache_params),
+                                 dcache=make_cache('dcache', dcache_params))
     else:
         cpu_inst = cpu.MIPS_lite(sim_mode, memory_image_fname)
 
+    # Record changes instead of dumping all registers
+    state_log = None
+    if state_log_fname is not None:
+        if sim_mode == 'func':
+            state_log = statelog.StateLogWriter(state_log_fname, cpu_inst, 'instr', state_log_fmt)
+        else:
+            state_log = statelog.StateLogWriter(state_log_fname, cpu_inst, 'cycle', state_log_fmt)
+            # Every cycle gets its own record
+            cpu_inst.event_skip = False
+        cpu_inst.dump_registers = False
+
+    # Stages per cycle for the pipeline diagram
+    pipe_view = None
+    if pipeview_fname is not None:
+        if pipeview_window is not None:
+            pipe_view = pipeview.PipeView(cpu_inst, pipeview_window[0], pipeview_window[1])
+        else:
+            pipe_view = pipeview.PipeView(cpu_inst)
+
+    # Skip the iterations of hot loops
+    if loop_ff:
+        loopff.LoopFastForward(cpu_inst)
+
+    # Constant memory runs
+    long_run = None
+    if long_run_mode:
+        long_run = longrun.LongRun(cpu_inst, sim_mode, memory_image_fname, checkpoint_fname,
+            history if history is not None else config.LONGRUN_HISTORY, options.get('stats-out'),
+            stats_every if stats_every is not None else config.LONGRUN_STATS_EVERY, checkpoint)
+
+    # Compare against the functional simulator as instructions retire
+    checker = None
+    if check:
+        checker = cosim.CoSimChecker(cpu_inst)
+
+    # Windowed performance counters
+    perf_counters = None
+    if perf:
+        perf_counters = perfcounters.PerfCounters(cpu_inst, perf_window)
+
+    # Breakpoints and watchpoints
+    dbg = None
+    if breakpoints:
+        dbg = debugger.Debugger(cpu_inst)
+        for pc in break_pcs or []:
+            dbg.add_breakpoint(pc)
+        if break_instrs is not None:
+            dbg.add_instr_breakpoint(break_instrs)
+        if break_cycles is not None:
+            dbg.add_cycle_breakpoint(break_cycles)
+        for reg in watch_regs or []:
+            dbg.watch_register(reg)
+        for addr in watch_addrs or []:
+            dbg.watch_memory(addr)
+
     # Main loop
-    while True:
-        if (debug_arg == 'debug'):
-            step = input('Press any key to run for 1 more clock cycle')
-        
-        # CPU Loop
-        halt = cpu_inst.do_cpu_things()
-        if halt == True:
-            break
+    try:
+        if long_run is not None:
+            status = long_run.run()
+            if status == 'failed':
+                print(f'Simulation failed: {type(long_run.error).__name__}: {long_run.error}')
+                print(long_run.post_mortem())
+                print('\nPartial report:')
+                print_report(build_report(cpu_inst, sim_mode, fast_forward, sample, perf_counters))
+                exit(1)
+            if status == 'interrupted':
+                print(f'Interrupted after {long_run.steps} steps, checkpoint written to {checkpoint_fname}')
+                print('Resume with --resume=' + checkpoint_fname)
+                print('\nPartial report:')
 
-    # Sort modified lists
-    cpu_inst.modified_addrs.sort()
-    cpu_inst.modified_regs.sort()
-    
-    # Print instruction counts
-    print('Instruction Counts:')
-    print(f'\nTotal Instructions: {cpu_inst.instr_count}')
-    print(f'Arithmetic Instructions: {cpu_inst.arithmetic_instr_count}')
-    print(f'Logical Instructions: {cpu_inst.logical_instr_count}')
-    print(f'Memory Access Instructions: {cpu_inst.mem_instr_count}')
-    print(f'Control Transfer Instructions: {cpu_inst.cntrl_instr_count}')
+        # Full speed from stop to stop
+        while dbg is not None:
+            reason = dbg.run()
+            if reason[0] == 'halt':
+                break
+            where = f'Instructions: {cpu_inst.instr_count}'
+            if sim_mode != 'func':
+                where += f', Clock: {cpu_inst.clk}'
+            print(f'{debugger.describe(reason)} ({where})')
+            if (debug_arg == 'debug'):
+                step = input('Press any key to continue to the next stop')
 
-    # Print modified registers
-    print('\nFinal Register State:')
-    print(f'PC: {cpu_inst.pc}')
-    for reg in cpu_inst.modified_regs:
-        print(f'R{reg}: {cpu_inst.R[reg]}')
-    
-    # Print stalls
-    if sim_mode != 'func':
-        print(f'\nTotal stalls: {cpu_inst.stall_count}')
-        print(f'Number of Data Hazards: {cpu_inst.num_data_hazards}')
+        while dbg is None and long_run is None:
+            if (debug_arg == 'debug'):
+                step = input('Press any key to run for 1 more clock cycle')
 
-    # Print modified addresses
-    print('\nModified Addresses:')
-    for addr in cpu_inst.modified_addrs:
-        # Get 4 bytes from memory
-        d_array = cpu_inst.mem.read_n(addr, 4)
+            # CPU Loop
+            halt = cpu_inst.do_cpu_things()
+            if state_log is not None:
+                state_log.record(cpu_inst.instr_count if sim_mode == 'func' else cpu_inst.clk)
+            if pipe_view is not None:
+                pipe_view.record()
+            if halt == True:
+                break
+        if checker is not None:
+            checker.finish()
+    except cosim.Divergence as divergence:
+        if state_log is not None:
+            state_log.close()
+        if pipe_view is not None:
+            pipe_view.write(pipeview_fname)
+        print(divergence)
+        exit(1)
 
-        # 'big' here means that that first byte in the array is MSB
-        data = int.from_bytes(bytes=d_array, byteorder='big', signed=False)
+    if state_log is not None:
+        state_log.close()
+    if pipe_view is not None:
+        pipe_view.write(pipeview_fname)
+    if perf_counters is not None:
+        perf_counters.finish()
+        if perf_out is not None:
+            perf_counters.write(perf_out)
 
-        print(f'Addr: {addr}, Data: {data}')
-    
-    # Print total clock cycles
-    if sim_mode != 'func':
-        print(f'\nTotal clock cycles: {cpu_inst.clk}')
\ No newline at end of file
+    # Report, cached for the next identical run
+    report = build_report(cpu_inst, sim_mode, fast_forward, sample, perf_counters)
+    if cache_key is not None:
+        try:
+            results.put(cache_key, report)
+        except OSError as err:
+            logging.error(f'Could not write the result cache: {err}')
+    print_report(report)
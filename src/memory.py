@@ -29,7 +29,7 @@ class Memory:
     # Read n bytes from memory
     def read_n(self, addr: int, n: int) -> bytearray:
         # Make sure address is within range
-        assert (addr+n) < self.size, "Address out of range"
+        assert (addr+n) <= self.size, "Address out of range"
         # Return the data at addr
         data = self.mem[addr:addr+n]
         return data
@@ -53,3 +53,47 @@ class Memory:
         # Write the bytearray into memory
         self.mem[addr:addr+len(data)] = data
 
+    # Watch writes to the word at addr. The first watch swaps in a checking
+    # write_n() on this instance, so memories without watches pay nothing
+    def watch(self, addr: int) -> None:
+        assert addr < self.size, "Address out of range"
+        if 'watch_flags' not in self.__dict__:
+            assert 'write_n' not in self.__dict__, "Writes are already being logged"
+            self.watch_flags = bytearray(self.size // 4 + 1)
+            self.watch_hits = []
+            self.write_n = self.write_n_watched
+        self.watch_flags[addr // 4] = 1
+
+    # Remove all watches and go back to the plain write_n()
+    def unwatch_all(self) -> None:
+        if 'watch_flags' in self.__dict__:
+            del self.write_n
+            del self.watch_flags
+            del self.watch_hits
+
+    # write_n() that records (word address, old word, new word) for every
+    # watched word it touches in watch_hits
+    def write_n_watched(self, addr: int, data: bytearray) -> None:
+        words = range(addr // 4, (addr + len(data) + 3) // 4)
+        hits = [word for word in words if self.watch_flags[word]]
+        old = [int.from_bytes(self.mem[4*word:4*word+4], 'big') for word in hits]
+        Memory.write_n(self, addr, data)
+        for word, old_data in zip(hits, old):
+            self.watch_hits.append((4 * word, old_data, int.from_bytes(self.mem[4*word:4*word+4], 'big')))
+
+    # Append the address of every write to log, by swapping in a logging
+    # write_n() like watch() does
+    def log_writes(self, log: list) -> None:
+        assert 'write_n' not in self.__dict__, "Writes are already being watched or logged"
+        self.write_log = log
+        self.write_n = self.write_n_logged
+
+    # Stop logging and go back to the plain write_n()
+    def stop_log_writes(self) -> None:
+        if 'write_log' in self.__dict__:
+            del self.write_n
+            del self.write_log
+
+    def write_n_logged(self, addr: int, data: bytearray) -> None:
+        Memory.write_n(self, addr, data)
+        self.write_log.append(addr)
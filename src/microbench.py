@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+
+"""
+microbench.py: Microbenchmarks for the hot paths of the simulators
+
+Every benchmark times one component on its own with fixed repetition counts:
+'number' calls per sample and 'repeat' samples, so results are comparable
+from run to run. Times are per call.
+
+Samples of all benchmarks are taken round-robin, so a busy spell on the host
+hits all of them alike. A fixed pure Python workload, 'reference', measures
+how fast the host is at the moment, and baseline times are scaled by it
+before comparing.
+
+Against a saved baseline, a benchmark has regressed when its median is more
+than the threshold slower and a one-sided Mann-Whitney U test says the slowdown
+is not noise. Any regression makes the run exit with 1.
+
+Run with:
+    ./microbench.py [--save=<baseline.json>] [--compare=<baseline.json>]
+                    [--threshold=<percent>] [--only=<name,...>]
+"""
+
+import config
+import cpu
+import cpu_func
+import json
+import logging
+import math
+import memory
+import os
+import parser
+import platform
+import statistics
+import sys
+import tempfile
+import timeit
+from instruction import Instruction
+
+# Default slowdown of the median that counts as a regression, in percent
+THRESHOLD = 10.0
+
+# Significance level of the regression test
+ALPHA = 0.01
+
+# Baseline file format
+BASELINE_VERSION = 1
+
+# Endless loop used by the full cycle benchmarks, it covers a load-use
+# hazard, forwarding, a store and a taken branch
+LOOP_PROGRAM = [
+    ('ADDI', {'rt': 1, 'rs': 1, 'imm': 1}),
+    ('LDW', {'rt': 2, 'rs': 0, 'imm': 2048}),
+    ('ADD', {'rd': 3, 'rs': 2, 'rt': 1}),
+    ('STW', {'rt': 3, 'rs': 0, 'imm': 2052}),
+    ('MULI', {'rt': 4, 'rs': 1, 'imm': 3}),
+    ('BEQ', {'rs': 0, 'rt': 0, 'imm': -5}),
+]
+
+# Write the loop program as an image, the data word it loads is 7
+def write_loop_image(fname: str) -> None:
+    image = bytearray(config.MEM_SIZE)
+    for index, (name, fields) in enumerate(LOOP_PROGRAM):
+        image[4*index:4*index+4] = Instruction.encode(name, **fields).to_bytes(4, 'big')
+    image[2048:2052] = (7).to_bytes(4, 'big')
+    parser.write_sparse(fname, image)
+
+# The loop image in tmpdir, written on first use
+def loop_image(tmpdir: str) -> str:
+    fname = os.path.join(tmpdir, 'loop.mem')
+    if not os.path.exists(fname):
+        write_loop_image(fname)
+    return fname
+
+# Decoded instruction from a name and fields
+def decoded(name: str, **fields) -> Instruction:
+    instr = Instruction(Instruction.encode(name, **fields))
+    instr.decode()
+    return instr
+
+# Benchmark setups, each returns the function to time
+def bench_reference(tmpdir: str):
+    def reference():
+        total = 0
+        for val in range(100):
+            total += val * val
+        return total
+    return reference
+
+def bench_decode(tmpdir: str):
+    instr = Instruction(Instruction.encode('ADD', rs=1, rt=2, rd=3))
+    return instr.decode
+
+def bench_read_n(tmpdir: str):
+    mem = memory.Memory(config.MEM_SIZE)
+    return lambda: mem.read_n(2048, 4)
+
+def bench_write_n(tmpdir: str):
+    mem = memory.Memory(config.MEM_SIZE)
+    data = (12345).to_bytes(4, 'big')
+    return lambda: mem.write_n(2048, data)
+
+# A dense image in tmpdir, written on first use
+def dense_image(tmpdir: str) -> str:
+    fname = os.path.join(tmpdir, 'dense.mem')
+    if not os.path.exists(fname):
+        image = bytearray(config.MEM_SIZE)
+        image[:24] = bytes(range(1, 25))
+        parser.write_dense(fname, image)
+    return fname
+
+def bench_parser(tmpdir: str):
+    fname = dense_image(tmpdir)
+    return lambda: parser.parser(fname)
+
+def bench_load_image(tmpdir: str):
+    fname = dense_image(tmpdir)
+    mem = memory.Memory(config.MEM_SIZE)
+    return lambda: parser.load_image(mem, fname)
+
+# An ADD in ID that depends on a LDW in EX and an ADD in MEM
+def bench_check_data_hazard(mode: str):
+    def setup(tmpdir: str):
+        sim = cpu.MIPS_lite(mode, loop_image(tmpdir), event_skip=False)
+        sim.pipeline = [None, decoded('ADD', rd=3, rs=1, rt=2), decoded('LDW', rt=1, rs=0, imm=2048),
+                        decoded('ADD', rd=2, rs=4, rt=5), None]
+        return sim.check_data_hazard
+    return setup
+
+def bench_execute(mode: str):
+    def setup(tmpdir: str):
+        sim = cpu.MIPS_lite(mode, loop_image(tmpdir), event_skip=False)
+        sim.pipeline = [None, None, decoded('ADD', rd=3, rs=1, rt=2), None, None]
+        return sim.execute
+    return setup
+
+def bench_cycle(mode: str):
+    def setup(tmpdir: str):
+        if mode == 'func':
+            sim = cpu_func.MIPS_lite_func(loop_image(tmpdir))
+        else:
+            sim = cpu.MIPS_lite(mode, loop_image(tmpdir))
+        return sim.do_cpu_things
+    return setup
+
+# name: (setup, calls per sample, samples)
+BENCHMARKS = {
+    'reference': (bench_reference, 5000, 15),
+    'decode': (bench_decode, 20000, 15),
+    'read_n': (bench_read_n, 50000, 15),
+    'write_n': (bench_write_n, 50000, 15),
+    'parser': (bench_parser, 20, 15),
+    'load_image': (bench_load_image, 20, 15),
+    'check_data_hazard[no-fwd]': (bench_check_data_hazard('no-fwd'), 20000, 15),
+    'check_data_hazard[fwd]': (bench_check_data_hazard('fwd'), 20000, 15),
+    'execute[no-fwd]': (bench_execute('no-fwd'), 20000, 15),
+    'execute[fwd]': (bench_execute('fwd'), 20000, 15),
+    'cycle[func]': (bench_cycle('func'), 2000, 15),
+    'cycle[no-fwd]': (bench_cycle('no-fwd'), 2000, 15),
+    'cycle[fwd]': (bench_cycle('fwd'), 2000, 15),
+}
+
+# Time the benchmarks, returns name -> per-call times in seconds
+# The reference benchmark is always included
+def run(names: list) -> dict:
+    names = ['reference'] + [name for name in names if name != 'reference']
+    results = {name: [] for name in names}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        timers = {}
+        for name in names:
+            setup, number, repeat = BENCHMARKS[name]
+            timers[name] = timeit.Timer(setup(tmpdir))
+            # One untimed sample to warm up
+            timers[name].timeit(number)
+
+        for sample in range(max(BENCHMARKS[name][2] for name in names)):
+            for name in names:
+                _, number, repeat = BENCHMARKS[name]
+                if sample < repeat:
+                    results[name].append(timers[name].timeit(number) / number)
+    return results
+
+# One-sided Mann-Whitney U test, probability of seeing samples this much
+# slower than the baseline by chance. Normal approximation with tie correction
+def slower_p_value(baseline: list, current: list) -> float:
+    n1 = len(current)
+    n2 = len(baseline)
+    ranked = sorted([(val, 0) for val in current] + [(val, 1) for val in baseline])
+
+    # Average ranks over ties
+    ranks = [0.0] * len(ranked)
+    ties = 0
+    start = 0
+    while start < len(ranked):
+        end = start
+        while end + 1 < len(ranked) and ranked[end + 1][0] == ranked[start][0]:
+            end += 1
+        for index in range(start, end + 1):
+            ranks[index] = (start + end) / 2 + 1
+        ties += (end - start + 1) ** 3 - (end - start + 1)
+        start = end + 1
+
+    u = sum(rank for rank, (_, group) in zip(ranks, ranked) if group == 0) - n1 * (n1 + 1) / 2
+    n = n1 + n2
+    variance = n1 * n2 / 12 * ((n + 1) - ties / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+    z = (u - n1 * n2 / 2 - 0.5) / math.sqrt(variance)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+# Compare against a baseline, returns the report lines and the regressed names
+def compare(baseline: dict, results: dict, threshold: float) -> tuple:
+    # Host speed now relative to when the baseline was taken
+    speed = 1.0
+    if 'reference' in baseline:
+        speed = statistics.median(results['reference']) / statistics.median(baseline['reference'])
+
+    lines = [f'Host speed factor: {speed:.2f} (baseline times are scaled by it)',
+             f'{"Benchmark":<28}{"Baseline":>12}{"Current":>12}{"Change":>10}{"p":>9}  Status']
+    regressions = []
+    for name, samples in results.items():
+        if name == 'reference':
+            continue
+        current = statistics.median(samples)
+        if name not in baseline:
+            lines.append(f'{name:<28}{"-":>12}{format_time(current):>12}{"-":>10}{"-":>9}  new')
+            continue
+        scaled = [speed * val for val in baseline[name]]
+        base = statistics.median(scaled)
+        change = 100 * (current - base) / base
+        p_value = slower_p_value(scaled, samples)
+        status = 'ok'
+        if change > threshold and p_value < ALPHA:
+            status = 'REGRESSED'
+            regressions.append(name)
+        elif change < -threshold and slower_p_value(samples, scaled) < ALPHA:
+            status = 'faster'
+        lines.append(f'{name:<28}{format_time(base):>12}{format_time(current):>12}'
+                     f'{change:>+9.1f}%{p_value:>9.4f}  {status}')
+    return lines, regressions
+
+def format_time(seconds: float) -> str:
+    if seconds < 1e-6:
+        return f'{seconds * 1e9:.0f} ns'
+    if seconds < 1e-3:
+        return f'{seconds * 1e6:.2f} us'
+    return f'{seconds * 1e3:.2f} ms'
+
+def save(fname: str, results: dict) -> None:
+    with open(fname, 'w') as f:
+        json.dump({'version': BASELINE_VERSION, 'python': platform.python_version(),
+                   'machine': platform.machine(), 'benchmarks': results}, f, indent=1)
+
+def load(fname: str) -> dict:
+    with open(fname) as f:
+        baseline = json.load(f)
+    if baseline.get('version') != BASELINE_VERSION:
+        print(f'Unsupported baseline version in {fname}')
+        exit(1)
+    return baseline['benchmarks']
+
+if __name__ == '__main__':
+    save_fname = None
+    compare_fname = None
+    threshold = THRESHOLD
+    names = list(BENCHMARKS)
+    for arg in sys.argv[1:]:
+        name, _, value = arg.partition('=')
+        if name == '--save':
+            save_fname = value
+        elif name == '--compare':
+            compare_fname = value
+        elif name == '--threshold':
+            threshold = float(value)
+        elif name == '--only':
+            names = value.split(',')
+            for bench in names:
+                if bench not in BENCHMARKS:
+                    print(f'Unknown benchmark: {bench}. Benchmarks: ' + ', '.join(BENCHMARKS))
+                    exit(1)
+        else:
+            print("./microbench.py [--save=<baseline.json>] [--compare=<baseline.json>]")
+            print("                [--threshold=<percent>] [--only=<name,...>]")
+            print("\nBenchmarks: " + ", ".join(BENCHMARKS))
+            exit(1)
+
+    logging.basicConfig(format=config.LOG_FORMAT, level=logging.ERROR)
+
+    results = run(names)
+
+    if compare_fname is not None:
+        lines, regressions = compare(load(compare_fname), results, threshold)
+        print('\n'.join(lines))
+    else:
+        regressions = []
+        for name, samples in results.items():
+            print(f'{name:<28}{format_time(statistics.median(samples)):>12}  '
+                  f'(min {format_time(min(samples))}, stdev {format_time(statistics.stdev(samples))})')
+
+    if save_fname is not None:
+        save(save_fname, results)
+        print(f'\nBaseline written to {save_fname}')
+
+    if len(regressions) > 0:
+        print(f'\n{len(regressions)} regressed by more than {threshold:g}%: ' + ', '.join(regressions))
+        exit(1)
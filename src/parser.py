@@ -3,9 +3,19 @@
 """
 parser.py: Parsing memory image
 
+Images are hex data, one word per line, starting at address 0. A line of the
+form '@<hex address>' moves to that byte address, so sparse images only need
+to list the segments that are not zero.
+
+Convert between dense and sparse images with:
+    ./parser.py <memory_image> <output_image> [--dense]
+
 Author(s): Shivani Palkar <spalkar@pdx.edu>
 """
 
+import config
+import sys
+
 def parser(mem_image: str) -> bytearray:
     image = bytearray()
     mem_file = open(mem_image, "r")
@@ -13,8 +23,90 @@ def parser(mem_image: str) -> bytearray:
     for string in mem_file:
         to_byte = bytearray.fromhex(string)
         image += to_byte
-    
+
     # Close file
     mem_file.close()
-    
+
     return image
+
+# Stream the non-zero segments of an image as (address, data)
+# Zero data is skipped, memory starts out zeroed
+def segments(mem_image: str):
+    addr = 0
+    start = 0
+    segment = bytearray()
+    with open(mem_image, "r") as mem_file:
+        for line in mem_file:
+            line = line.strip()
+            if line == '':
+                continue
+            if line[0] == '@':
+                if len(segment) > 0:
+                    yield start, segment
+                    segment = bytearray()
+                addr = int(line[1:], 16)
+                start = addr
+                continue
+
+            to_byte = bytearray.fromhex(line)
+            if to_byte.count(0) == len(to_byte):
+                if len(segment) > 0:
+                    yield start, segment
+                    segment = bytearray()
+                addr += len(to_byte)
+                start = addr
+            else:
+                segment += to_byte
+                addr += len(to_byte)
+
+    if len(segment) > 0:
+        yield start, segment
+
+# Load an image into memory, only non-zero segments are written
+def load_image(mem, mem_image: str) -> None:
+    for addr, data in segments(mem_image):
+        mem.write_n(addr, data)
+
+# Write data as a sparse image. Runs of at least two zero words are left
+# out, a single zero word costs no more than the '@' line that would skip it
+def write_sparse(fname: str, data: bytes) -> None:
+    words = [data[addr:addr+4] for addr in range(0, len(data), 4)]
+    with open(fname, "w") as f:
+        expected = 0
+        index = 0
+        while index < len(words):
+            if words[index].count(0) == len(words[index]):
+                run = index
+                while run < len(words) and words[run].count(0) == len(words[run]):
+                    run += 1
+                if run - index == 1 and run < len(words) and expected == index:
+                    f.write(words[index].hex() + "\n")
+                    expected = run
+                index = run
+                continue
+            if expected != index:
+                f.write(f"@{4 * index:x}\n")
+            f.write(words[index].hex() + "\n")
+            index += 1
+            expected = index
+
+# Write data as a dense image covering the whole memory
+def write_dense(fname: str, data: bytes, size: int = config.MEM_SIZE) -> None:
+    data = bytes(data) + bytes(max(0, size - len(data)))
+    with open(fname, "w") as f:
+        f.write("\n".join(data[addr:addr+4].hex() for addr in range(0, len(data), 4)))
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print("./parser.py <memory_image> <output_image> [--dense]")
+        exit(1)
+
+    image = bytearray(config.MEM_SIZE)
+    for addr, data in segments(sys.argv[1]):
+        assert addr + len(data) <= len(image), "Image does not fit in memory"
+        image[addr:addr+len(data)] = data
+
+    if '--dense' in sys.argv[3:]:
+        write_dense(sys.argv[2], image)
+    else:
+        write_sparse(sys.argv[2], image)
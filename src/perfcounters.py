@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+
+"""
+perfcounters.py: Windowed performance counters for the pipelined simulator
+
+The simulator keeps running totals. Every window of clock cycles their deltas
+are copied into preallocated arrays, giving a time series of CPI, stalls by
+cause, branch flush cycles and forwarding path usage.
+"""
+
+from array import array
+import config
+import json
+import statistics
+
+# Per-window values, 'clk' is the cycle the window ends at, the rest are deltas
+COLUMNS = ['clk', 'cycles', 'instrs', 'stalls', 'load_use_stalls', 'alu_stalls', 'flush_cycles',
+           'cache_stalls', 'data_hazards', 'fwd_ex', 'fwd_mem', 'fwd_store']
+
+class PerfCounters:
+    # Init
+    # Attaches to a pipelined simulator, windows start at its current clock
+    def __init__(self, sim, window: int = config.PERF_WINDOW, capacity: int = config.PERF_CAPACITY) -> None:
+        assert window > 0, "Window must be at least 1 cycle"
+        self.sim = sim
+        self.window = window
+        self.capacity = capacity
+        self.columns = {name: array('q', bytes(8 * capacity)) for name in COLUMNS}
+        self.num_windows = 0
+
+        self.flush_penalty = sim.hazard.ex_stage
+        self.start = self.totals()
+        self.last = self.start
+        sim.perf = self
+        sim.perf_next_clk = sim.clk + window
+
+    # Running totals of the simulator, in COLUMNS order without 'cycles'
+    def totals(self) -> tuple:
+        sim = self.sim
+        return (sim.clk, sim.instr_count, sim.stall_count, sim.load_use_stall_count,
+                sim.stall_count - sim.load_use_stall_count, sim.flush_count * self.flush_penalty,
+                sim.cache_stall_count, sim.num_data_hazards, sim.fwd_count[2], sim.fwd_count[1],
+                sim.store_fwd_count)
+
+    # Close the window that ends at the current clock
+    def sample(self) -> None:
+        now = self.totals()
+        if self.num_windows == self.capacity:
+            for column in self.columns.values():
+                column.extend(bytes(8 * self.capacity))
+            self.capacity *= 2
+
+        n = self.num_windows
+        self.columns['clk'][n] = now[0]
+        self.columns['cycles'][n] = now[0] - self.last[0]
+        for index, name in enumerate(COLUMNS[2:], start=1):
+            self.columns[name][n] = now[index] - self.last[index]
+        self.num_windows += 1
+        self.last = now
+
+        # Event skipping can overshoot a window boundary, stay on the grid
+        sim = self.sim
+        sim.perf_next_clk += self.window * ((sim.clk - sim.perf_next_clk) // self.window + 1)
+
+    # Close the last, partial window once the simulation is over
+    def finish(self) -> None:
+        if self.sim.clk > self.last[0]:
+            self.sample()
+        self.sim.perf_next_clk = float('inf')
+
+    # Windows as dicts, with CPI added
+    def rows(self) -> list:
+        rows = []
+        for n in range(self.num_windows):
+            row = {name: self.columns[name][n] for name in COLUMNS}
+            row['cpi'] = row['cycles'] / row['instrs'] if row['instrs'] > 0 else None
+            rows.append(row)
+        return rows
+
+    def write_csv(self, fname: str) -> None:
+        with open(fname, 'w') as f:
+            f.write(','.join(COLUMNS + ['cpi']) + '\n')
+            for row in self.rows():
+                cpi = f'{row["cpi"]:.4f}' if row['cpi'] is not None else ''
+                f.write(','.join(str(row[name]) for name in COLUMNS) + f',{cpi}\n')
+
+    def write_json(self, fname: str) -> None:
+        with open(fname, 'w') as f:
+            json.dump({'window': self.window, 'mode': self.sim.mode, 'windows': self.rows()}, f, indent=1)
+
+    # Export by file extension: .json, anything else is CSV
+    def write(self, fname: str) -> None:
+        if fname.lower().endswith('.json'):
+            self.write_json(fname)
+        else:
+            self.write_csv(fname)
+
+    # Breakdown of where the cycles went, over the whole run
+    def summary(self) -> str:
+        total = [now - start for now, start in zip(self.last, self.start)]
+        clk, instrs, stalls, load_use, alu, flush, cache_stalls, hazards, fwd_ex, fwd_mem, fwd_store = total
+
+        def share(cycles: int) -> str:
+            return f'{cycles} ({100.0 * cycles / clk:.1f}%)' if clk > 0 else str(cycles)
+
+        info = f'Performance Counters ({self.num_windows} windows of {self.window} cycles):'
+        if instrs > 0:
+            info += f'\nCPI: {clk / instrs:.3f}, IPC: {instrs / clk:.3f}'
+        info += '\nCycle breakdown:'
+        info += f'\n  Issuing instructions: {share(instrs)}'
+        info += f'\n  Load-use stalls: {share(load_use)}'
+        info += f'\n  ALU dependency stalls: {share(alu)}'
+        info += f'\n  Branch flush cycles: {share(flush)}'
+        info += f'\n  Cache miss cycles: {share(cache_stalls)}'
+        info += f'\n  Pipeline fill/drain: {share(clk - instrs - stalls - flush - cache_stalls)}'
+        info += f'\nData hazards: {hazards}, stall cycles per hazard: ' + \
+                (f'{stalls / hazards:.2f}' if hazards > 0 else '0')
+        info += f'\nForwarded operands: EX->EX: {fwd_ex}, MEM->EX: {fwd_mem}, MEM->MEM (store data): {fwd_store}'
+
+        cpis = [row['cpi'] for row in self.rows() if row['cpi'] is not None]
+        if len(cpis) > 0:
+            info += f'\nWindow CPI: min {min(cpis):.3f}, median {statistics.median(cpis):.3f}, max {max(cpis):.3f}'
+        return info
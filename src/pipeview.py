@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+
+"""
+pipeview.py: Pipeline diagrams for the pipelined simulator
+
+While the simulator runs, record() stores the PC in each of the five stages
+after every cycle, plus stall and flush markers, in flat arrays. Only cycles
+inside the optional window are kept. Event skipping is off while recording
+so every stall cycle gets its own row, and is switched back on once the
+window is over.
+
+After the run the rows are turned back into instructions and drawn as a
+classic pipeline diagram, instructions down and cycles across, in blocks of
+config.PIPEVIEW_BLOCK cycles:
+    text    one line per instruction, stage letters per cycle
+    html    the same as a colored table
+    kanata  log for the Konata pipeline viewer
+"""
+
+from array import array
+import config
+import html
+from instruction import Instruction
+
+STAGES = ['F', 'D', 'X', 'M', 'W']
+
+# Row flags
+STALL = 1
+FLUSH = 2
+CACHE_STALL = 4
+
+# Output formats by file extension, anything else is text
+FORMATS = {'.html': 'html', '.htm': 'html', '.kanata': 'kanata', '.konata': 'kanata'}
+
+VALID_opcodes = Instruction.R_type_opcodes | Instruction.I_type_opcodes
+
+class PipeView:
+    # Init
+    # Records cycles start to end (clock values, both included), None for no limit
+    def __init__(self, sim, start: int = None, end: int = None) -> None:
+        self.sim = sim
+        self.start = start if start is not None else 0
+        self.end = end
+        self.clks = array('q')
+        self.pcs = array('q')
+        self.flags = array('b')
+        self.disassembly = {}
+
+        self.last_clk = sim.clk
+        self.last_stalls = sim.stall_count
+        self.last_flushes = sim.flush_count
+
+        # Every cycle needs its own row
+        self.event_skip = sim.event_skip
+        sim.event_skip = False
+        self.recording = True
+
+    # Store the pipeline after a cycle
+    def record(self) -> None:
+        sim = self.sim
+        if not self.recording:
+            return
+        clk = sim.clk
+        stalled = sim.stall_count != self.last_stalls
+        flushed = sim.flush_count != self.last_flushes
+        cache_stalled = clk - self.last_clk > 1
+        self.last_clk = clk
+        self.last_stalls = sim.stall_count
+        self.last_flushes = sim.flush_count
+
+        if clk < self.start:
+            return
+        if self.end is not None and clk > self.end:
+            self.recording = False
+            sim.event_skip = self.event_skip
+            return
+
+        pipeline = sim.pipeline
+        if pipeline.count(None) == len(pipeline):
+            return
+        self.clks.append(clk)
+        for instr in pipeline:
+            self.pcs.append(int(instr.pc) if instr is not None else -1)
+        self.flags.append(STALL * stalled + FLUSH * flushed + CACHE_STALL * cache_stalled)
+
+    def __len__(self) -> int:
+        return len(self.clks)
+
+    # Disassembly of the instruction at pc, decoded once per pc
+    def disassemble(self, pc: int) -> str:
+        text = self.disassembly.get(pc)
+        if text is None:
+            text = self.disassembly[pc] = self.decode(pc)
+        return text
+
+    def decode(self, pc: int) -> str:
+        word = int.from_bytes(self.sim.mem.read_n(pc, 4), byteorder='big', signed=False)
+        if (word & Instruction.OPCODE_BITMASK) >> 26 not in VALID_opcodes:
+            return f'{word:08x}'
+        instr = Instruction(word)
+        instr.decode()
+        return instr.get_instr().strip()
+
+    # Walk the rows and follow each instruction through the stages. Yields
+    # ('new', id, pc, row), ('stage', id, stage, row, held) and
+    # ('end', id, row, retired), row being the first row without it.
+    # An instruction in stage s came from stage s-1 the cycle before, only
+    # IF and ID hold on to theirs during a stall
+    def events(self):
+        prev_ids = [None] * 5
+        prev_pcs = [-1] * 5
+        next_id = 0
+        for row in range(len(self.clks)):
+            pcs = self.pcs[5*row:5*row+5]
+            stalled = self.flags[row] & STALL
+            ids = [None] * 5
+            for stage in range(4, -1, -1):
+                pc = pcs[stage]
+                if pc == -1:
+                    continue
+                held = False
+                src = None
+                if stage <= 1 and stalled and prev_pcs[stage] == pc:
+                    src = prev_ids[stage]
+                    held = True
+                elif stage >= 1 and prev_pcs[stage - 1] == pc:
+                    src = prev_ids[stage - 1]
+                if src is None or src in ids:
+                    src = next_id
+                    next_id += 1
+                    held = False
+                    yield ('new', src, pc, row)
+                ids[stage] = src
+                yield ('stage', src, stage, row, held)
+
+            for stage in range(5):
+                if prev_ids[stage] is not None and prev_ids[stage] not in ids:
+                    yield ('end', prev_ids[stage], row, stage == 4)
+            prev_ids = ids
+            prev_pcs = pcs
+
+        # After the last row, the instruction in WB has retired and the others
+        # are still in flight
+        for stage in range(5):
+            if prev_ids[stage] is not None:
+                yield ('end', prev_ids[stage], len(self.clks), True if stage == 4 else None)
+
+    # Instructions in the order they were fetched: list of
+    # (pc, {row: (stage, held)}, retired), retired is None when still in flight
+    def instructions(self) -> list:
+        instrs = {}
+        for event in self.events():
+            if event[0] == 'new':
+                instrs[event[1]] = [event[2], {}, None]
+            elif event[0] == 'stage':
+                instrs[event[1]][1][event[3]] = (event[2], event[4])
+            else:
+                instrs[event[1]][2] = event[3]
+        return list(instrs.values())
+
+    # Split the diagram into blocks of config.PIPEVIEW_BLOCK cycles, so its
+    # size grows with the number of cycles and not with their square
+    # Yields the first row, the last row + 1 and the instructions in the block
+    def blocks(self):
+        instrs = self.instructions()
+        active = []
+        index = 0
+        for first in range(0, len(self), config.PIPEVIEW_BLOCK):
+            last = min(first + config.PIPEVIEW_BLOCK, len(self))
+            while index < len(instrs) and min(instrs[index][1]) < last:
+                active.append(instrs[index])
+                index += 1
+            active = [instr for instr in active if max(instr[1]) >= first]
+            yield first, last, active
+
+    def cell(self, stage: int, held: bool) -> str:
+        return STAGES[stage].lower() if held else STAGES[stage]
+
+    def text(self) -> str:
+        width = max(3, len(str(self.clks[-1])) + 1) if len(self) > 0 else 3
+        lines = []
+        for first, last, instrs in self.blocks():
+            block = []
+            for pc, cells, retired in instrs:
+                line = ''.join((self.cell(*cells[row]) if row in cells else '').rjust(width)
+                               for row in range(first, last))
+                if retired == False and max(cells) < last:
+                    line = line.rstrip() + '  flushed'
+                block.append((f'{pc}: {self.disassemble(pc)}', line))
+            flags = self.flags[first:last]
+            for name, flag in [('Stall', STALL), ('Flush', FLUSH), ('Cache', CACHE_STALL)]:
+                if any(value & flag for value in flags):
+                    block.append((name, ''.join(('*' if value & flag else '').rjust(width) for value in flags)))
+
+            label_width = max([len('Cycle')] + [len(label) for label, _ in block]) + 1
+            lines.append('Cycle'.ljust(label_width) + ''.join(str(clk).rjust(width) for clk in self.clks[first:last]))
+            lines.extend((label.ljust(label_width) + line).rstrip() for label, line in block)
+            lines.append('')
+        lines.append('F D X M W: IF ID EX MEM WB, lower case: held during a stall')
+        return '\n'.join(lines)
+
+    def html(self) -> str:
+        out = ['<!DOCTYPE html>', '<html><head><meta charset="utf-8"><title>Pipeline</title><style>',
+               'body { font-family: monospace; }',
+               'table { border-collapse: collapse; margin-bottom: 1em; }',
+               'td, th { border: 1px solid #ddd; padding: 1px 4px; text-align: center; }',
+               'td.label { text-align: left; white-space: nowrap; }',
+               '.F { background: #cfe2ff; } .D { background: #d1e7dd; } .X { background: #fff3cd; }',
+               '.M { background: #f8d7da; } .W { background: #e2e3e5; }',
+               '.held { opacity: 0.5; } .flushed td.label { text-decoration: line-through; }',
+               'th.flush { background: #dc3545; color: white; } th.stall { background: #ffc107; }',
+               'th.cache { background: #6f42c1; color: white; }',
+               '</style></head><body>',
+               '<p>F D X M W: IF ID EX MEM WB, faded: held during a stall. '
+               'Cycle numbers are yellow for stalls, red for flushes and purple after a cache miss.</p>']
+        for first, last, instrs in self.blocks():
+            header = '<table><tr><th>Instruction</th>'
+            for clk, flags in zip(self.clks[first:last], self.flags[first:last]):
+                cls = ' class="flush"' if flags & FLUSH else ' class="stall"' if flags & STALL else \
+                      ' class="cache"' if flags & CACHE_STALL else ''
+                header += f'<th{cls}>{clk}</th>'
+            out.append(header + '</tr>')
+
+            for pc, cells, retired in instrs:
+                cls = ' class="flushed"' if retired == False else ''
+                label = html.escape(f'{pc}: {self.disassemble(pc)}')
+                line = f'<tr{cls}><td class="label">{label}</td>'
+                for row in range(first, last):
+                    if row in cells:
+                        stage, held = cells[row]
+                        line += f'<td class="{STAGES[stage]}{" held" if held else ""}">{self.cell(stage, held)}</td>'
+                    else:
+                        line += '<td></td>'
+                out.append(line + '</tr>')
+            out.append('</table>')
+        out.append('</body></html>')
+        return '\n'.join(out)
+
+    # Konata log, written line by line so long recordings stay cheap
+    def write_kanata(self, f) -> None:
+        f.write('Kanata\t0004\n')
+        if len(self) == 0:
+            return
+        f.write(f'C=\t{self.clks[0]}\n')
+        current = {}
+        retire_id = 0
+        row_written = 0
+        for event in self.events():
+            row = event[3] if event[0] != 'end' else event[2]
+            if row > row_written and row < len(self):
+                f.write(f'C\t{self.clks[row] - self.clks[row_written]}\n')
+                row_written = row
+            if event[0] == 'new':
+                _, instr_id, pc, _ = event
+                f.write(f'I\t{instr_id}\t{instr_id}\t0\n')
+                f.write(f'L\t{instr_id}\t0\t{pc}: {self.disassemble(pc)}\n')
+            elif event[0] == 'stage':
+                _, instr_id, stage, _, held = event
+                if held:
+                    continue
+                if instr_id in current:
+                    f.write(f'E\t{instr_id}\t0\t{STAGES[current[instr_id]]}\n')
+                f.write(f'S\t{instr_id}\t0\t{STAGES[stage]}\n')
+                current[instr_id] = stage
+            else:
+                _, instr_id, _, retired = event
+                f.write(f'E\t{instr_id}\t0\t{STAGES[current.pop(instr_id)]}\n')
+                if retired is not None:
+                    f.write(f'R\t{instr_id}\t{retire_id}\t{0 if retired else 1}\n')
+                    retire_id += retired
+
+    # Write the diagram, the format follows the file extension
+    def write(self, fname: str) -> None:
+        fmt = 'text'
+        for ext, name in FORMATS.items():
+            if fname.lower().endswith(ext):
+                fmt = name
+        with open(fname, 'w') as f:
+            if fmt == 'kanata':
+                self.write_kanata(f)
+            elif fmt == 'html':
+                f.write(self.html() + '\n')
+            else:
+                f.write(self.text() + '\n')
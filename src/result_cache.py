@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+
+"""
+result_cache.py: Persistent on-disk cache of simulation results
+
+Results are keyed by a hash of the memory image contents, the mode, the
+effective run parameters with every default filled in, the config values that
+change any result and a digest of the simulator sources, one JSON file each.
+Editing the simulator or config.py starts a fresh set of keys.
+Reading a result refreshes its modification time and the least recently used
+results are evicted once the cache grows past its size limit.
+"""
+
+import config
+import hashlib
+import json
+import logging
+import os
+
+# Hash of a file's contents
+def hash_file(fname: str) -> str:
+    with open(fname, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+# Config values that change results without being a run parameter
+RESULT_CONFIG = ['MEM_SIZE', 'PIPELINES', 'SAMPLE_CONFIDENCE_Z']
+
+# Digest of the simulator sources, every module next to this one
+_sources_digest = None
+
+def sources_digest() -> str:
+    global _sources_digest
+    if _sources_digest is None:
+        src_dir = os.path.dirname(os.path.abspath(__file__))
+        digest = hashlib.sha256()
+        for fname in sorted(os.listdir(src_dir)):
+            if fname.endswith('.py'):
+                digest.update(fname.encode() + b'\0')
+                with open(os.path.join(src_dir, fname), 'rb') as f:
+                    digest.update(hashlib.sha256(f.read()).digest())
+        _sources_digest = digest.hexdigest()
+    return _sources_digest
+
+# Cache key for a result of image_hash in mode, options holds the effective
+# value of every run parameter, defaults included
+def make_key(image_hash: str, mode: str, options: dict = None) -> str:
+    key = json.dumps({'image': image_hash, 'mode': mode, 'options': options or {},
+                      'config': {name: getattr(config, name) for name in RESULT_CONFIG},
+                      'sources': sources_digest()}, sort_keys=True)
+    return hashlib.sha256(key.encode()).hexdigest()
+
+class ResultCache:
+    # Init
+    def __init__(self, cache_dir: str = config.RESULT_CACHE_DIR,
+                 max_bytes: int = config.RESULT_CACHE_MAX_BYTES) -> None:
+        self.cache_dir = os.path.expanduser(cache_dir)
+        self.max_bytes = max_bytes
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + '.json')
+
+    # Cached result for key, None on a miss
+    def get(self, key: str):
+        path = self.path(key)
+        try:
+            with open(path) as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        # Mark as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        logging.debug(f'Result cache hit: {key}')
+        return result
+
+    # Store a result, written to a temporary file first so readers never see
+    # half an entry
+    def put(self, key: str, result: dict) -> None:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.path(key)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(result, f)
+        os.replace(path + '.tmp', path)
+        self.evict()
+
+    # Remove least recently used entries until the cache fits in max_bytes
+    def evict(self) -> None:
+        entries = []
+        total = 0
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.name.endswith('.json'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+        if total <= self.max_bytes:
+            return
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+"""
+sampling.py: Sampled simulation with statistical cycle estimation (SMARTS style)
+"""
+
+import config
+import hybrid
+import logging
+import math
+import statistics
+
+class MIPS_lite_sampled(hybrid.MIPS_lite_hybrid):
+    # Init
+    # Every 'period' instructions the next 'warmup' + 'window' instructions
+    # run on the pipelined model; only the last 'window' are measured
+    def __init__(self, mode: str, mem_fname: str, period: int = config.SAMPLE_PERIOD,
+                 window: int = config.SAMPLE_WINDOW, warmup: int = config.SAMPLE_WARMUP) -> None:
+        assert window > 0, "Sample window must be at least 1 instruction"
+        assert period >= warmup + window, "Sample period must cover warm-up and window"
+        self.period = period
+        self.window = window
+        self.warmup = warmup
+
+        # First sampling unit starts at the first instruction
+        self.unit_start = 0
+        super().__init__(mode, mem_fname, start_count=0)
+
+        # Snapshot of the pipelined counters at the start of the measured window
+        self.measuring = False
+        self.snapshot = None
+
+        # Per sampling unit measurements: cycles, stalls and data hazards per instruction
+        self.cpi_samples = []
+        self.spi_samples = []
+        self.dhpi_samples = []
+
+    # Take a snapshot of pipelined counters
+    def get_snapshot(self) -> tuple:
+        return (self.pipe.instr_count, self.pipe.clk, self.pipe.stall_count, self.pipe.num_data_hazards)
+
+    # Record one sampling unit
+    def record_unit(self) -> None:
+        start = self.snapshot
+        end = self.get_snapshot()
+        instrs = end[0] - start[0]
+        self.cpi_samples.append((end[1] - start[1]) / instrs)
+        self.spi_samples.append((end[2] - start[2]) / instrs)
+        self.dhpi_samples.append((end[3] - start[3]) / instrs)
+        logging.debug(f'Sample {len(self.cpi_samples)}: CPI = {self.cpi_samples[-1]}')
+
+    def do_cpu_things(self) -> bool:
+        if self.detailed == False:
+            if self.func.instr_count >= self.unit_start:
+                self.switch_to_pipe()
+        else:
+            if self.measuring == False and self.pipe.instr_count >= self.unit_start + self.warmup:
+                self.snapshot = self.get_snapshot()
+                self.measuring = True
+            elif self.measuring == True and self.pipe.instr_count >= self.unit_start + self.warmup + self.window:
+                self.record_unit()
+                self.measuring = False
+                self.unit_start += self.period
+                self.switch_to_func()
+
+        halted = self.cpu.do_cpu_things()
+        # A unit cut short by HALT still counts once it has measured something
+        if halted == True and self.measuring == True and self.pipe.instr_count > self.snapshot[0]:
+            self.record_unit()
+            self.measuring = False
+        return halted
+
+    # True when no functional phase happened, every instruction was simulated
+    # cycle-accurately and the counts are exact
+    def exact(self) -> bool:
+        return self.window_done == False
+
+    # Estimated value of total = n * mean(samples), with the half width of the
+    # confidence interval (None if there are not enough samples)
+    def estimate(self, samples: list, offset: int = 0) -> tuple:
+        if len(samples) == 0:
+            return None, None
+        n = self.instr_count
+        mean = statistics.mean(samples)
+        if len(samples) < 2:
+            return n * mean + offset, None
+        half_width = config.SAMPLE_CONFIDENCE_Z * statistics.stdev(samples) / math.sqrt(len(samples))
+        return n * mean + offset, n * half_width
+
+    # Estimates for the whole run: name -> (estimate, CI half width)
+    def estimates(self) -> dict:
+        if self.exact():
+            return {'clocks': (self.pipe.clk, None), 'stalls': (self.pipe.stall_count, None),
+                    'data_hazards': (self.pipe.num_data_hazards, None)}
+
+        # Pipeline fill: the first instruction retires after all 5 stages
+        fill = len(self.pipe.pipeline) - 1
+        return {
+            'clocks': self.estimate(self.cpi_samples, fill),
+            'stalls': self.estimate(self.spi_samples),
+            'data_hazards': self.estimate(self.dhpi_samples)
+        }
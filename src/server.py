@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+
+"""
+server.py: Simulator server, keeps simulations warm for interactive tools
+
+Speaks JSON-RPC 2.0, one request or response per line, over TCP or a Unix
+socket. Every client can open any number of sessions and sessions stay alive
+across connections until closed. Long runs are done in chunks so other
+clients keep being served in between.
+
+Start with:
+    ./server.py [--tcp=<host>:<port>] [--unix=<path>]
+
+Methods (params in brackets):
+    load [image, mode]               -> new session id, mode is func/no-fwd/fwd
+    close [session]
+    sessions                         -> open sessions
+    step [session, n]                -> run n steps (cycles, or instructions in FUNC)
+    run [session, breakpoints, max_steps] -> run until HALT, a breakpoint PC or max_steps
+    regs [session]                   -> PC and registers
+    mem [session, addr, words]       -> memory words from addr
+    stats [session]                  -> instruction counts, clocks, stalls and hazards
+    snapshot [session]               -> snapshot id of the current state
+    restore [session, snapshot]      -> go back to a snapshot
+"""
+
+import asyncio
+import config
+import copy
+import cpu
+import cpu_func
+import hybrid
+import itertools
+import json
+import logging
+import os
+import sys
+
+# Default TCP endpoint
+HOST = '127.0.0.1'
+PORT = 5860
+
+# Steps simulated between two yields to the event loop
+STEP_CHUNK = 1000
+
+# JSON-RPC error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+SIM_ERROR = -32000
+
+# Error that is sent back to the client
+class RPCError(Exception):
+    def __init__(self, code: int, message: str) -> None:
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+# Non-negative integer parameter with a default, bad values are the client's error
+def int_param(params: dict, name: str, default: int) -> int:
+    value = params.get(name, default)
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise RPCError(INVALID_PARAMS, f'{name} must be an integer')
+    if value < 0:
+        raise RPCError(INVALID_PARAMS, f'{name} can not be negative')
+    return value
+
+class Session:
+    # Init
+    def __init__(self, session_id: int, image: str, mode: str) -> None:
+        self.id = session_id
+        self.image = image
+        self.mode = mode
+        if mode == 'func':
+            self.sim = cpu_func.MIPS_lite_func(image)
+        else:
+            # No event skipping, so a step is always a single cycle
+            self.sim = cpu.MIPS_lite(mode, image, event_skip=False)
+        self.halted = False
+        self.steps = 0
+        self.snapshots = {}
+        self.snapshot_ids = itertools.count()
+
+        # One command at a time per session, even with several clients on it
+        self.lock = asyncio.Lock()
+
+    # Run up to n steps, stopping at HALT or when stop() says so
+    # Yields to the event loop every STEP_CHUNK steps
+    async def run(self, n: int, stop=None) -> int:
+        done = 0
+        while done < n and self.halted == False:
+            for _ in range(min(STEP_CHUNK, n - done)):
+                self.halted = self.sim.do_cpu_things() == True
+                done += 1
+                if self.halted or (stop is not None and stop(self.sim)):
+                    self.steps += done
+                    return done
+            await asyncio.sleep(0)
+        self.steps += done
+        return done
+
+    # Short state summary returned by step and run
+    def summary(self) -> dict:
+        info = {'halted': self.halted, 'steps': self.steps, 'pc': int(self.sim.pc),
+                'instr_count': self.sim.instr_count}
+        if self.mode != 'func':
+            info['clk'] = self.sim.clk
+        return info
+
+class SimServer:
+    # Init
+    def __init__(self) -> None:
+        self.sessions = {}
+        self.session_ids = itertools.count(1)
+        self.methods = {
+            'load': self.load, 'close': self.close, 'sessions': self.list_sessions,
+            'step': self.step, 'run': self.run, 'regs': self.regs, 'mem': self.mem,
+            'stats': self.stats, 'snapshot': self.snapshot, 'restore': self.restore,
+        }
+
+    def session(self, params: dict) -> Session:
+        session_id = params.get('session')
+        if session_id not in self.sessions:
+            raise RPCError(INVALID_PARAMS, f'Unknown session: {session_id}')
+        return self.sessions[session_id]
+
+    async def load(self, params: dict):
+        image = params.get('image')
+        mode = params.get('mode', 'func')
+        if not isinstance(image, str) or not os.path.exists(image):
+            raise RPCError(INVALID_PARAMS, f'Memory image file not found: {image}')
+        if not isinstance(mode, str) or mode.lower() not in ['func'] + list(config.PIPELINES):
+            raise RPCError(INVALID_PARAMS, f'Unknown mode: {mode}')
+        mode = mode.lower()
+        session = Session(next(self.session_ids), image, mode)
+        self.sessions[session.id] = session
+        logging.info(f'Session {session.id}: {mode} {image}')
+        return {'session': session.id}
+
+    async def close(self, params: dict):
+        session = self.session(params)
+        del self.sessions[session.id]
+        return True
+
+    async def list_sessions(self, params: dict):
+        return [{'session': s.id, 'image': s.image, 'mode': s.mode, 'halted': s.halted}
+                for s in self.sessions.values()]
+
+    async def step(self, params: dict):
+        session = self.session(params)
+        async with session.lock:
+            await session.run(int_param(params, 'n', 1))
+            return session.summary()
+
+    # PC breakpoints follow hybrid.reached(): for the pipelined models the
+    # instruction at the PC has just executed, for FUNC it is about to
+    async def run(self, params: dict):
+        session = self.session(params)
+        breakpoints = params.get('breakpoints', [])
+        if not isinstance(breakpoints, list) or \
+                not all(isinstance(pc, int) and not isinstance(pc, bool) for pc in breakpoints):
+            raise RPCError(INVALID_PARAMS, 'breakpoints must be a list of integers')
+        breakpoints = frozenset(breakpoints)
+        max_steps = int_param(params, 'max_steps', 1 << 62)
+
+        def at_breakpoint(sim) -> bool:
+            for pc in breakpoints:
+                if hybrid.reached(sim, pc, None):
+                    return True
+            return False
+
+        async with session.lock:
+            await session.run(max_steps, at_breakpoint if len(breakpoints) > 0 else None)
+            info = session.summary()
+            info['breakpoint'] = len(breakpoints) > 0 and at_breakpoint(session.sim)
+            return info
+
+    async def regs(self, params: dict):
+        sim = self.session(params).sim
+        return {'pc': int(sim.pc), 'R': [int(val) for val in sim.R]}
+
+    async def mem(self, params: dict):
+        sim = self.session(params).sim
+        addr = int_param(params, 'addr', 0)
+        words = int_param(params, 'words', 1)
+        if addr + 4 * words > sim.mem.size:
+            raise RPCError(INVALID_PARAMS, f'{words} words from {addr} are past the end of memory')
+        data = sim.mem.read_n(addr, 4 * words)
+        return [int.from_bytes(data[i:i+4], byteorder='big', signed=False) for i in range(0, len(data), 4)]
+
+    async def stats(self, params: dict):
+        session = self.session(params)
+        sim = session.sim
+        info = {counter: getattr(sim, counter) for counter in hybrid.ARCH_COUNTERS}
+        if session.mode != 'func':
+            info.update({'clk': sim.clk, 'stall_count': sim.stall_count,
+                         'num_data_hazards': sim.num_data_hazards})
+        return info
+
+    async def snapshot(self, params: dict):
+        session = self.session(params)
+        async with session.lock:
+            snapshot_id = next(session.snapshot_ids)
+            session.snapshots[snapshot_id] = (copy.deepcopy(session.sim), session.halted, session.steps)
+            return {'snapshot': snapshot_id}
+
+    async def restore(self, params: dict):
+        session = self.session(params)
+        snapshot_id = params.get('snapshot')
+        if snapshot_id not in session.snapshots:
+            raise RPCError(INVALID_PARAMS, f'Unknown snapshot: {snapshot_id}')
+        async with session.lock:
+            sim, session.halted, session.steps = session.snapshots[snapshot_id]
+            # Keep the snapshot reusable
+            session.sim = copy.deepcopy(sim)
+            return session.summary()
+
+    # Handle one request line, returns the response or None for notifications
+    async def dispatch(self, line: bytes):
+        try:
+            request = json.loads(line)
+        except ValueError as err:
+            return {'jsonrpc': '2.0', 'id': None, 'error': {'code': PARSE_ERROR, 'message': str(err)}}
+
+        request_id = request.get('id') if isinstance(request, dict) else None
+        try:
+            if not isinstance(request, dict) or not isinstance(request.get('method'), str):
+                raise RPCError(INVALID_REQUEST, 'Invalid request')
+            method = self.methods.get(request['method'])
+            if method is None:
+                raise RPCError(METHOD_NOT_FOUND, f'Unknown method: {request["method"]}')
+            params = request.get('params', {})
+            if not isinstance(params, dict):
+                raise RPCError(INVALID_PARAMS, 'Params must be an object')
+            response = {'jsonrpc': '2.0', 'id': request_id, 'result': await method(params)}
+        except RPCError as err:
+            response = {'jsonrpc': '2.0', 'id': request_id, 'error': {'code': err.code, 'message': err.message}}
+        # The simulators assert on bad addresses and exit() on bad opcodes
+        except (Exception, SystemExit) as err:
+            logging.info(f'Request failed: {type(err).__name__}: {err}')
+            response = {'jsonrpc': '2.0', 'id': request_id,
+                        'error': {'code': SIM_ERROR, 'message': f'{type(err).__name__}: {err}'}}
+
+        # Notifications get no response
+        if isinstance(request, dict) and 'id' not in request:
+            return None
+        return response
+
+    # One connection, requests are answered in order
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        logging.info(f'Client connected: {writer.get_extra_info("peername")}')
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip() == b'':
+                    continue
+                response = await self.dispatch(line)
+                if response is not None:
+                    writer.write((json.dumps(response) + '\n').encode())
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+# Serve on every requested endpoint until interrupted
+async def serve(tcp=None, unix=None) -> None:
+    sim_server = SimServer()
+    servers = []
+    if tcp is not None:
+        servers.append(await asyncio.start_server(sim_server.handle_client, tcp[0], tcp[1]))
+        print(f'Listening on {tcp[0]}:{tcp[1]}')
+    if unix is not None:
+        servers.append(await asyncio.start_unix_server(sim_server.handle_client, unix))
+        print(f'Listening on {unix}')
+    await asyncio.gather(*[server.serve_forever() for server in servers])
+
+if __name__ == '__main__':
+    tcp = None
+    unix = None
+    for arg in sys.argv[1:]:
+        if arg.startswith('--tcp='):
+            host, _, port = arg[len('--tcp='):].rpartition(':')
+            tcp = (host if host != '' else HOST, int(port))
+        elif arg.startswith('--unix='):
+            unix = arg[len('--unix='):]
+        else:
+            print("./server.py [--tcp=<host>:<port>] [--unix=<path>]")
+            exit(1)
+    if tcp is None and unix is None:
+        tcp = (HOST, PORT)
+
+    logging.basicConfig(format=config.LOG_FORMAT, level=logging.ERROR)
+    try:
+        asyncio.run(serve(tcp, unix))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+
+"""
+statelog.py: Incremental state-diff log and a tool to rebuild state from it
+
+Records only the registers and memory words that changed in each clock cycle
+(pipelined) or instruction (functional), as JSON lines or packed binary.
+
+Rebuild the state at a given step with:
+    ./statelog.py <state_log> [step]
+"""
+
+import config
+import json
+import memory
+import os
+import struct
+import sys
+
+from parser import load_image
+
+# Binary format: magic, version and header length, then the JSON header
+# Each record is (step, #regs, #words) followed by (reg, value) and (addr, word) pairs
+# Register values are varints, registers of the functional simulator are not
+# limited to 64 bits
+MAGIC = b'MLSD'
+VERSION = 2
+HEADER = struct.Struct('<4sBI')
+RECORD = struct.Struct('<qHH')
+REG = struct.Struct('<B')
+WORD = struct.Struct('<II')
+
+# Signed varint: zigzag (0, -1, 1, -2, ... -> 0, 1, 2, 3, ...), then 7 bits
+# per byte, lowest first, the top bit set on all but the last byte
+def pack_value(val: int) -> bytes:
+    val = 2 * val if val >= 0 else -2 * val - 1
+    data = bytearray()
+    while val > 0x7F:
+        data.append((val & 0x7F) | 0x80)
+        val >>= 7
+    data.append(val)
+    return bytes(data)
+
+def read_value(f) -> int:
+    val = 0
+    shift = 0
+    while True:
+        byte = f.read(1)[0]
+        val |= (byte & 0x7F) << shift
+        shift += 7
+        if byte < 0x80:
+            break
+    return val >> 1 if val & 1 == 0 else -(val >> 1) - 1
+
+# Buffer size for the log file
+BUFFER_SIZE = 1 << 20
+
+class StateLogWriter:
+    # Init
+    # unit: 'cycle' for the pipelined simulator, 'instr' for the functional one
+    def __init__(self, fname: str, cpu_inst, unit: str, fmt: str = 'json') -> None:
+        assert fmt in ['json', 'bin'], "State log format must be json or bin"
+        self.cpu = cpu_inst
+        self.unit = unit
+        self.fmt = fmt
+        self.last_R = [0] * len(cpu_inst.R)
+
+        # Memory reports every write it sees from now on
+        self.writes = []
+        cpu_inst.mem.log_writes(self.writes)
+
+        header = {'image': os.path.abspath(cpu_inst.mem_fname), 'mem_size': cpu_inst.mem.size, 'unit': unit}
+        if fmt == 'json':
+            self.file = open(fname, 'w', buffering=BUFFER_SIZE)
+            self.file.write(json.dumps(header) + '\n')
+        else:
+            self.file = open(fname, 'wb', buffering=BUFFER_SIZE)
+            header = json.dumps(header).encode()
+            self.file.write(HEADER.pack(MAGIC, VERSION, len(header)) + header)
+
+    # Log whatever changed since the last call, tagged with the current step
+    def record(self, step: int) -> None:
+        R = self.cpu.R
+        if R == self.last_R and len(self.writes) == 0:
+            return
+
+        regs = []
+        if R != self.last_R:
+            for reg in range(len(R)):
+                if R[reg] != self.last_R[reg]:
+                    regs.append((reg, int(R[reg])))
+                    self.last_R[reg] = R[reg]
+
+        words = []
+        for addr in sorted(set(self.writes)):
+            data = int.from_bytes(bytes=self.cpu.mem.read_n(addr, 4), byteorder='big', signed=False)
+            words.append((int(addr), data))
+        self.writes.clear()
+
+        if self.fmt == 'json':
+            self.file.write(json.dumps({'t': step, 'r': regs, 'm': words}, separators=(',', ':')) + '\n')
+        else:
+            self.file.write(RECORD.pack(step, len(regs), len(words)))
+            for reg, value in regs:
+                self.file.write(REG.pack(reg) + pack_value(value))
+            for word in words:
+                self.file.write(WORD.pack(*word))
+
+    def close(self) -> None:
+        self.cpu.mem.stop_log_writes()
+        self.file.close()
+
+# Read a state log, returns the header and a generator of (step, regs, words)
+def read_log(fname: str):
+    f = open(fname, 'rb')
+    if f.read(len(MAGIC)) != MAGIC:
+        f.seek(0)
+        header = json.loads(f.readline())
+
+        def records():
+            for line in f:
+                rec = json.loads(line)
+                yield rec['t'], rec['r'], rec['m']
+            f.close()
+        return header, records()
+
+    f.seek(0)
+    _, version, header_len = HEADER.unpack(f.read(HEADER.size))
+    assert version == VERSION, "Unsupported state log version"
+    header = json.loads(f.read(header_len))
+
+    def records():
+        while True:
+            data = f.read(RECORD.size)
+            if len(data) < RECORD.size:
+                break
+            step, num_regs, num_words = RECORD.unpack(data)
+            regs = [(REG.unpack(f.read(REG.size))[0], read_value(f)) for _ in range(num_regs)]
+            words = [WORD.unpack(f.read(WORD.size)) for _ in range(num_words)]
+            yield step, regs, words
+        f.close()
+    return header, records()
+
+# Rebuild registers and memory as they were at the end of 'step'
+# (None means the end of the log)
+def replay(fname: str, step: int = None) -> tuple:
+    header, records = read_log(fname)
+    R = [0] * 32
+    mem = memory.Memory(header['mem_size'])
+    load_image(mem, header['image'])
+
+    for rec_step, regs, words in records:
+        if step is not None and rec_step > step:
+            break
+        for reg, value in regs:
+            R[reg] = value
+        for addr, data in words:
+            mem.write_n(addr, data.to_bytes(4, 'big'))
+    return header, R, mem
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("./statelog.py <state_log> [step]")
+        exit(1)
+
+    step = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    header, R, mem = replay(sys.argv[1], step)
+    image = memory.Memory(header['mem_size'])
+    load_image(image, header['image'])
+
+    print(f'State at {header["unit"]} {step if step is not None else "end"}:')
+    print('\nRegisters:')
+    for reg in range(len(R)):
+        if R[reg] != 0:
+            print(f'R{reg}: {R[reg]}')
+
+    # Memory words that differ from the image
+    print('\nModified Addresses:')
+    for addr in range(0, header['mem_size'], 4):
+        if mem.mem[addr:addr+4] != image.mem[addr:addr+4]:
+            data = int.from_bytes(bytes=mem.read_n(addr, 4), byteorder='big', signed=False)
+            print(f'Addr: {addr}, Data: {data}')
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+
+"""
+sweep.py: Parallel parameter sweep over memory images
+
+Runs every combination of the parameter grid on every image and writes one
+CSV row per run. Results are cached on disk under a hash of the image
+contents, the run parameters and the simulator sources in the result cache
+shared with main.py, so a repeated or extended sweep only simulates
+combinations it has not seen before.
+
+Run with:
+    ./sweep.py <results.csv> <memory_image> [memory_image ...] [options]
+
+Options, values are comma separated:
+    --mode=<modes>        func, no-fwd, fwd (default: no-fwd,fwd)
+    --bp=<predictors>     none or predictor names (default: none)
+    --bp-size=<sizes>     predictor table sizes (default: config.BP_TABLE_SIZE)
+    --icache=<specs>      none, default or <size>:<assoc>:<line_size>:<miss_penalty>
+    --dcache=<specs>      same as --icache
+    --jobs=<n>            worker processes (default: number of CPUs)
+    --cache-dir=<dir>     result cache directory (default: config.RESULT_CACHE_DIR)
+"""
+
+import branch_predictor
+import cache
+import concurrent.futures
+import config
+import cpu
+import cpu_func
+import itertools
+import logging
+import os
+import result_cache
+import sys
+import time
+
+# Grid parameters and their defaults
+PARAMS = ['mode', 'bp', 'bp_size', 'icache', 'dcache']
+DEFAULT_GRID = {'mode': ['no-fwd', 'fwd'], 'bp': ['none'], 'bp_size': [config.BP_TABLE_SIZE],
+                'icache': ['none'], 'dcache': ['none']}
+
+# Result columns, after the image and the parameters
+RESULTS = ['instrs', 'clk', 'cpi', 'stalls', 'data_hazards', 'bp_accuracy', 'icache_hit_rate',
+           'dcache_hit_rate', 'cache_stalls']
+
+# Cache geometry from 'none', 'default' or '<size>:<assoc>:<line_size>:<miss_penalty>'
+# Raises ValueError for a spec that is not a geometry the cache model can run
+def parse_cache_spec(spec: str, defaults: dict):
+    if spec == 'none':
+        return None
+    params = dict(defaults)
+    if spec != 'default':
+        values = [int(val, 0) for val in spec.split(':')]
+        if len(values) > 4:
+            raise ValueError('at most 4 values: size, assoc, line_size, miss_penalty')
+        params.update(zip(['size', 'assoc', 'line_size', 'miss_penalty'], values))
+    error = cache.geometry_error(params['size'], params['assoc'], params['line_size'], params['miss_penalty'])
+    if error is not None:
+        raise ValueError(error)
+    return params
+
+# Drop parameters that do not change the run, so equal runs get equal keys
+def normalize(params: dict) -> dict:
+    params = dict(params)
+    if params['mode'] == 'func':
+        params.update({'bp': 'none', 'icache': 'none', 'dcache': 'none'})
+    if params['bp'] == 'none':
+        params['bp_size'] = None
+    for name, defaults in [('icache', config.ICACHE), ('dcache', config.DCACHE)]:
+        geometry = parse_cache_spec(params[name], defaults)
+        params[name] = 'none' if geometry is None else \
+            ':'.join(str(geometry[key]) for key in ['size', 'assoc', 'line_size', 'miss_penalty'])
+    return params
+
+# Cache key of one run, kept apart from main.py's reports of the same run
+def run_key(image_hash: str, params: dict) -> str:
+    return result_cache.make_key(image_hash, params['mode'], {'sweep': params})
+
+# Simulate one image with normalized parameters, returns the result columns
+def simulate(image: str, params: dict) -> dict:
+    if params['mode'] == 'func':
+        sim = cpu_func.MIPS_lite_func(image)
+    else:
+        bp = None
+        if params['bp'] != 'none':
+            bp = branch_predictor.PREDICTORS[params['bp']](params['bp_size'])
+        caches = []
+        for name, defaults in [('icache', config.ICACHE), ('dcache', config.DCACHE)]:
+            geometry = parse_cache_spec(params[name], defaults)
+            caches.append(None if geometry is None else
+                          cache.Cache(name.upper(), geometry['size'], geometry['assoc'],
+                                      geometry['line_size'], geometry['miss_penalty']))
+        sim = cpu.MIPS_lite(params['mode'], image, bp=bp, icache=caches[0], dcache=caches[1])
+
+    while sim.do_cpu_things() != True:
+        pass
+
+    result = dict.fromkeys(RESULTS)
+    result['instrs'] = sim.instr_count
+    if params['mode'] != 'func':
+        result.update({'clk': sim.clk, 'cpi': round(sim.clk / sim.instr_count, 4) if sim.instr_count > 0 else None,
+                       'stalls': sim.stall_count, 'data_hazards': sim.num_data_hazards,
+                       'cache_stalls': sim.cache_stall_count})
+        if sim.bp is not None:
+            result['bp_accuracy'] = round(sim.bp.accuracy(), 2)
+        if sim.icache is not None:
+            result['icache_hit_rate'] = round(sim.icache.hit_rate(), 2)
+        if sim.dcache is not None:
+            result['dcache_hit_rate'] = round(sim.dcache.hit_rate(), 2)
+    return result
+
+# Worker process setup
+def init_worker() -> None:
+    logging.basicConfig(format=config.LOG_FORMAT, level=logging.ERROR)
+
+# Run the sweep, returns the rows, the number of simulated runs and of cache hits
+def sweep(images: list, grid: dict, results_cache: result_cache.ResultCache, jobs: int = None) -> tuple:
+    image_hashes = {image: result_cache.hash_file(image) for image in images}
+
+    # Every combination, deduplicated after normalization
+    runs = []
+    for image in images:
+        seen = set()
+        for values in itertools.product(*[grid[name] for name in PARAMS]):
+            params = normalize(dict(zip(PARAMS, values)))
+            key = run_key(image_hashes[image], params)
+            if key not in seen:
+                seen.add(key)
+                runs.append((image, params, key))
+
+    results = {}
+    todo = []
+    hits = 0
+    for image, params, key in runs:
+        if key in results:
+            continue
+        result = results_cache.get(key)
+        if result is not None:
+            results[key] = result
+            hits += 1
+        else:
+            todo.append((image, params, key))
+
+    # Identical images under different names only need one run
+    unique = {}
+    for image, params, key in todo:
+        unique.setdefault(key, (image, params))
+
+    with concurrent.futures.ProcessPoolExecutor(jobs, initializer=init_worker) as pool:
+        futures = {pool.submit(simulate, image, params): key for key, (image, params) in unique.items()}
+        for future in concurrent.futures.as_completed(futures):
+            key = futures[future]
+            results[key] = future.result()
+            results_cache.put(key, results[key])
+
+    rows = []
+    for image, params, key in runs:
+        row = {'image': image}
+        row.update(params)
+        row.update(results[key])
+        rows.append(row)
+    return rows, len(unique), hits
+
+def write_csv(fname: str, rows: list) -> None:
+    columns = ['image'] + PARAMS + RESULTS
+    with open(fname, 'w') as f:
+        f.write(','.join(columns) + '\n')
+        for row in rows:
+            f.write(','.join('' if row[col] is None else str(row[col]) for col in columns) + '\n')
+
+if __name__ == '__main__':
+    positional = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if len(positional) < 2:
+        print("./sweep.py <results.csv> <memory_image> [memory_image ...] [options]")
+        print("Options: --mode= --bp= --bp-size= --icache= --dcache= --jobs= --cache-dir=")
+        exit(1)
+
+    grid = dict(DEFAULT_GRID)
+    jobs = None
+    cache_dir = config.RESULT_CACHE_DIR
+    for arg in sys.argv[1:]:
+        if not arg.startswith('--'):
+            continue
+        name, _, value = arg[2:].partition('=')
+        if name == 'jobs':
+            jobs = int(value)
+        elif name == 'cache-dir':
+            cache_dir = value
+        elif name == 'bp-size':
+            grid['bp_size'] = [int(val, 0) for val in value.split(',')]
+        elif name in ['mode', 'bp', 'icache', 'dcache']:
+            grid[name] = [val.lower() for val in value.split(',')]
+        else:
+            print(f'Unknown option: {arg}')
+            exit(1)
+
+    for mode in grid['mode']:
+        if mode not in ['func'] + list(config.PIPELINES):
+            print(f'Unknown mode: {mode}')
+            exit(1)
+    for bp in grid['bp']:
+        if bp != 'none' and bp not in branch_predictor.PREDICTORS:
+            print(f'Unknown branch predictor: {bp}')
+            exit(1)
+    for bp_size in grid['bp_size']:
+        if bp_size < 1:
+            print(f'Branch predictor size must be at least 1: {bp_size}')
+            exit(1)
+    for name, defaults in [('icache', config.ICACHE), ('dcache', config.DCACHE)]:
+        for spec in grid[name]:
+            try:
+                parse_cache_spec(spec, defaults)
+            except ValueError as error:
+                print(f'Bad --{name} spec {spec}: {error}')
+                exit(1)
+    for image in positional[1:]:
+        if not os.path.exists(image):
+            print(f'Memory image file not found: {image}')
+            exit(1)
+
+    start = time.perf_counter()
+    rows, simulated, hits = sweep(positional[1:], grid, result_cache.ResultCache(cache_dir), jobs)
+    write_csv(positional[0], rows)
+    print(f'{len(rows)} runs, {simulated} simulated, {hits} from cache ' +
+          f'in {time.perf_counter() - start:.1f}s, results in {positional[0]}')
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+
+"""
+system.py: Multi-core MIPS-Lite system with one shared memory
+
+Every core has its own PC and register file. All of them work on the same
+Memory object and are interleaved by a deterministic round-robin scheduler,
+one step (clock cycle, or instruction for FUNC cores) per core per turn.
+A core that executes HALT drops out, the system stops once all have halted.
+
+Start PCs come from a list or from the start table in the image (see
+config.CORE_TABLE_ADDR), cores without an entry start at 0.
+
+Run with:
+    ./system.py <memory_image> <mode> <num_cores> [start_pc,...]
+"""
+
+import config
+import cpu
+import cpu_func
+import logging
+import memory
+import sys
+import time
+
+from parser import load_image
+
+# Start PCs from the image's start table, None if there is none
+def read_start_table(mem: memory.Memory) -> list:
+    def word(addr: int) -> int:
+        return int.from_bytes(mem.read_n(addr, 4), byteorder='big', signed=False)
+
+    if word(config.CORE_TABLE_ADDR) != config.CORE_TABLE_MAGIC:
+        return None
+    count = word(config.CORE_TABLE_ADDR + 4)
+    return [word(config.CORE_TABLE_ADDR + 8 + 4 * core) for core in range(count)]
+
+class MIPS_lite_system:
+    # Init
+    # mode: 'func' or a pipelined mode, used for every core
+    def __init__(self, mode: str, mem_fname: str, num_cores: int, start_pcs: list = None) -> None:
+        assert num_cores > 0, "Need at least one core"
+        self.mode = mode
+        self.mem_fname = mem_fname
+        self.num_cores = num_cores
+
+        self.mem = memory.Memory(config.MEM_SIZE)
+        load_image(self.mem, mem_fname)
+
+        if start_pcs is None:
+            start_pcs = read_start_table(self.mem) or []
+        self.start_pcs = [start_pcs[core] if core < len(start_pcs) else 0 for core in range(num_cores)]
+
+        self.cores = []
+        for core in range(num_cores):
+            if mode == 'func':
+                sim = cpu_func.MIPS_lite_func(mem_fname, mem=self.mem)
+            else:
+                # One call has to be one cycle for the interleaving to be cycle by cycle
+                sim = cpu.MIPS_lite(mode, mem_fname, mem=self.mem, event_skip=False)
+            sim.pc = self.start_pcs[core]
+            sim.npc = self.start_pcs[core]
+            self.cores.append(sim)
+            logging.debug(f'Core {core}: start PC {sim.pc}')
+
+        # Scheduler state: cores that have not halted yet, in round-robin order
+        self.running = list(range(num_cores))
+        self.halted_at = [None] * num_cores
+        self.turns = 0
+
+    # One round-robin turn: every running core takes one step
+    # Returns True once all cores have halted
+    def do_cpu_things(self) -> bool:
+        self.turns += 1
+        still_running = []
+        for core in self.running:
+            if self.cores[core].do_cpu_things() == True:
+                self.halted_at[core] = self.turns
+                logging.debug(f'Core {core}: halted in turn {self.turns}')
+            else:
+                still_running.append(core)
+        self.running = still_running
+        return len(self.running) == 0
+
+    # Run until every core has halted, or for at most max_turns turns
+    def run(self, max_turns: int = None) -> bool:
+        while len(self.running) > 0:
+            if max_turns is not None:
+                if max_turns <= 0:
+                    break
+                max_turns -= 1
+            self.do_cpu_things()
+        return len(self.running) == 0
+
+    # Addresses written by any core
+    def modified_addrs(self) -> list:
+        addrs = set()
+        for sim in self.cores:
+            addrs.update(int(addr) for addr in sim.modified_addrs)
+        return sorted(addrs)
+
+    # Per-core and system report
+    def report(self) -> str:
+        info = f'System: {self.num_cores} {self.mode} cores, {self.turns} turns'
+        for core, sim in enumerate(self.cores):
+            info += f'\n\nCore {core}:'
+            info += f'\nStart PC: {self.start_pcs[core]}, Final PC: {sim.pc}, ' + \
+                    (f'Halted in turn: {self.halted_at[core]}' if self.halted_at[core] is not None else 'Running')
+            info += f'\nTotal Instructions: {sim.instr_count}, Arithmetic: {sim.arithmetic_instr_count}, ' + \
+                    f'Logical: {sim.logical_instr_count}, Memory: {sim.mem_instr_count}, ' + \
+                    f'Control: {sim.cntrl_instr_count}'
+            if self.mode != 'func':
+                info += f'\nClock cycles: {sim.clk}, Stalls: {sim.stall_count}, ' + \
+                        f'Data Hazards: {sim.num_data_hazards}'
+            for reg in sorted(sim.modified_regs):
+                info += f'\nR{reg}: {sim.R[reg]}'
+
+        info += '\n\nModified Addresses:'
+        for addr in self.modified_addrs():
+            data = int.from_bytes(bytes=self.mem.read_n(addr, 4), byteorder='big', signed=False)
+            info += f'\nAddr: {addr}, Data: {data}'
+        return info
+
+if __name__ == '__main__':
+    if len(sys.argv) < 4:
+        print("./system.py <memory_image> <mode> <num_cores> [start_pc,...]")
+        print("\nMode can be: FUNC, NO-FWD, FWD")
+        exit(1)
+
+    logging.basicConfig(format=config.LOG_FORMAT, level=logging.ERROR)
+
+    mode = sys.argv[2].lower()
+    if mode not in ['func'] + list(config.PIPELINES):
+        print("Incorrect format for mode. Please use: FUNC, NO-FWD, FWD")
+        exit(1)
+    start_pcs = [int(pc, 0) for pc in sys.argv[4].split(',')] if len(sys.argv) > 4 else None
+
+    system = MIPS_lite_system(mode, sys.argv[1], int(sys.argv[3]), start_pcs)
+    start = time.perf_counter()
+    system.run()
+    elapsed = time.perf_counter() - start
+
+    print(system.report())
+    steps = sum(sim.clk if mode != 'func' else sim.instr_count for sim in system.cores)
+    print(f'\nHost throughput: {steps / elapsed:.0f} core steps/s')
@@ -56,7 +56,7 @@ def imm_check(imm: str):
         return imm_val
     
 
-def convert_to_mem(output: str, command):
+def convert_to_mem(output: str, command, sparse: bool = False):
     # Extract tokens from list
     o_file = open(output, 'w') 
     for i in command:
@@ -124,10 +124,12 @@ def convert_to_mem(output: str, command):
             trace = trace + "\n"
             # Write to file
             o_file.write(trace)
-    mem_occ = len(command)
-    for i in range(mem_occ, 1023):
-        o_file.write("00000000\n")
-    o_file.write("00000000")
+    # Sparse images leave out the zero padding, memory starts out zeroed
+    if not sparse:
+        mem_occ = len(command)
+        for i in range(mem_occ, 1023):
+            o_file.write("00000000\n")
+        o_file.write("00000000")
     o_file.close()
             
         
@@ -135,6 +137,7 @@ if __name__ == '__main__':
     # Start by checking length of parameters
     if (len(sys.argv) < 3):
         print("Too few arguments")
+        print("./assembler.py <input_asm> <output_image> [--sparse]")
         exit(1)
     
     # Open the file taken as command line argument
@@ -147,7 +150,7 @@ if __name__ == '__main__':
     print(command_list)
 
     # call function to putput to text file 
-    convert_to_mem(sys.argv[2], command_list)
+    convert_to_mem(sys.argv[2], command_list, '--sparse' in sys.argv[3:])
 
     # close input file 
     f.close()
\ No newline at end of file
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+"""
+simtest.py: Helpers shared by the tests
+
+Puts src/ on the import path, writes small programs as memory images and runs
+the simulators to HALT.
+
+Programs are lists of assembly lines with the operand order of assembler.py:
+    ADD rd, rs, rt       ADDI rt, rs, imm     LDW/STW rt, rs, imm
+    BZ rs, imm           BEQ rs, rt, imm      JR rs         HALT
+"""
+
+import glob
+import os
+import sys
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(os.path.dirname(TESTS_DIR), 'src')
+sys.path.insert(0, SRC_DIR)
+
+import config
+import cpu
+import cpu_func
+import parser
+from instruction import Instruction
+
+IMAGES = sorted(glob.glob(os.path.join(TESTS_DIR, '*.mem')))
+PIPELINED = list(config.PIPELINES)
+MODES = ['func'] + PIPELINED
+
+# Steps before a run counts as hung
+MAX_STEPS = 1000000
+
+# Instruction word from one line of assembly
+def assemble_line(line: str) -> int:
+    tokens = line.replace(',', ' ').split()
+    name = tokens[0].upper()
+    values = [int(token[1:]) if token[0] in 'rR' else int(token, 0) for token in tokens[1:]]
+    if name in Instruction.R_type_instr:
+        rd, rs, rt = values
+        return Instruction.encode(name, rs=rs, rt=rt, rd=rd)
+    if name == 'HALT':
+        return Instruction.encode(name)
+    if name == 'JR':
+        return Instruction.encode(name, rs=values[0])
+    if name == 'BZ':
+        return Instruction.encode(name, rs=values[0], imm=values[1])
+    if name == 'BEQ':
+        return Instruction.encode(name, rs=values[0], rt=values[1], imm=values[2])
+    rt, rs, imm = values
+    return Instruction.encode(name, rs=rs, rt=rt, imm=imm)
+
+# Write a program as a sparse image, code from address 0
+# data: {address: [words]} stored from that address on
+def write_program(fname: str, lines: list, data: dict = None) -> str:
+    image = bytearray(config.MEM_SIZE)
+    for index, line in enumerate(lines):
+        image[4*index:4*index+4] = assemble_line(line).to_bytes(4, 'big')
+    for addr, words in (data or {}).items():
+        for index, word in enumerate(words):
+            image[addr+4*index:addr+4*index+4] = (word & 0xFFFFFFFF).to_bytes(4, 'big')
+    parser.write_sparse(fname, image)
+    return fname
+
+def make_sim(mode: str, image: str, **kwargs):
+    if mode == 'func':
+        return cpu_func.MIPS_lite_func(image)
+    return cpu.MIPS_lite(mode, image, **kwargs)
+
+# Run to HALT
+def run(sim):
+    for _ in range(MAX_STEPS):
+        if sim.do_cpu_things() == True:
+            return sim
+    pytest.fail(f'No HALT within {MAX_STEPS} steps')
+
+# What the program computed: registers, memory and instruction counts
+def arch_state(sim) -> dict:
+    return {'regs': [int(val) for val in sim.R], 'mem': bytes(sim.mem.mem),
+            'modified_regs': sorted(sim.modified_regs),
+            'modified_addrs': sorted(int(addr) for addr in sim.modified_addrs),
+            'instrs': (sim.instr_count, sim.arithmetic_instr_count, sim.logical_instr_count,
+                       sim.mem_instr_count, sim.cntrl_instr_count)}
+
+# How long the pipeline took
+def timing(sim) -> tuple:
+    return (sim.clk, sim.stall_count, sim.load_use_stall_count, sim.num_data_hazards, sim.flush_count)
+
+# Test id of an image
+def name(image: str) -> str:
+    return os.path.basename(image)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+"""
+test_branch_predictor.py: Branch predictors, and the register dependencies of
+branches and stores
+"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from simtest import IMAGES, PIPELINED, SRC_DIR, arch_state, make_sim, name, run, timing, write_program
+
+import branch_predictor
+
+# 20 iterations closed by a backward BEQ
+LOOP = [
+    'ADDI R1, R0, 20',
+    'ADDI R2, R2, 3',
+    'SUBI R1, R1, 1',
+    'BZ R1, 2',
+    'BEQ R0, R0, -3',
+    'HALT',
+]
+
+# Predictors change the timing, never the result
+@pytest.mark.parametrize('image', IMAGES, ids=name)
+@pytest.mark.parametrize('mode', PIPELINED)
+@pytest.mark.parametrize('predictor', list(branch_predictor.PREDICTORS))
+def test_predictor_result(image, mode, predictor):
+    sim = make_sim(mode, image, bp=branch_predictor.PREDICTORS[predictor]())
+    assert arch_state(run(sim)) == arch_state(run(make_sim(mode, image)))
+
+# Predicting the back edge taken saves a flush on every iteration but the last
+@pytest.mark.parametrize('mode', PIPELINED)
+@pytest.mark.parametrize('predictor', ['backward-taken', 'btb', '2bit'])
+def test_loop_flushes(mode, predictor, tmp_path):
+    image = write_program(str(tmp_path / 'loop.mem'), LOOP)
+    plain = run(make_sim(mode, image, bp=branch_predictor.PREDICTORS['not-taken']()))
+    predicted = run(make_sim(mode, image, bp=branch_predictor.PREDICTORS[predictor]()))
+    assert predicted.R[2] == plain.R[2] == 60
+    assert plain.bp.branches == predicted.bp.branches == 39
+    assert plain.bp.mispredicts == 20
+    assert predicted.bp.mispredicts <= 4
+    assert predicted.clk < plain.clk
+
+def test_size_rejected():
+    for predictor in branch_predictor.PREDICTORS.values():
+        with pytest.raises(AssertionError):
+            predictor(0)
+
+@pytest.mark.parametrize('size', ['0', '-4'])
+def test_size_option(size, tmp_path):
+    image = write_program(str(tmp_path / 'loop.mem'), LOOP)
+    result = subprocess.run([sys.executable, os.path.join(SRC_DIR, 'main.py'), image, 'release', 'fwd',
+                             '--bp=2bit', f'--bp-size={size}', '--no-cache'], capture_output=True, text=True)
+    assert result.returncode == 1
+    assert result.stdout == 'Option --bp-size needs at least one table entry\n'
+
+# STW, BZ, BEQ, JR and HALT do not write rt, a later reader of the register
+# does not depend on them. Before, NO-FWD stalled for these false hazards and
+# FWD forwarded the empty ALU output of the store or branch
+# (clk, stall_count, load_use_stall_count, num_data_hazards, flush_count)
+FALSE_DEPENDENCIES = {
+    # Before: NO-FWD 16 clocks, 6 stalls, 3 hazards. FWD R3 = 0
+    'store': (['ADDI R1, R0, 5', 'STW R1, R0, 1000', 'ADD R3, R1, R1', 'BZ R3, 1', 'ADDI R4, R0, 1', 'HALT'],
+              {'no-fwd': (14, 4, 0, 2, 0), 'fwd': (10, 0, 0, 0, 0)}, {3: 10, 4: 1}),
+    # Before: NO-FWD 13 clocks, 2 stalls, 1 hazard. FWD R3 = 7
+    'branch': (['ADDI R2, R0, 7', 'ADDI R1, R0, 1', 'ADDI R5, R0, 1', 'ADDI R6, R0, 1', 'BEQ R1, R2, 2',
+                'ADD R3, R2, R2', 'HALT'],
+               {'no-fwd': (11, 0, 0, 0, 0), 'fwd': (11, 0, 0, 0, 0)}, {3: 14}),
+}
+
+@pytest.mark.parametrize('case', FALSE_DEPENDENCIES)
+@pytest.mark.parametrize('mode', PIPELINED)
+def test_no_false_dependencies(case, mode, tmp_path):
+    program, expected_timing, regs = FALSE_DEPENDENCIES[case]
+    sim = run(make_sim(mode, write_program(str(tmp_path / 'prog.mem'), program)))
+    assert timing(sim) == expected_timing[mode]
+    assert {reg: int(sim.R[reg]) for reg in regs} == regs
+
+# The ADD decodes in the cycle the first ADDI writes back, ID runs before WB
+# so WB has to refresh the operand read. Before, R3 was 0
+@pytest.mark.parametrize('mode', PIPELINED)
+def test_operand_written_back_while_decoding(mode, tmp_path):
+    image = write_program(str(tmp_path / 'prog.mem'), ['ADDI R2, R0, 10', 'ADDI R5, R0, 1', 'ADDI R6, R0, 1',
+                                                       'ADD R3, R2, R0', 'HALT'])
+    sim = run(make_sim(mode, image))
+    assert sim.R[3] == 10
+    assert timing(sim) == (9, 0, 0, 0, 0)
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+
+"""
+test_cache.py: The cache timing model and its options
+"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from simtest import IMAGES, PIPELINED, SRC_DIR, arch_state, make_sim, name, run, write_program
+
+import cache
+import config
+import sweep
+
+# Caches change the timing, never the result
+@pytest.mark.parametrize('image', IMAGES, ids=name)
+@pytest.mark.parametrize('mode', PIPELINED)
+@pytest.mark.parametrize('model', ['icache', 'dcache'])
+def test_caches(image, mode, model):
+    geometry = config.ICACHE if model == 'icache' else config.DCACHE
+    model_cache = cache.Cache(model.upper(), geometry['size'], geometry['assoc'], geometry['line_size'],
+                              geometry['miss_penalty'])
+    sim = run(make_sim(mode, image, **{model: model_cache}))
+    plain = run(make_sim(mode, image))
+    assert arch_state(sim) == arch_state(plain)
+    assert sim.clk == plain.clk + sim.cache_stall_count
+
+# 2 sets of 2 ways with 16 byte lines: 0, 32 and 64 all map to set 0
+def test_lru():
+    model = cache.Cache('D', 64, 2, 16, 10)
+    assert [model.access(addr) for addr in [0, 4, 32, 0, 64, 0, 32]] == [10, 0, 10, 0, 10, 0, 10]
+    assert (model.hits, model.misses) == (3, 4)
+    # Set 1 is still empty
+    assert model.access(16) == 10
+
+@pytest.mark.parametrize('geometry', [(100, 2, 16, 10), (256, 3, 16, 10), (256, 2, 12, 10), (64, 8, 16, 10),
+                                      (256, 2, 16, -1)])
+def test_bad_geometry(geometry):
+    assert cache.geometry_error(*geometry) is not None
+    with pytest.raises(AssertionError):
+        cache.Cache('D', *geometry)
+    with pytest.raises(ValueError):
+        sweep.parse_cache_spec(':'.join(str(val) for val in geometry), config.DCACHE)
+
+@pytest.mark.parametrize('option', ['--icache=100', '--dcache=64,8,16', '--dcache=256,2,16,10,1', '--dcache=x'])
+def test_bad_option(option, tmp_path):
+    image = write_program(str(tmp_path / 'halt.mem'), ['HALT'])
+    result = subprocess.run([sys.executable, os.path.join(SRC_DIR, 'main.py'), image, 'release', 'fwd', option,
+                             '--no-cache'], capture_output=True, text=True)
+    assert result.returncode == 1
+    assert result.stdout.startswith('Option ' + option.partition('=')[0])
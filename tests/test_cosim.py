@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+
+"""
+test_cosim.py: Co-simulation of the pipelined and functional simulators
+"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from simtest import IMAGES, PIPELINED, SRC_DIR, name, write_program
+
+import config
+import cosim
+
+@pytest.mark.parametrize('image', IMAGES, ids=name)
+@pytest.mark.parametrize('mode', PIPELINED)
+def test_images_match(image, mode):
+    assert cosim.cosim(mode, image) is None
+
+# The second STW overwrites the word in MEM while the first one retires from
+# WB. Reading memory at retire used to report "Addr 1000: pipeline 7, functional 5"
+@pytest.mark.parametrize('mode', PIPELINED)
+def test_back_to_back_stores(mode, tmp_path):
+    image = write_program(str(tmp_path / 'stores.mem'), ['ADDI R1, R0, 5', 'ADDI R2, R0, 7', 'ADDI R3, R0, 1',
+                                                         'ADDI R4, R0, 1', 'STW R1, R0, 1000', 'STW R2, R0, 1000',
+                                                         'HALT'])
+    assert cosim.cosim(mode, image) is None
+
+# A pipeline that forwards a load before the data exists uses the old R1, the
+# checker stops at the first instruction that does
+@pytest.mark.parametrize('consumer, problem', [('ADD R2, R1, R1', 'R2: pipeline 0, functional 42'),
+                                               ('STW R1, R0, 1004', 'Addr 1004: pipeline 0, functional 21')])
+def test_detects_divergence(consumer, problem, tmp_path, monkeypatch):
+    monkeypatch.setitem(config.PIPELINES, 'early-load',
+                        {'forwarding': ['EX', 'MEM'], 'load_use_latency': 0, 'store_forwarding': False})
+    image = write_program(str(tmp_path / 'load.mem'), ['LDW R1, R0, 1000', consumer, 'HALT'], {1000: [21]})
+    report = cosim.cosim('early-load', image)
+    assert report is not None
+    lines = report.splitlines()
+    assert lines[0] == 'Divergence in early-load mode at clock 5, retired instruction 2'
+    assert lines[1].startswith('Instruction: PC 4: ')
+    assert lines[2] == '  ' + problem
+
+def test_tool(tmp_path):
+    image = write_program(str(tmp_path / 'halt.mem'), ['HALT'])
+    result = subprocess.run([sys.executable, os.path.join(SRC_DIR, 'cosim.py'), image], capture_output=True,
+                            text=True)
+    assert result.returncode == 0
+    assert result.stdout.splitlines() == [f'PASS {mode} {image}' for mode in PIPELINED]
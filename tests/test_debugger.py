@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+
+"""
+test_debugger.py: Breakpoints and watchpoints
+"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from simtest import MODES, PIPELINED, SRC_DIR, arch_state, make_sim, run, timing, write_program
+
+import debugger
+
+# R2 = 3 * 5 in a counted loop, stored at 1000
+LOOP = [
+    'ADDI R1, R0, 3',
+    'ADDI R2, R2, 5',
+    'SUBI R1, R1, 1',
+    'BZ R1, 2',
+    'BEQ R0, R0, -3',
+    'STW R2, R0, 1000',
+    'HALT',
+]
+SUBI_PC = 8
+
+@pytest.fixture
+def loop_image(tmp_path):
+    return write_program(str(tmp_path / 'loop.mem'), LOOP)
+
+# Run to HALT, returns the stop reasons on the way
+def stops(dbg: debugger.Debugger) -> list:
+    reasons = []
+    while True:
+        reason = dbg.run()
+        if reason == ('halt',):
+            return reasons
+        reasons.append(reason)
+
+# Stopping does not change the run
+@pytest.mark.parametrize('mode', MODES)
+def test_breakpoint(mode, loop_image):
+    sim = make_sim(mode, loop_image)
+    dbg = debugger.Debugger(sim)
+    dbg.add_breakpoint(SUBI_PC)
+    assert stops(dbg) == [('breakpoint', SUBI_PC)] * 3
+    assert dbg.run() == ('halt',)
+    plain = run(make_sim(mode, loop_image))
+    assert arch_state(sim) == arch_state(plain)
+    if mode != 'func':
+        assert timing(sim) == timing(plain)
+
+# FUNC stops before the instruction, the pipeline once it has executed
+@pytest.mark.parametrize('mode', MODES)
+def test_breakpoint_position(mode, loop_image):
+    sim = make_sim(mode, loop_image)
+    dbg = debugger.Debugger(sim)
+    dbg.add_breakpoint(SUBI_PC)
+    dbg.run()
+    assert sim.instr_count == (2 if mode == 'func' else 3)
+
+@pytest.mark.parametrize('mode', MODES)
+def test_instr_breakpoint(mode, loop_image):
+    sim = make_sim(mode, loop_image)
+    dbg = debugger.Debugger(sim)
+    dbg.add_instr_breakpoint(5)
+    assert dbg.run() == ('instructions', 5)
+    assert dbg.run() == ('halt',)
+
+# Cycle breakpoints stop on the cycle even inside a skipped stall
+@pytest.mark.parametrize('mode', PIPELINED)
+@pytest.mark.parametrize('cycle', range(1, 12))
+def test_cycle_breakpoint(mode, cycle, loop_image):
+    sim = make_sim(mode, loop_image, event_skip=True)
+    dbg = debugger.Debugger(sim)
+    dbg.add_cycle_breakpoint(cycle)
+    assert dbg.run() == ('cycle', cycle)
+    assert sim.event_skip == True
+    assert dbg.run() == ('halt',)
+    assert timing(sim) == timing(run(make_sim(mode, loop_image)))
+
+def test_cycle_breakpoint_func(loop_image):
+    with pytest.raises(AssertionError):
+        debugger.Debugger(make_sim('func', loop_image)).add_cycle_breakpoint(1)
+
+@pytest.mark.parametrize('mode', MODES)
+def test_watch_register(mode, loop_image):
+    dbg = debugger.Debugger(make_sim(mode, loop_image))
+    dbg.watch_register(2)
+    assert stops(dbg) == [('register', 2, 0, 5), ('register', 2, 5, 10), ('register', 2, 10, 15)]
+
+@pytest.mark.parametrize('mode', MODES)
+def test_watch_memory(mode, loop_image):
+    sim = make_sim(mode, loop_image)
+    dbg = debugger.Debugger(sim)
+    dbg.watch_memory(1000)
+    dbg.watch_memory(1004)
+    assert stops(dbg) == [('memory', 1000, 0, 15)]
+
+# Without anything set, or once cleared, memory writes go through the plain write_n
+@pytest.mark.parametrize('mode', MODES)
+def test_clear(mode, loop_image):
+    sim = make_sim(mode, loop_image)
+    dbg = debugger.Debugger(sim)
+    assert dbg.checks() == []
+    dbg.watch_memory(1000)
+    dbg.watch_register(1)
+    dbg.add_breakpoint(0)
+    assert 'write_n' in sim.mem.__dict__
+    dbg.clear()
+    assert 'write_n' not in sim.mem.__dict__
+    assert dbg.checks() == []
+    assert dbg.run() == ('halt',)
+
+@pytest.mark.parametrize('mode', MODES)
+def test_max_steps(mode, loop_image):
+    sim = make_sim(mode, loop_image)
+    dbg = debugger.Debugger(sim)
+    assert dbg.run(4) is None
+    dbg.watch_register(31)
+    assert dbg.run(4) is None
+    assert dbg.run() == ('halt',)
+
+def test_options(loop_image):
+    result = subprocess.run([sys.executable, os.path.join(SRC_DIR, 'main.py'), loop_image, 'release', 'fwd',
+                             f'--break-pc={SUBI_PC}', '--watch-mem=1000', '--no-cache'],
+                            capture_output=True, text=True, check=True)
+    lines = result.stdout.splitlines()
+    assert [line.partition(' (')[0] for line in lines[:4]] == [f'Breakpoint at PC {SUBI_PC}'] * 3 + \
+        ['Watchpoint: Addr 1000 changed from 0 to 15']
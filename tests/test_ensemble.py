@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+"""
+test_ensemble.py: Many images in lockstep against one functional run each
+"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from simtest import IMAGES, MAX_STEPS, SRC_DIR, make_sim, run, write_program
+
+import ensemble
+
+# R2 = 3 * the count loaded from 2000, stored at 1000
+COUNTED = [
+    'LDW R1, R0, 2000',
+    'ADDI R2, R2, 3',
+    'SUBI R1, R1, 1',
+    'BZ R1, 2',
+    'BEQ R0, R0, -3',
+    'STW R2, R0, 1000',
+    'HALT',
+]
+
+# Each lane has the registers, memory and counts of its own functional run
+def check_lanes(lanes, images: list) -> None:
+    assert lanes.halted.all()
+    for lane, image in enumerate(images):
+        sim = run(make_sim('func', image))
+        assert [int(val) for val in lanes.R[lane]] == [int(val) for val in sim.R]
+        assert bytes(lanes.mem[lane]) == bytes(sim.mem.mem)
+        assert [int(reg) for reg in lanes.modified_regs[lane].nonzero()[0]] == sorted(sim.modified_regs)
+        assert [int(addr) for addr in lanes.modified_addrs[lane].nonzero()[0]] == \
+            sorted(int(addr) for addr in sim.modified_addrs)
+        assert (lanes.instr_count[lane], lanes.arithmetic_instr_count[lane], lanes.logical_instr_count[lane],
+                lanes.mem_instr_count[lane], lanes.cntrl_instr_count[lane]) == \
+            (sim.instr_count, sim.arithmetic_instr_count, sim.logical_instr_count, sim.mem_instr_count,
+             sim.cntrl_instr_count)
+
+def test_images():
+    lanes = ensemble.MIPS_lite_ensemble(IMAGES)
+    lanes.run(MAX_STEPS)
+    check_lanes(lanes, IMAGES)
+
+# Lanes leave the loop at different iterations and meet again at the STW
+def test_split_and_join(tmp_path):
+    counts = [3, 5, 7]
+    images = [write_program(str(tmp_path / f'count_{count}.mem'), COUNTED, {2000: [count]}) for count in counts]
+    lanes = ensemble.MIPS_lite_ensemble(images)
+    assert lanes.run(MAX_STEPS)
+    check_lanes(lanes, images)
+    assert [int(val) for val in lanes.R[:, 2]] == [3 * count for count in counts]
+    # The longest lane sets the number of group steps, STW and HALT run once for all
+    assert lanes.steps == run(make_sim('func', images[-1])).instr_count
+
+# Lanes with different code at the same PC take turns
+def test_different_code(tmp_path):
+    images = [write_program(str(tmp_path / 'add.mem'), ['ADDI R1, R0, 5', 'HALT']),
+              write_program(str(tmp_path / 'or.mem'), ['ORI R1, R0, 6', 'HALT'])]
+    lanes = ensemble.MIPS_lite_ensemble(images)
+    assert lanes.run(MAX_STEPS)
+    check_lanes(lanes, images)
+    assert lanes.steps == 3
+
+# A loaded value wraps at 32 bits, a computed one keeps growing. The
+# functional simulator warns about the numpy.int32 overflow
+@pytest.mark.filterwarnings('ignore:overflow encountered')
+def test_loaded_values_wrap(tmp_path):
+    image = write_program(str(tmp_path / 'wrap.mem'),
+                          ['LDW R1, R0, 2000', 'ADDI R1, R1, 1', 'ADDI R2, R0, 32767', 'MULI R2, R2, 32767',
+                           'MULI R2, R2, 32767', 'HALT'], {2000: [0x7FFFFFFF]})
+    lanes = ensemble.MIPS_lite_ensemble([image])
+    assert lanes.run(MAX_STEPS)
+    check_lanes(lanes, [image])
+    assert lanes.R[0, 1] == -(1 << 31)
+    assert lanes.R[0, 2] == 32767 ** 3
+
+def test_max_steps(tmp_path):
+    image = write_program(str(tmp_path / 'count.mem'), COUNTED, {2000: [10]})
+    lanes = ensemble.MIPS_lite_ensemble([image])
+    assert not lanes.run(5)
+    assert lanes.steps == 5 and not lanes.halted[0]
+    assert lanes.run()
+
+def test_tool(tmp_path):
+    images = [write_program(str(tmp_path / f'count_{count}.mem'), COUNTED, {2000: [count]}) for count in [2, 4]]
+    output = subprocess.run([sys.executable, os.path.join(SRC_DIR, 'ensemble.py')] + images, capture_output=True,
+                            text=True, check=True).stdout
+    assert output.startswith('Ensemble: 2 lanes')
+    assert 'R2: 6\n' in output and 'R2: 12\n' in output
+    assert output.count('Addr: 1000, Data: ') == 2
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+
+"""
+test_event_skip.py: Skipping stall and drain cycles against the cycle by cycle
+pipeline
+"""
+
+import pytest
+
+from simtest import IMAGES, PIPELINED, arch_state, make_sim, name, run, timing, write_program
+
+@pytest.mark.parametrize('image', IMAGES, ids=name)
+@pytest.mark.parametrize('mode', PIPELINED)
+def test_event_skip(image, mode):
+    plain = run(make_sim(mode, image, event_skip=False))
+    skipped = run(make_sim(mode, image, event_skip=True))
+    assert arch_state(skipped) == arch_state(plain)
+    assert timing(skipped) == timing(plain)
+
+# A taken branch in EX can flush ID while a data stall still counts down, the
+# stall then ends with ID empty. Set that state up in the same cycle of both
+# runs, dropping ADDI R2 from ID
+@pytest.mark.parametrize('mode', PIPELINED)
+def test_stall_with_empty_id(mode, tmp_path):
+    image = write_program(str(tmp_path / 'adds.mem'), ['ADDI R1, R0, 1', 'ADDI R2, R0, 2', 'ADDI R3, R0, 3',
+                                                       'ADD R4, R1, R2', 'HALT'])
+    sims = []
+    for event_skip in [False, True]:
+        sim = make_sim(mode, image, event_skip=event_skip)
+        for _ in range(3):
+            sim.do_cpu_things()
+        sim.pipeline[1] = None
+        sim.data_hazard = True
+        sim.num_clocks_to_stall = 2
+        sims.append(run(sim))
+    assert arch_state(sims[1]) == arch_state(sims[0])
+    assert timing(sims[1]) == timing(sims[0])
+    assert sims[0].R[4] == 1
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+"""
+test_fuzz.py: The differential fuzzer and the programs it found
+"""
+
+import pytest
+
+from simtest import assemble_line
+
+import config
+import fuzz
+
+# Programs the fuzzer found and minimized, live instructions by address, the
+# rest are NOPs. The comments give the seed and what the pipeline did wrong
+MINIMIZED = {
+    # Seed 0: STW of a negative value raised OverflowError in every mode
+    'negative_store': {12: 'ADDI R11, R0, -45', 100: 'ADDI R10, R11, 7', 156: 'STW R10, R1, 0x6c', 348: 'HALT'},
+    # Seed 8: FWD stored the value of R9 latched in ID, before the ANDI
+    'store_data': {28: 'ADDI R10, R0, 0x1a', 76: 'ANDI R9, R10, 0x7fff', 80: 'STW R9, R1, 0x28', 432: 'HALT'},
+    # Seed 24: the same through a load, FWD ended with R11 = 206 instead of 0
+    'store_then_load': {60: 'ORI R9, R0, 0xce', 72: 'ANDI R9, R11, 0x7fff', 80: 'STW R9, R1, 0x68',
+                        84: 'LDW R11, R1, 0x68', 108: 'HALT'},
+    # Seed 8: FWD jumped to the old R3 = 0 and ran the program twice
+    'jump_target': {188: 'SUBI R2, R2, 1', 360: 'ADDI R3, R0, 0x1b0', 364: 'JR R3', 432: 'HALT'},
+}
+
+def words_of(program: dict) -> list:
+    words = [fuzz.NOP] * (max(program) // 4 + 1)
+    for addr, line in program.items():
+        words[addr // 4] = assemble_line(line)
+    return words
+
+@pytest.mark.parametrize('program', MINIMIZED)
+def test_minimized(program, tmp_path):
+    _, problems = fuzz.run_program(words_of(MINIMIZED[program]), [0] * fuzz.DATA_WORDS, str(tmp_path))
+    assert problems == []
+
+# Only found by hand: with rs == rt the forward to B was skipped
+def test_same_source_twice(tmp_path):
+    words = [assemble_line(line) for line in ['ADDI R4, R0, 3', 'ADD R5, R4, R4', 'HALT']]
+    results, problems = fuzz.run_program(words, [0] * fuzz.DATA_WORDS, str(tmp_path))
+    assert problems == []
+    assert results['fwd']['R'][5] == 6
+
+@pytest.mark.parametrize('seed', range(10))
+def test_generated(seed, tmp_path):
+    words, data = fuzz.ProgramGenerator(seed).generate()
+    assert fuzz.ProgramGenerator(seed).generate() == (words, data)
+    _, problems = fuzz.run_program(words, data, str(tmp_path))
+    assert problems == []
+
+# With loads forwarded a cycle early the minimizer keeps only the load and its
+# consumer
+def test_minimize(tmp_path, monkeypatch):
+    monkeypatch.setitem(config.PIPELINES, 'fwd', dict(config.PIPELINES['fwd'], load_use_latency=0))
+    lines = [f'ADDI R{4 + index % 4}, R0, {index}' for index in range(12)] + \
+            [f'LDW R8, R0, {fuzz.DATA_BASE}', 'ADD R10, R8, R8', 'HALT']
+    words = [assemble_line(line) for line in lines]
+    data = [21] + [0] * (fuzz.DATA_WORDS - 1)
+    _, problems = fuzz.run_program(words, data, str(tmp_path))
+    assert ('fwd:reg', 'fwd R10 = 0, func 42') in problems
+
+    minimized = fuzz.minimize(words, data, problems[0][0], str(tmp_path), fuzz.MAX_INSTRS)
+    live = [index for index, word in enumerate(minimized) if word != fuzz.NOP]
+    assert live == [12, 13, 14]
+    assert fuzz.run_program(minimized, data, str(tmp_path))[1][0][0] == problems[0][0]
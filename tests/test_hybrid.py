@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+"""
+test_hybrid.py: Fast-forward mode, switching between the functional and the
+pipelined simulator
+"""
+
+import pytest
+
+from simtest import IMAGES, PIPELINED, arch_state, make_sim, name, run, timing, write_program
+
+import hybrid
+
+# R2 = 3 * 5 in a counted loop, stored at 1000
+LOOP = [
+    'ADDI R1, R0, 3',
+    'ADDI R2, R2, 5',
+    'SUBI R1, R1, 1',
+    'BZ R1, 2',
+    'BEQ R0, R0, -3',
+    'STW R2, R0, 1000',
+    'HALT',
+]
+STW_PC = 20
+
+@pytest.fixture
+def loop_image(tmp_path):
+    return write_program(str(tmp_path / 'loop.mem'), LOOP)
+
+# Without a start condition the whole run is the detailed window
+@pytest.mark.parametrize('image', IMAGES, ids=name)
+@pytest.mark.parametrize('mode', PIPELINED)
+def test_detailed_from_the_start(image, mode):
+    sim = run(hybrid.MIPS_lite_hybrid(mode, image))
+    plain = run(make_sim(mode, image))
+    assert arch_state(sim) == arch_state(plain)
+    assert timing(sim.pipe) == timing(plain)
+    assert sim.window_instr_count == plain.instr_count
+
+# Instructions 10 to 30 run on the pipeline, the result is that of FUNC
+@pytest.mark.parametrize('image', IMAGES, ids=name)
+@pytest.mark.parametrize('mode', PIPELINED)
+def test_instruction_window(image, mode):
+    sim = run(hybrid.MIPS_lite_hybrid(mode, image, start_count=10, stop_count=30))
+    assert sim.window_done and not sim.detailed
+    assert sim.window_instr_count == 20
+    assert arch_state(sim) == arch_state(run(make_sim('func', image)))
+    assert 0 < sim.clk < run(make_sim(mode, image)).clk
+
+@pytest.mark.parametrize('mode', PIPELINED)
+def test_start_pc(mode, loop_image):
+    sim = hybrid.MIPS_lite_hybrid(mode, loop_image, start_pc=STW_PC)
+    while not sim.detailed:
+        assert sim.do_cpu_things() == False
+    assert sim.func.pc == STW_PC
+    assert sim.func.instr_count == 1 + 3 * 4 - 1
+    run(sim)
+    assert sim.window_instr_count == 2
+    assert sim.R[2] == 15
+    assert sim.mem.read_n(1000, 4) == (15).to_bytes(4, 'big')
+
+# Back to FUNC once the first SUBI has executed, after the instructions in flight
+@pytest.mark.parametrize('mode', PIPELINED)
+def test_stop_pc(mode, loop_image):
+    sim = hybrid.MIPS_lite_hybrid(mode, loop_image, stop_pc=8)
+    while sim.detailed:
+        assert sim.do_cpu_things() == False
+    assert sim.window_done
+    assert sim.window_instr_count == 3
+    run(sim)
+    assert arch_state(sim) == arch_state(run(make_sim('func', loop_image)))
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+"""
+test_longrun.py: Long-run mode, its checkpoints, statistics and post-mortem
+"""
+
+import json
+import pickle
+
+import pytest
+
+from simtest import IMAGES, MODES, arch_state, make_sim, name, run, timing, write_program
+
+import config
+import cpu
+import longrun
+import result_cache
+
+# R2 = 5 * 20 in a counted loop, stored at 1000
+LOOP = ['ADDI R1, R0, 20', 'ADDI R2, R2, 5', 'SUBI R1, R1, 1', 'BZ R1, 2', 'BEQ R0, R0, -3', 'STW R2, R0, 1000',
+        'HALT']
+
+# Stop after the first chunk, as a signal would
+def interrupted_run(mode: str, image: str, checkpoint_fname: str) -> None:
+    first = longrun.LongRun(make_sim(mode, image), mode, image, checkpoint_fname)
+    first.interrupted = True
+    assert first.run() == 'interrupted'
+
+@pytest.mark.parametrize('image', IMAGES, ids=name)
+@pytest.mark.parametrize('mode', MODES)
+def test_checkpoint_resume(image, mode, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'LONGRUN_CHUNK', 5)
+    checkpoint_fname = str(tmp_path / 'run.ckpt')
+    interrupted_run(mode, image, checkpoint_fname)
+
+    checkpoint = longrun.load_checkpoint(checkpoint_fname)
+    assert checkpoint['mode'] == mode and checkpoint['steps'] == 5
+    resumed = longrun.LongRun(checkpoint['sim'], mode, image, checkpoint_fname, checkpoint=checkpoint)
+    assert resumed.run() == 'halt'
+
+    plain = run(make_sim(mode, image))
+    assert arch_state(resumed.sim) == arch_state(plain)
+    if mode != 'func':
+        assert timing(resumed.sim) == timing(plain)
+
+# A checkpoint from other simulator sources is refused before its state is
+# unpickled
+def test_other_sources(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'LONGRUN_CHUNK', 5)
+    image = write_program(str(tmp_path / 'loop.mem'), LOOP)
+    checkpoint_fname = str(tmp_path / 'run.ckpt')
+    interrupted_run('fwd', image, checkpoint_fname)
+
+    # Sources where the simulator class is gone
+    monkeypatch.setattr(result_cache, '_sources_digest', 'edited')
+    monkeypatch.delattr(cpu, 'MIPS_lite')
+    with pytest.raises(ValueError, match='different simulator version'):
+        longrun.load_checkpoint(checkpoint_fname)
+
+def test_old_format(tmp_path):
+    checkpoint_fname = str(tmp_path / 'run.ckpt')
+    with open(checkpoint_fname, 'wb') as f:
+        pickle.dump({'version': 1, 'sim_version': '1', 'mode': 'func'}, f)
+    with pytest.raises(ValueError):
+        longrun.load_checkpoint(checkpoint_fname)
+
+def test_address_bitmap():
+    addrs = longrun.AddressBitmap(64, [12, 4])
+    addrs.append(12)
+    addrs.append(40)
+    assert list(addrs) == [4, 12, 40] and len(addrs) == 3
+    assert 12 in addrs and 8 not in addrs
+
+@pytest.mark.parametrize('mode', MODES)
+def test_stats(mode, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'LONGRUN_CHUNK', 5)
+    image = write_program(str(tmp_path / 'loop.mem'), LOOP)
+    stats_fname = str(tmp_path / 'stats.jsonl')
+    long_run = longrun.LongRun(make_sim(mode, image), mode, image, str(tmp_path / 'run.ckpt'),
+                               stats_fname=stats_fname, stats_every=10)
+    assert long_run.run() == 'halt'
+    assert long_run.sim.R[2] == 100
+    assert list(long_run.sim.modified_addrs) == [1000]
+
+    with open(stats_fname) as f:
+        lines = [json.loads(line) for line in f]
+    # One line every 10 steps and one at the end
+    steps = [line['steps'] for line in lines]
+    assert steps == list(range(10, long_run.steps, 10)) + [long_run.steps]
+    assert lines[-1]['instrs'] == long_run.sim.instr_count
+    if mode != 'func':
+        assert lines[-1]['clk'] == long_run.sim.clk
+
+# The last instructions are kept for the report of a failed run
+@pytest.mark.parametrize('mode', MODES)
+def test_post_mortem(mode, tmp_path):
+    image = write_program(str(tmp_path / 'bad.mem'), [f'ADDI R{reg}, R0, {reg}' for reg in range(1, 7)],
+                          {24: [0xFFFFFFFF]})
+    long_run = longrun.LongRun(make_sim(mode, image), mode, image, str(tmp_path / 'run.ckpt'), history=2)
+    assert long_run.run() == 'failed'
+    report = long_run.post_mortem().splitlines()
+    if mode == 'func':
+        assert report[1:] == ['20: 04060006  ADDI R6, R0, 0x6', '24: ffffffff  invalid opcode']
+    else:
+        assert report[1:] == ['4: 04020002  ADDI R2, R0, 0x2', '8: 04030003  ADDI R3, R0, 0x3',
+                              'Pipeline PCs (IF ID EX MEM WB): 28 24 20 16 12']
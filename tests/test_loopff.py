@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+"""
+test_loopff.py: Loop fast-forward in the functional simulator
+"""
+
+import pytest
+
+from simtest import IMAGES, arch_state, assemble_line, make_sim, name, run, write_program
+
+import config
+import loopff
+
+# Run with loop fast-forward, returns the simulator and its LoopFastForward
+def run_ff(image: str) -> tuple:
+    sim = make_sim('func', image)
+    loop_ff = loopff.LoopFastForward(sim)
+    return run(sim), loop_ff
+
+@pytest.mark.parametrize('image', IMAGES, ids=name)
+def test_images(image):
+    sim, _ = run_ff(image)
+    assert arch_state(sim) == arch_state(run(make_sim('func', image)))
+
+# Loops the body analysis accepts: counted down, counted up to a bound with
+# BEQ, and one whose exit is a multiple of the step
+@pytest.mark.parametrize('program', [
+    ['ADDI R1, R0, 1000', 'ADDI R2, R2, 3', 'ADD R3, R3, R2', 'SUBI R1, R1, 1', 'BZ R1, 2', 'BEQ R0, R0, -4',
+     'STW R3, R0, 2000', 'HALT'],
+    ['ADDI R5, R0, 600', 'ADDI R1, R1, 2', 'MULI R2, R1, 3', 'BEQ R1, R5, 2', 'BEQ R0, R0, -3', 'HALT'],
+    ['ADDI R1, R0, 900', 'ADDI R4, R0, 8', 'SUBI R1, R1, 3', 'ADD R2, R2, R1', 'BZ R1, 2', 'JR R4', 'HALT'],
+], ids=['bz', 'beq', 'jr'])
+def test_skipped(program, tmp_path):
+    image = write_program(str(tmp_path / 'loop.mem'), program)
+    sim, loop_ff = run_ff(image)
+    plain = run(make_sim('func', image))
+    assert arch_state(sim) == arch_state(plain)
+    assert loop_ff.loops_skipped == 1
+    # Iterations up to the threshold and the last one are interpreted
+    assert sim.instr_count - loop_ff.instrs_skipped < (config.LOOP_FF_THRESHOLD + 2) * len(program)
+
+# Loops the analysis has to leave alone
+@pytest.mark.parametrize('program', [
+    ['ADDI R1, R0, 50', 'STW R1, R0, 2000', 'SUBI R1, R1, 1', 'BZ R1, 2', 'BEQ R0, R0, -3', 'HALT'],
+    ['ADDI R1, R0, 50', 'ANDI R2, R1, 1', 'SUBI R1, R1, 1', 'BZ R1, 2', 'BEQ R0, R0, -3', 'HALT'],
+    ['ADDI R1, R0, 50', 'SUBI R1, R1, 1', 'BZ R2, 2', 'ADDI R3, R3, 1', 'BZ R1, 2', 'BEQ R0, R0, -4', 'HALT'],
+    ['LDW R1, R0, 2000', 'SUBI R1, R1, 1', 'BZ R1, 2', 'BEQ R0, R0, -2', 'HALT'],
+], ids=['store', 'andi', 'inner-branch', 'loaded'])
+def test_interpreted(program, tmp_path):
+    image = write_program(str(tmp_path / 'loop.mem'), program, {2000: [50]})
+    sim, loop_ff = run_ff(image)
+    assert arch_state(sim) == arch_state(run(make_sim('func', image)))
+    assert loop_ff.loops_skipped == 0
+
+# The first pass of the inner loop adds 1 to R2 twenty times, then the
+# program overwrites that ADDI to add 7 and runs the loop again. The plan of
+# the first pass must not be used for the second
+SELF_MODIFYING = [
+    'ADDI R1, R0, 20',
+    'ADDI R2, R2, 1',
+    'SUBI R1, R1, 1',
+    'BZ R1, 2',
+    'BEQ R0, R0, -3',
+    'BZ R6, 2',
+    'HALT',
+    'LDW R5, R0, 2000',
+    'STW R5, R0, 4',
+    'ADDI R6, R0, 1',
+    'BEQ R0, R0, -10',
+]
+
+def test_overwritten_loop(tmp_path):
+    image = write_program(str(tmp_path / 'selfmod.mem'), SELF_MODIFYING, {2000: [assemble_line('ADDI R2, R2, 7')]})
+    sim, loop_ff = run_ff(image)
+    assert sim.R[2] == 20 + 20 * 7
+    assert loop_ff.loops_skipped == 2
+    assert arch_state(sim) == arch_state(run(make_sim('func', image)))
+
+# Nothing is skipped before the back edge has been taken threshold times
+@pytest.mark.parametrize('threshold', [3, 10])
+def test_threshold(threshold, tmp_path):
+    image = write_program(str(tmp_path / 'loop.mem'),
+                          ['ADDI R1, R0, 10', 'ADDI R2, R2, 5', 'SUBI R1, R1, 1', 'BZ R1, 2', 'BEQ R0, R0, -3',
+                           'HALT'])
+    sim = make_sim('func', image)
+    loop_ff = loopff.LoopFastForward(sim, threshold)
+    run(sim)
+    assert sim.R[2] == 50
+    # 9 back edges: skipping after the third leaves the tenth iteration only
+    assert loop_ff.iterations_skipped == (6 if threshold == 3 else 0)
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+
+"""
+test_memory.py: Memory bounds
+"""
+
+import pytest
+
+from simtest import MODES, make_sim, run, write_program
+
+import config
+import memory
+
+def test_bounds():
+    mem = memory.Memory(16)
+    mem.write_n(12, bytearray([1, 2, 3, 4]))
+    assert mem.read_n(12, 4) == bytearray([1, 2, 3, 4])
+    assert mem.read_n(0, 16) == bytearray(12) + bytearray([1, 2, 3, 4])
+    with pytest.raises(AssertionError):
+        mem.read_n(13, 4)
+    with pytest.raises(AssertionError):
+        mem.write_n(13, bytearray(4))
+
+# The last word of memory can be stored and loaded
+@pytest.mark.parametrize('mode', MODES)
+def test_last_word(mode, tmp_path):
+    last = config.MEM_SIZE - 4
+    image = write_program(str(tmp_path / 'last.mem'), ['ADDI R1, R0, 7', f'STW R1, R0, {last}',
+                                                       f'LDW R2, R0, {last}', 'HALT'])
+    sim = run(make_sim(mode, image))
+    assert sim.R[2] == 7
+    assert sim.mem.read_n(last, 4) == (7).to_bytes(4, 'big')
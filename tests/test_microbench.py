@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+"""
+test_microbench.py: Regression gating of the microbenchmarks
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from simtest import SRC_DIR
+
+import microbench
+
+BASE = [1.00, 1.01, 0.99, 1.02, 0.98, 1.00, 1.01, 0.99, 1.00, 1.01]
+
+def scaled(samples: list, factor: float) -> list:
+    return [factor * val for val in samples]
+
+def test_p_value():
+    assert microbench.slower_p_value(BASE, scaled(BASE, 1.5)) < microbench.ALPHA
+    assert microbench.slower_p_value(BASE, scaled(BASE, 0.7)) > 0.99
+    assert 0.4 < microbench.slower_p_value(BASE, BASE) < 0.6
+    # All samples tied, nothing to tell apart
+    assert microbench.slower_p_value([1.0] * 5, [1.0] * 5) == 1.0
+
+# One status per benchmark: name -> status in the report
+def statuses(lines: list) -> dict:
+    return {line.split()[0]: line.split()[-1] for line in lines[2:]}
+
+def test_compare():
+    baseline = {'reference': BASE, 'slower': BASE, 'faster': BASE, 'same': BASE, 'noisy': BASE,
+                'small': BASE}
+    results = {'reference': BASE, 'slower': scaled(BASE, 1.5), 'faster': scaled(BASE, 0.5), 'same': BASE,
+               # Median 30% up, but half the samples are as fast as before
+               'noisy': [0.99, 1.3, 1.0, 1.3, 0.98, 1.3, 1.01, 1.3, 1.3, 1.3],
+               'small': scaled(BASE, 1.05), 'added': BASE}
+    lines, regressions = microbench.compare(baseline, results, microbench.THRESHOLD)
+    assert regressions == ['slower']
+    assert statuses(lines) == {'slower': 'REGRESSED', 'faster': 'faster', 'same': 'ok', 'noisy': 'ok',
+                               'small': 'ok', 'added': 'new'}
+    assert microbench.compare(baseline, results, 60)[1] == []
+
+# A host twice as slow as when the baseline was taken doubles the baseline
+def test_host_speed():
+    baseline = {'reference': BASE, 'bench': BASE}
+    lines, regressions = microbench.compare(baseline, {'reference': scaled(BASE, 2), 'bench': scaled(BASE, 2)},
+                                            microbench.THRESHOLD)
+    assert lines[0].startswith('Host speed factor: 2.00')
+    assert regressions == []
+    assert statuses(lines) == {'bench': 'ok'}
+    # Without a reference in the baseline the times are compared as they are
+    assert microbench.compare({'bench': BASE}, {'reference': BASE, 'bench': scaled(BASE, 2)},
+                              microbench.THRESHOLD)[1] == ['bench']
+
+def test_save_load(tmp_path):
+    fname = str(tmp_path / 'baseline.json')
+    microbench.save(fname, {'reference': BASE})
+    assert microbench.load(fname) == {'reference': BASE}
+    with open(fname, 'w') as f:
+        json.dump({'version': microbench.BASELINE_VERSION + 1, 'benchmarks': {}}, f)
+    with pytest.raises(SystemExit):
+        microbench.load(fname)
+
+def test_tool(tmp_path):
+    tool = os.path.join(SRC_DIR, 'microbench.py')
+    fname = str(tmp_path / 'baseline.json')
+    subprocess.run([sys.executable, tool, '--only=decode', f'--save={fname}'], capture_output=True, check=True)
+    with open(fname) as f:
+        baseline = json.load(f)
+    assert set(baseline['benchmarks']) == {'reference', 'decode'}
+
+    # A baseline that decodes ten times as fast makes this run a regression
+    baseline['benchmarks']['decode'] = scaled(baseline['benchmarks']['decode'], 0.1)
+    with open(fname, 'w') as f:
+        json.dump(baseline, f)
+    result = subprocess.run([sys.executable, tool, '--only=decode', f'--compare={fname}'], capture_output=True,
+                            text=True)
+    assert result.returncode == 1
+    assert 'REGRESSED' in result.stdout
+    assert result.stdout.splitlines()[-1].endswith(': decode')
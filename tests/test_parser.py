@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+
+"""
+test_parser.py: Dense and sparse memory images
+"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from simtest import IMAGES, SRC_DIR, arch_state, make_sim, name, run
+
+import config
+import memory
+import parser
+
+def load(fname: str) -> bytes:
+    mem = memory.Memory(config.MEM_SIZE)
+    parser.load_image(mem, fname)
+    return bytes(mem.mem)
+
+# Converting either way keeps the contents and the run
+@pytest.mark.parametrize('image', IMAGES, ids=name)
+def test_round_trip(image, tmp_path):
+    sparse = str(tmp_path / 'sparse.mem')
+    dense = str(tmp_path / 'dense.mem')
+    subprocess.run([sys.executable, os.path.join(SRC_DIR, 'parser.py'), image, sparse], check=True)
+    subprocess.run([sys.executable, os.path.join(SRC_DIR, 'parser.py'), sparse, dense, '--dense'], check=True)
+    assert load(sparse) == load(dense) == load(image)
+    assert parser.parser(dense) == load(image)
+    assert os.path.getsize(sparse) <= os.path.getsize(dense)
+    assert arch_state(run(make_sim('func', sparse))) == arch_state(run(make_sim('func', image)))
+
+def test_segments(tmp_path):
+    data = bytearray(64)
+    data[0:4] = b'\x01\x02\x03\x04'
+    data[8:12] = b'\x05\x06\x07\x08'
+    data[40:48] = b'\x09' * 8
+    fname = str(tmp_path / 'sparse.mem')
+    parser.write_sparse(fname, data)
+    with open(fname) as f:
+        # A single zero word is written, longer runs are skipped
+        assert f.read().split() == ['01020304', '00000000', '05060708', '@28', '09090909', '09090909']
+    assert list(parser.segments(fname)) == [(0, data[0:4]), (8, data[8:12]), (40, data[40:48])]
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+"""
+test_perfcounters.py: Windowed performance counters
+"""
+
+import csv
+import json
+
+import pytest
+
+from simtest import IMAGES, PIPELINED, make_sim, name, run
+
+import perfcounters
+
+# Windows have to close on their boundary even when a skip runs past it
+@pytest.mark.parametrize('image', IMAGES, ids=name)
+@pytest.mark.parametrize('mode', PIPELINED)
+def test_event_skip_windows(image, mode):
+    rows = []
+    for event_skip in [False, True]:
+        sim = make_sim(mode, image, event_skip=event_skip)
+        perf = perfcounters.PerfCounters(sim, window=7)
+        run(sim)
+        perf.finish()
+        rows.append(perf.rows())
+    assert rows[1] == rows[0]
+
+# The windows add up to the totals of the run, the arrays grow past capacity
+@pytest.mark.parametrize('image', IMAGES, ids=name)
+@pytest.mark.parametrize('mode', PIPELINED)
+def test_windows_add_up(image, mode):
+    sim = make_sim(mode, image)
+    perf = perfcounters.PerfCounters(sim, window=10, capacity=2)
+    run(sim)
+    perf.finish()
+    rows = perf.rows()
+    assert len(rows) == (sim.clk + 9) // 10
+    assert [row['clk'] for row in rows] == [min(10 * (n + 1), sim.clk) for n in range(len(rows))]
+
+    def total(column: str) -> int:
+        return sum(row[column] for row in rows)
+    assert total('cycles') == sim.clk
+    assert total('instrs') == sim.instr_count
+    assert total('stalls') == sim.stall_count
+    assert total('load_use_stalls') + total('alu_stalls') == sim.stall_count
+    assert total('data_hazards') == sim.num_data_hazards
+    assert total('flush_cycles') == sim.flush_count * sim.hazard.ex_stage
+    assert (total('fwd_ex'), total('fwd_mem')) == (sim.fwd_count[2], sim.fwd_count[1])
+
+    summary = perf.summary()
+    assert f'CPI: {sim.clk / sim.instr_count:.3f}' in summary
+    assert f'Issuing instructions: {sim.instr_count} ' in summary
+
+@pytest.mark.parametrize('fmt', ['csv', 'json'])
+def test_export(fmt, tmp_path):
+    image = IMAGES[0]
+    sim = make_sim('fwd', image)
+    perf = perfcounters.PerfCounters(sim, window=50)
+    run(sim)
+    perf.finish()
+    fname = str(tmp_path / f'perf.{fmt}')
+    perf.write(fname)
+    with open(fname) as f:
+        if fmt == 'json':
+            data = json.load(f)
+            assert (data['window'], data['mode']) == (50, 'fwd')
+            assert data['windows'] == perf.rows()
+        else:
+            rows = list(csv.DictReader(f))
+            assert [int(row['cycles']) for row in rows] == [row['cycles'] for row in perf.rows()]
+            assert list(rows[0]) == perfcounters.COLUMNS + ['cpi']
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+
+"""
+test_pipeline.py: The pipelined simulator and its hazard model
+"""
+
+import pytest
+
+from simtest import IMAGES, PIPELINED, arch_state, make_sim, name, run
+
+import config
+from hazard import HazardModel
+
+@pytest.mark.parametrize('image', IMAGES, ids=name)
+@pytest.mark.parametrize('mode', PIPELINED)
+def test_pipelined_matches_func(image, mode):
+    assert arch_state(run(make_sim(mode, image))) == arch_state(run(make_sim('func', image)))
+
+# table[is_load][stage] = (cycles to stall, forwarding path, store forwarding)
+def test_tables():
+    no_fwd = HazardModel(config.PIPELINES['no-fwd'])
+    assert no_fwd.producer_stages == [3, 2]
+    assert no_fwd.table[0][2:4] == [(2, 0, False), (1, 0, False)]
+    assert no_fwd.table[1][2:4] == [(2, 0, False), (1, 0, False)]
+
+    fwd = HazardModel(config.PIPELINES['fwd'])
+    assert fwd.table[0][2:4] == [(0, 2, False), (0, 1, False)]
+    assert fwd.table[1][2:4] == [(1, 0, True), (0, 1, False)]
+
+def test_unknown_forwarding_stage():
+    with pytest.raises(AssertionError):
+        HazardModel({'forwarding': ['WB'], 'load_use_latency': 1, 'store_forwarding': False})
+
+# A mode described only in config.py: forwarding from MEM only sits between
+# NO-FWD and FWD
+@pytest.mark.parametrize('image', IMAGES, ids=name)
+def test_described_mode(image, monkeypatch):
+    monkeypatch.setitem(config.PIPELINES, 'mem-fwd',
+                        {'forwarding': ['MEM'], 'load_use_latency': 1, 'store_forwarding': False})
+    sim = run(make_sim('mem-fwd', image))
+    assert arch_state(sim) == arch_state(run(make_sim('func', image)))
+    assert run(make_sim('fwd', image)).clk <= sim.clk <= run(make_sim('no-fwd', image)).clk
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+"""
+test_pipeview.py: Pipeline diagrams in text, HTML and Konata form
+"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from simtest import IMAGES, PIPELINED, SRC_DIR, make_sim, name, write_program
+
+import config
+import pipeview
+
+# A load-use stall, then a taken branch that flushes the ADDI
+PROGRAM = ['LDW R1, R0, 2000', 'ADD R2, R1, R1', 'BZ R0, 2', 'ADDI R3, R0, 1', 'HALT']
+
+@pytest.fixture
+def image(tmp_path):
+    return write_program(str(tmp_path / 'stall.mem'), PROGRAM, {2000: [5]})
+
+# Run to HALT, recording every cycle as main.py does
+def recorded(mode: str, image: str, start: int = None, end: int = None):
+    sim = make_sim(mode, image)
+    view = pipeview.PipeView(sim, start, end)
+    while True:
+        halt = sim.do_cpu_things()
+        view.record()
+        if halt == True:
+            return sim, view
+
+FWD_TEXT = '''\
+Cycle                  1  2  3  4  5  6  7  8  9 10 11
+0: LDW R1, R0, 0x7d0   F  D  X  M  W
+4: ADD R2, R1, R1         F  D  d  X  M  W
+8: BZ R0, R0, 0x2            F  f  D  X  M  W
+12: ADDI R3, R0, 0x1               F  flushed
+16: HALT R0, R0, 0x0                     F  D  X  M  W
+20: ADD R0, R0, R0                          F  flushed
+Stall                           *
+Flush                                 *
+
+F D X M W: IF ID EX MEM WB, lower case: held during a stall'''
+
+def test_text(image):
+    _, view = recorded('fwd', image)
+    assert view.text() == FWD_TEXT
+
+# Every instruction that executes retires once, and the marked cycles are the
+# ones the simulator counted
+@pytest.mark.parametrize('image', IMAGES, ids=name)
+@pytest.mark.parametrize('mode', PIPELINED)
+def test_instructions(image, mode):
+    sim, view = recorded(mode, image)
+    instrs = view.instructions()
+    assert sum(retired == True for _, _, retired in instrs) == sim.instr_count
+    assert all(retired is not None for _, _, retired in instrs)
+    assert sum(flags & pipeview.STALL != 0 for flags in view.flags) == sim.stall_count
+    assert sum(flags & pipeview.FLUSH != 0 for flags in view.flags) == sim.flush_count
+    assert list(view.clks) == list(range(1, sim.clk + 1))
+    # Stages in order, one per cycle, only IF and ID are held
+    for _, cells, _ in instrs:
+        stages = [cells[row] for row in sorted(cells)]
+        assert [stage for stage, _ in stages] == sorted(stage for stage, _ in stages)
+        assert all(stage <= 1 for stage, held in stages if held)
+
+@pytest.mark.parametrize('mode', PIPELINED)
+def test_window(mode, image):
+    sim, view = recorded(mode, image, 3, 6)
+    assert list(view.clks) == [3, 4, 5, 6]
+    assert not view.recording
+    # Event skipping comes back once the window is over
+    assert sim.event_skip
+
+# Long runs are drawn in blocks, each with its own cycle header
+def test_blocks(image, monkeypatch):
+    monkeypatch.setattr(config, 'PIPEVIEW_BLOCK', 4)
+    _, view = recorded('fwd', image)
+    lines = view.text().splitlines()
+    assert [line.split()[1:] for line in lines if line.startswith('Cycle')] == \
+        [['1', '2', '3', '4'], ['5', '6', '7', '8'], ['9', '10', '11']]
+    # An instruction shows up in every block it spans
+    assert sum(line.startswith('16: HALT') for line in lines) == 2
+
+def test_html(image):
+    _, view = recorded('no-fwd', image)
+    out = view.html()
+    assert out.count('<tr class="flushed">') == 2
+    assert out.count('<th class="stall">') == 2 and out.count('<th class="flush">') == 1
+    assert out.count('<td class="D held">') == 2 and out.count('<td class="F held">') == 2
+    assert '<td class="label">0: LDW R1, R0, 0x7d0</td>' in out
+
+@pytest.mark.parametrize('mode', PIPELINED)
+def test_kanata(mode, image, tmp_path):
+    sim, view = recorded(mode, image)
+    fname = str(tmp_path / 'run.kanata')
+    view.write(fname)
+    with open(fname) as f:
+        lines = [line.rstrip('\n').split('\t') for line in f]
+    assert lines[:2] == [['Kanata', '0004'], ['C=', '1']]
+    assert sum(int(line[1]) for line in lines if line[0] == 'C') == sim.clk - 1
+    retires = [line for line in lines if line[0] == 'R']
+    assert [line[2] for line in retires if line[3] == '0'] == [str(index) for index in range(sim.instr_count)]
+    assert sum(line[3] == '1' for line in retires) == 2
+    # Every stage started is ended
+    assert sum(line[0] == 'S' for line in lines) == sum(line[0] == 'E' for line in lines)
+
+def test_tool(image, tmp_path):
+    fname = str(tmp_path / 'run.html')
+    subprocess.run([sys.executable, os.path.join(SRC_DIR, 'main.py'), image, 'release', 'fwd', f'--pipeview={fname}',
+                    '--pipeview-window=2,5'], capture_output=True, check=True)
+    with open(fname) as f:
+        out = f.read()
+    assert out.startswith('<!DOCTYPE html>')
+    assert [clk for clk in range(1, 12) if f'>{clk}</th>' in out] == [2, 3, 4, 5]
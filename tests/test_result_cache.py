@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+"""
+test_result_cache.py: Reports of earlier runs from the on-disk cache
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from simtest import IMAGES, MODES, SRC_DIR, name
+
+import config
+import result_cache
+
+# main.py with the cache under tmp_path, returns the report it prints
+def main(tmp_path, image: str, mode: str, *options) -> str:
+    env = dict(os.environ, HOME=str(tmp_path))
+    return subprocess.run([sys.executable, os.path.join(SRC_DIR, 'main.py'), image, 'release', mode, *options],
+                          env=env, capture_output=True, text=True, check=True).stdout
+
+def cache_entries(tmp_path) -> list:
+    cache_dir = os.path.join(str(tmp_path), '.cache', 'mips_lite_sim')
+    return [os.path.join(cache_dir, entry) for entry in sorted(os.listdir(cache_dir))]
+
+# A cached report is the report of the run, and is found again
+@pytest.mark.parametrize('image', IMAGES, ids=name)
+@pytest.mark.parametrize('mode', MODES)
+def test_cached_report(image, mode, tmp_path):
+    plain = main(tmp_path, image, mode, '--no-cache')
+    assert main(tmp_path, image, mode) == plain
+    assert main(tmp_path, image, mode) == plain
+    assert len(cache_entries(tmp_path)) == 1
+
+# Spelling out a default gives the same run, another value does not
+def test_defaults_share_a_key(tmp_path):
+    image = IMAGES[0]
+    main(tmp_path, image, 'fwd', '--bp=2bit')
+    main(tmp_path, image, 'fwd', '--bp=2bit', f'--bp-size={config.BP_TABLE_SIZE}')
+    assert len(cache_entries(tmp_path)) == 1
+    main(tmp_path, image, 'fwd', '--bp=2bit', '--bp-size=8')
+    assert len(cache_entries(tmp_path)) == 2
+
+def test_refresh(tmp_path):
+    image = IMAGES[0]
+    plain = main(tmp_path, image, 'func')
+    [entry] = cache_entries(tmp_path)
+    with open(entry) as f:
+        report = json.load(f)
+    report['regs'] = []
+    with open(entry, 'w') as f:
+        json.dump(report, f)
+    assert main(tmp_path, image, 'func') != plain
+    assert main(tmp_path, image, 'func', '--refresh-cache') == plain
+    assert main(tmp_path, image, 'func') == plain
+
+def test_key():
+    key = result_cache.make_key('0' * 64, 'fwd', {'bp': None})
+    assert result_cache.make_key('0' * 64, 'fwd', {'bp': None}) == key
+    assert result_cache.make_key('1' * 64, 'fwd', {'bp': None}) != key
+    assert result_cache.make_key('0' * 64, 'no-fwd', {'bp': None}) != key
+    assert result_cache.make_key('0' * 64, 'fwd', {'bp': '2bit'}) != key
+
+def test_key_config(monkeypatch):
+    key = result_cache.make_key('0' * 64, 'fwd')
+    monkeypatch.setattr(config, 'MEM_SIZE', 2 * config.MEM_SIZE)
+    assert result_cache.make_key('0' * 64, 'fwd') != key
+
+# Reading an entry makes it the most recently used one
+def test_evict_lru(tmp_path):
+    results = result_cache.ResultCache(str(tmp_path))
+    for index, key in enumerate(['a', 'b', 'c']):
+        results.put(key, {'value': index})
+        os.utime(results.path(key), (1000 + index, 1000 + index))
+    size = os.path.getsize(results.path('a'))
+    assert results.get('a') == {'value': 0}
+
+    results.max_bytes = 3 * size
+    results.put('d', {'value': 3})
+    assert results.get('b') is None
+    assert [results.get(key) for key in ['a', 'c', 'd']] == [{'value': 0}, {'value': 2}, {'value': 3}]
+
+def test_broken_entry(tmp_path):
+    results = result_cache.ResultCache(str(tmp_path))
+    assert results.get('a') is None
+    with open(results.path('a'), 'w') as f:
+        f.write('{"value":')
+    assert results.get('a') is None
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+
+"""
+test_sampling.py: Sampled simulation and its estimates
+"""
+
+import os
+
+import pytest
+
+from simtest import IMAGES, PIPELINED, TESTS_DIR, arch_state, make_sim, name, run, write_program
+
+import sampling
+
+# A run shorter than one sampling unit never goes functional, so the counts
+# are the exact ones of the plain pipelined run
+@pytest.mark.parametrize('image', IMAGES, ids=name)
+@pytest.mark.parametrize('mode', PIPELINED)
+def test_exact_without_functional_phase(image, mode):
+    sim = run(sampling.MIPS_lite_sampled(mode, image))
+    plain = run(make_sim(mode, image))
+    assert sim.exact()
+    assert sim.estimates() == {'clocks': (plain.clk, None), 'stalls': (plain.stall_count, None),
+                               'data_hazards': (plain.num_data_hazards, None)}
+    assert arch_state(sim) == arch_state(run(make_sim('func', image)))
+
+# 51 instructions with a unit every 40: the second unit is cut short by HALT
+# and still counts
+@pytest.mark.parametrize('mode', PIPELINED)
+def test_final_partial_unit(mode, tmp_path):
+    image = write_program(str(tmp_path / 'straight.mem'), ['ADDI R1, R1, 1'] * 50 + ['HALT'])
+    sim = run(sampling.MIPS_lite_sampled(mode, image, period=40, window=20, warmup=0))
+    assert not sim.exact()
+    assert len(sim.cpi_samples) == 2
+    assert sim.R[1] == 50
+
+@pytest.mark.parametrize('mode', PIPELINED)
+def test_estimates_close_to_the_run(mode):
+    image = os.path.join(TESTS_DIR, 'ece586_sample.mem')
+    sim = run(sampling.MIPS_lite_sampled(mode, image, period=100, window=50, warmup=10))
+    plain = run(make_sim(mode, image))
+    assert not sim.exact()
+    assert len(sim.cpi_samples) == 7
+    estimates = sim.estimates()
+    assert estimates['clocks'][0] == pytest.approx(plain.clk, rel=0.05)
+    assert estimates['stalls'][0] == pytest.approx(plain.stall_count, rel=0.05)
+    assert arch_state(sim) == arch_state(run(make_sim('func', image)))
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+
+"""
+test_server.py: JSON-RPC requests to the simulator server
+"""
+
+import asyncio
+import json
+import os
+
+import pytest
+
+from simtest import MODES, TESTS_DIR, make_sim, run, write_program
+
+import config
+import server
+
+IMAGE = os.path.join(TESTS_DIR, 'ece586_sample.mem')
+
+# Send requests in order to one server, returns the responses
+def requests(sim_server: server.SimServer, *calls) -> list:
+    async def send():
+        responses = []
+        for request_id, (method, params) in enumerate(calls):
+            line = json.dumps({'jsonrpc': '2.0', 'id': request_id, 'method': method, 'params': params})
+            responses.append(await sim_server.dispatch(line.encode()))
+        return responses
+    return asyncio.run(send())
+
+def call(sim_server: server.SimServer, method: str, **params):
+    response = requests(sim_server, (method, params))[0]
+    assert 'error' not in response, response['error']
+    return response['result']
+
+def error(sim_server: server.SimServer, method: str, **params) -> int:
+    return requests(sim_server, (method, params))[0]['error']['code']
+
+@pytest.fixture
+def sim_server():
+    return server.SimServer()
+
+@pytest.mark.parametrize('mode', MODES)
+def test_run(sim_server, mode):
+    session = call(sim_server, 'load', image=IMAGE, mode=mode.upper())['session']
+    assert call(sim_server, 'step', session=session, n=10)['steps'] == 10
+    result = call(sim_server, 'run', session=session)
+    assert result['halted'] and not result['breakpoint']
+
+    plain = run(make_sim(mode, IMAGE, event_skip=False) if mode != 'func' else make_sim(mode, IMAGE))
+    assert result['instr_count'] == plain.instr_count
+    if mode != 'func':
+        assert result['clk'] == plain.clk
+    assert call(sim_server, 'regs', session=session)['R'] == [int(val) for val in plain.R]
+    words = config.MEM_SIZE // 4
+    assert call(sim_server, 'mem', session=session, words=words) == \
+        [int.from_bytes(plain.mem.mem[4*i:4*i+4], 'big') for i in range(words)]
+    stats = call(sim_server, 'stats', session=session)
+    assert stats['instr_count'] == plain.instr_count
+    if mode != 'func':
+        assert (stats['clk'], stats['stall_count']) == (plain.clk, plain.stall_count)
+
+    assert call(sim_server, 'sessions') == [{'session': session, 'image': IMAGE, 'mode': mode, 'halted': True}]
+    assert call(sim_server, 'close', session=session) == True
+    assert call(sim_server, 'sessions') == []
+
+@pytest.mark.parametrize('mode', MODES)
+def test_breakpoint(sim_server, mode, tmp_path):
+    image = write_program(str(tmp_path / 'count.mem'), ['ADDI R1, R0, 1', 'ADDI R2, R0, 2', 'ADDI R3, R0, 3',
+                                                        'HALT'])
+    session = call(sim_server, 'load', image=image, mode=mode)['session']
+    result = call(sim_server, 'run', session=session, breakpoints=[8])
+    assert result['breakpoint'] and not result['halted']
+    # FUNC stops before the instruction, the pipeline once it has executed
+    assert result['instr_count'] == (2 if mode == 'func' else 3)
+
+# Restoring a snapshot twice replays the same run
+@pytest.mark.parametrize('mode', MODES)
+def test_snapshot(sim_server, mode):
+    session = call(sim_server, 'load', image=IMAGE, mode=mode)['session']
+    call(sim_server, 'step', session=session, n=50)
+    snapshot = call(sim_server, 'snapshot', session=session)['snapshot']
+    at_snapshot = call(sim_server, 'regs', session=session)
+    final = call(sim_server, 'run', session=session)
+    for _ in range(2):
+        assert call(sim_server, 'restore', session=session, snapshot=snapshot)['steps'] == 50
+        assert call(sim_server, 'regs', session=session) == at_snapshot
+        assert call(sim_server, 'run', session=session) == final
+
+def test_last_word(sim_server, tmp_path):
+    last = config.MEM_SIZE - 4
+    image = write_program(str(tmp_path / 'last.mem'), ['ADDI R1, R0, 7', f'STW R1, R0, {last}', 'HALT'])
+    session = call(sim_server, 'load', image=image)['session']
+    call(sim_server, 'run', session=session)
+    assert call(sim_server, 'mem', session=session, addr=last) == [7]
+    assert call(sim_server, 'mem', session=session, addr=last - 4, words=2) == [0, 7]
+
+@pytest.mark.parametrize('method, params', [
+    ('load', {'image': 'missing.mem'}),
+    ('load', {'image': 3}),
+    ('load', {'image': IMAGE, 'mode': 'out-of-order'}),
+    ('load', {'image': IMAGE, 'mode': 1}),
+    ('step', {'n': 'x'}),
+    ('step', {'n': -1}),
+    ('step', {'n': 1.5}),
+    ('run', {'max_steps': '10'}),
+    ('run', {'breakpoints': 8}),
+    ('run', {'breakpoints': ['8']}),
+    ('mem', {'addr': 'x'}),
+    ('mem', {'addr': -4}),
+    ('mem', {'words': True}),
+    ('mem', {'addr': config.MEM_SIZE - 4, 'words': 2}),
+    ('restore', {'snapshot': 0}),
+])
+def test_invalid_params(sim_server, method, params):
+    session = call(sim_server, 'load', image=IMAGE)['session']
+    if method != 'load':
+        params = dict(params, session=session)
+    assert error(sim_server, method, **params) == server.INVALID_PARAMS
+    assert error(sim_server, 'regs', session=session + 1) == server.INVALID_PARAMS
+
+def test_protocol_errors(sim_server):
+    async def send(line: bytes):
+        return await sim_server.dispatch(line)
+    assert asyncio.run(send(b'{'))['error']['code'] == server.PARSE_ERROR
+    assert asyncio.run(send(b'[]'))['error']['code'] == server.INVALID_REQUEST
+    assert error(sim_server, 'reset') == server.METHOD_NOT_FOUND
+    # Notifications are run, but get no response
+    assert asyncio.run(send(b'{"jsonrpc": "2.0", "method": "sessions"}')) is None
+
+# An invalid instruction is a simulator error, the session survives it
+def test_sim_error(sim_server, tmp_path):
+    image = str(tmp_path / 'bad.mem')
+    with open(image, 'w') as f:
+        f.write('ffffffff\n')
+    session = call(sim_server, 'load', image=image)['session']
+    assert error(sim_server, 'step', session=session) == server.SIM_ERROR
+    assert call(sim_server, 'sessions')[0]['session'] == session
+
+# Two clients over TCP share the sessions of one server
+def test_tcp():
+    async def session_run():
+        sim_server = server.SimServer()
+        tcp = await asyncio.start_server(sim_server.handle_client, '127.0.0.1', 0)
+        port = tcp.sockets[0].getsockname()[1]
+
+        async def send(writer, reader, request_id: int, method: str, params: dict):
+            writer.write((json.dumps({'jsonrpc': '2.0', 'id': request_id, 'method': method,
+                                      'params': params}) + '\n').encode())
+            await writer.drain()
+            return json.loads(await reader.readline())
+
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        loaded = await send(writer, reader, 1, 'load', {'image': IMAGE, 'mode': 'fwd'})
+        writer.close()
+
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        result = await send(writer, reader, 2, 'run', {'session': loaded['result']['session']})
+        writer.close()
+        tcp.close()
+        await tcp.wait_closed()
+        return loaded, result
+
+    loaded, result = asyncio.run(session_run())
+    assert loaded['id'] == 1 and result['id'] == 2
+    assert result['result']['halted']
+    assert result['result']['clk'] == run(make_sim('fwd', IMAGE)).clk
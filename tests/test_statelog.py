@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+
+"""
+test_statelog.py: Writing state logs and rebuilding state from them
+"""
+
+import io
+import os
+import subprocess
+import sys
+
+import pytest
+
+from simtest import IMAGES, MODES, SRC_DIR, TESTS_DIR, make_sim, name, write_program
+
+import config
+import statelog
+
+# Run to HALT with a state log, as main.py does
+def run_logged(mode: str, image: str, fname: str, fmt: str, max_steps: int = None):
+    sim = make_sim(mode, image, event_skip=False) if mode != 'func' else make_sim(mode, image)
+    log = statelog.StateLogWriter(fname, sim, 'instr' if mode == 'func' else 'cycle', fmt)
+    steps = 0
+    while max_steps is None or steps < max_steps:
+        halt = sim.do_cpu_things()
+        log.record(sim.instr_count if mode == 'func' else sim.clk)
+        steps += 1
+        if halt == True:
+            break
+    log.close()
+    return sim
+
+# Replaying the whole log gives the final registers and memory
+@pytest.mark.parametrize('image', IMAGES, ids=name)
+@pytest.mark.parametrize('mode', MODES)
+@pytest.mark.parametrize('fmt', ['json', 'bin'])
+def test_replay_end(image, mode, fmt, tmp_path):
+    fname = str(tmp_path / 'run.log')
+    sim = run_logged(mode, image, fname, fmt)
+    header, R, mem = statelog.replay(fname)
+    assert header['unit'] == ('instr' if mode == 'func' else 'cycle')
+    assert R == [int(val) for val in sim.R]
+    assert mem.mem == sim.mem.mem
+
+# Replaying up to a step gives the state of a run stopped there
+@pytest.mark.parametrize('mode', MODES)
+@pytest.mark.parametrize('fmt', ['json', 'bin'])
+def test_replay_step(mode, fmt, tmp_path):
+    image = os.path.join(TESTS_DIR, 'ece586_sample.mem')
+    fname = str(tmp_path / 'run.log')
+    run_logged(mode, image, fname, fmt)
+    stopped = run_logged(mode, image, str(tmp_path / 'stopped.log'), fmt, max_steps=100)
+    step = stopped.instr_count if mode == 'func' else stopped.clk
+    _, R, mem = statelog.replay(fname, step)
+    assert R == [int(val) for val in stopped.R]
+    assert mem.mem == stopped.mem.mem
+
+# Registers of the functional simulator are not limited to 64 bits
+def test_values():
+    values = [0, 1, -1, 63, -64, 64, 1 << 31, -(1 << 31), 1 << 63, -(1 << 100), (1 << 100) + 5]
+    data = io.BytesIO(b''.join(statelog.pack_value(val) for val in values))
+    assert [statelog.read_value(data) for _ in values] == values
+
+# The tool lists every modified word, the last one included
+@pytest.mark.parametrize('fmt', ['json', 'bin'])
+def test_tool(fmt, tmp_path):
+    last = config.MEM_SIZE - 4
+    image = write_program(str(tmp_path / 'last.mem'), ['ADDI R1, R0, 7', 'STW R1, R0, 1000', f'STW R1, R0, {last}',
+                                                       'HALT'])
+    fname = str(tmp_path / 'run.log')
+    run_logged('func', image, fname, fmt)
+    output = subprocess.run([sys.executable, os.path.join(SRC_DIR, 'statelog.py'), fname], capture_output=True,
+                            text=True, check=True).stdout
+    assert output.splitlines()[-3:] == ['Modified Addresses:', 'Addr: 1000, Data: 7', f'Addr: {last}, Data: 7']
+    output = subprocess.run([sys.executable, os.path.join(SRC_DIR, 'statelog.py'), fname, '2'],
+                            capture_output=True, text=True, check=True).stdout
+    assert output.splitlines()[-2:] == ['Modified Addresses:', 'Addr: 1000, Data: 7']
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+
+"""
+test_sweep.py: Parameter sweeps and their reuse of cached results
+"""
+
+import csv
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+from simtest import SRC_DIR, TESTS_DIR, make_sim, run
+
+import branch_predictor
+import result_cache
+import sweep
+
+IMAGE = os.path.join(TESTS_DIR, 'ece586_sample.mem')
+
+# FUNC ignores the predictor and without one the size does not matter either:
+# 1 FUNC run, 1 FWD run without and 2 with the predictor
+GRID = dict(sweep.DEFAULT_GRID, mode=['func', 'fwd'], bp=['none', '2bit'], bp_size=[16, 64])
+
+@pytest.fixture
+def results_cache(tmp_path):
+    return result_cache.ResultCache(str(tmp_path / 'cache'))
+
+def test_dedup(results_cache, tmp_path):
+    copy = str(tmp_path / 'copy.mem')
+    shutil.copy(IMAGE, copy)
+    rows, simulated, hits = sweep.sweep([IMAGE, copy], GRID, results_cache, jobs=1)
+    assert (len(rows), simulated, hits) == (8, 4, 0)
+    assert [(row['mode'], row['bp'], row['bp_size']) for row in rows[:4]] == \
+        [('func', 'none', None), ('fwd', 'none', None), ('fwd', '2bit', 16), ('fwd', '2bit', 64)]
+    assert [{key: val for key, val in row.items() if key != 'image'} for row in rows[4:]] == \
+        [{key: val for key, val in row.items() if key != 'image'} for row in rows[:4]]
+
+# The rows are those of the runs themselves
+def test_results(results_cache):
+    rows, _, _ = sweep.sweep([IMAGE], GRID, results_cache, jobs=1)
+    for row in rows:
+        kwargs = {}
+        if row['bp'] != 'none':
+            kwargs['bp'] = branch_predictor.PREDICTORS[row['bp']](row['bp_size'])
+        sim = run(make_sim(row['mode'], IMAGE, **kwargs))
+        assert row['instrs'] == sim.instr_count
+        if row['mode'] != 'func':
+            assert (row['clk'], row['stalls'], row['data_hazards']) == \
+                (sim.clk, sim.stall_count, sim.num_data_hazards)
+
+# A repeated sweep simulates nothing, an extended one only what is new
+def test_incremental(results_cache):
+    rows, _, _ = sweep.sweep([IMAGE], GRID, results_cache, jobs=1)
+    assert sweep.sweep([IMAGE], GRID, results_cache, jobs=1) == (rows, 0, 4)
+
+    extended = dict(GRID, mode=['func', 'no-fwd', 'fwd'])
+    extended_rows, simulated, hits = sweep.sweep([IMAGE], extended, results_cache, jobs=1)
+    assert (len(extended_rows), simulated, hits) == (7, 3, 4)
+    assert [row for row in extended_rows if row['mode'] != 'no-fwd'] == rows
+
+def test_tool(tmp_path):
+    results = str(tmp_path / 'results.csv')
+    command = [sys.executable, os.path.join(SRC_DIR, 'sweep.py'), results, IMAGE, '--mode=no-fwd,fwd',
+               '--bp=none,btb', '--jobs=1', f'--cache-dir={tmp_path / "cache"}']
+    output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+    assert output.startswith('4 runs, 4 simulated, 0 from cache')
+    output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+    assert output.startswith('4 runs, 0 simulated, 4 from cache')
+    with open(results) as f:
+        rows = list(csv.DictReader(f))
+    assert list(rows[0]) == ['image'] + sweep.PARAMS + sweep.RESULTS
+    assert [(row['mode'], row['bp']) for row in rows] == \
+        [('no-fwd', 'none'), ('no-fwd', 'btb'), ('fwd', 'none'), ('fwd', 'btb')]
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+"""
+test_system.py: Several cores on one shared memory
+"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from simtest import IMAGES, MODES, SRC_DIR, arch_state, make_sim, name, run, timing, write_program
+
+import config
+import system
+
+# Core 0 at 0 publishes a value at 1000, core 1 at 40 spins until it sees it
+# and doubles it into 1004
+PROGRAM = {
+    0: ['ADDI R1, R0, 21', 'ADD R1, R1, R1', 'STW R1, R0, 1000', 'HALT'],
+    40: ['LDW R2, R0, 1000', 'BZ R2, -1', 'ADD R3, R2, R2', 'STW R3, R0, 1004', 'HALT'],
+}
+
+def write_system(fname: str, start_table: list = None) -> str:
+    lines = PROGRAM[0] + ['HALT'] * (40 // 4 - len(PROGRAM[0])) + PROGRAM[40]
+    data = {config.CORE_TABLE_ADDR: [config.CORE_TABLE_MAGIC, len(start_table)] + start_table} \
+        if start_table is not None else None
+    return write_program(fname, lines, data)
+
+# A single core runs as the simulator on its own
+@pytest.mark.parametrize('image', IMAGES, ids=name)
+@pytest.mark.parametrize('mode', MODES)
+def test_one_core(image, mode):
+    sim = system.MIPS_lite_system(mode, image, 1)
+    assert sim.run() == True
+    plain = run(make_sim(mode, image))
+    assert arch_state(sim.cores[0]) == arch_state(plain)
+    if mode != 'func':
+        assert timing(sim.cores[0]) == timing(plain)
+
+@pytest.mark.parametrize('mode', MODES)
+def test_shared_memory(mode, tmp_path):
+    sim = system.MIPS_lite_system(mode, write_system(str(tmp_path / 'pair.mem')), 2, [0, 40])
+    assert sim.run() == True
+    assert sim.cores[1].R[2] == 42
+    assert sim.mem.read_n(1000, 8) == (42).to_bytes(4, 'big') + (84).to_bytes(4, 'big')
+    assert sim.modified_addrs() == [1000, 1004]
+    # The consumer waited for the producer
+    assert sim.halted_at[1] > sim.halted_at[0]
+    assert sim.cores[1].instr_count > len(PROGRAM[40])
+
+# Round-robin interleaving is deterministic
+@pytest.mark.parametrize('mode', MODES)
+def test_deterministic(mode, tmp_path):
+    image = write_system(str(tmp_path / 'pair.mem'))
+    runs = []
+    for _ in range(2):
+        sim = system.MIPS_lite_system(mode, image, 2, [0, 40])
+        sim.run()
+        runs.append((sim.report(), sim.halted_at, [arch_state(core) for core in sim.cores]))
+    assert runs[1] == runs[0]
+
+def test_start_table(tmp_path):
+    sim = system.MIPS_lite_system('fwd', write_system(str(tmp_path / 'pair.mem'), [0, 40]), 3)
+    assert sim.start_pcs == [0, 40, 0]
+    assert sim.run() == True
+    assert sim.cores[1].R[3] == 84
+
+def test_max_turns(tmp_path):
+    sim = system.MIPS_lite_system('func', write_system(str(tmp_path / 'pair.mem')), 2, [40, 0])
+    assert sim.run(max_turns=2) == False
+    assert sim.turns == 2
+    assert sim.run() == True
+    assert sim.cores[0].R[2] == 42
+
+def test_tool(tmp_path):
+    image = write_system(str(tmp_path / 'pair.mem'))
+    output = subprocess.run([sys.executable, os.path.join(SRC_DIR, 'system.py'), image, 'FWD', '2', '0,40'],
+                            capture_output=True, text=True, check=True).stdout
+    assert output.startswith('System: 2 fwd cores, ')
+    assert 'Modified Addresses:\nAddr: 1000, Data: 42\nAddr: 1004, Data: 84\n' in output